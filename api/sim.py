@@ -304,9 +304,25 @@ def simxGetVisionSensorImage(clientID, sensorHandle, options, operationMode):
 def simxSetVisionSensorImage(clientID, sensorHandle, image, options, operationMode):
     '''
     Please have a look at the function description/documentation in the CoppeliaSim user manual
-    '''
-    size = len(image)
-    image_bytes  = (ct.c_byte*size)(*image)
+
+    image can be a C-contiguous uint8 numpy array, bytes or bytearray, whose buffer
+    is passed directly without copying; any other sequence is copied element-wise.
+    '''
+    if hasattr(image, 'ctypes') and hasattr(image, 'flags'): # numpy array
+        # numpy dtypes compare equal to their name, no numpy import needed here
+        if image.dtype != 'uint8' or not image.flags['C_CONTIGUOUS']:
+            raise ValueError('image must be a C-contiguous uint8 array')
+        size = image.size
+        image_bytes = image.ctypes.data_as(ct.POINTER(ct.c_byte))
+    elif type(image) is bytearray:
+        size = len(image)
+        image_bytes = (ct.c_byte*size).from_buffer(image)
+    elif type(image) is bytes:
+        size = len(image)
+        image_bytes = ct.cast(image, ct.POINTER(ct.c_byte))
+    else:
+        size = len(image)
+        image_bytes  = (ct.c_byte*size)(*image)
     return c_SetVisionSensorImage(clientID, sensorHandle, image_bytes, size, options, operationMode)
 
 def simxGetVisionSensorDepthBuffer(clientID, sensorHandle, operationMode):
@@ -0,0 +1,136 @@
+"""
+Usage:
+(robodiff)$ python benchmark_iiwa_controller.py --frequency 100 --latency 0.002 --jitter 0.001
+e.g python benchmark_iiwa_controller.py -f 200 -l 0.004 -j 0.002 --pipelined --binary_protocol --combined_state
+
+Runs IIWAPositionalController against the local KUKA Sunrise emulator and
+reports the achieved control loop rate and the servo round trip percentiles.
+Pass --host/--port to benchmark against a real robot instead.
+"""
+
+import time
+import click
+import numpy as np
+from multiprocessing.managers import SharedMemoryManager
+from codebase.real_world.iiwaPy3 import IIWAPositionalController
+from codebase.real_world.kuka_emulator import KukaSunriseEmulator, RobotStateModel
+from utils.data_utils import pose_euler2quat
+
+
+def percentiles(values: np.ndarray, scale: float = 1000.0) -> str:
+    if len(values) == 0:
+        return "no samples"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]) * scale
+    return f"p50 {p50:.2f}  p90 {p90:.2f}  p99 {p99:.2f}  max {np.max(values) * scale:.2f}"
+
+
+@click.command()
+@click.option("--host", default=None, help="Robot IP, the local emulator is used if not given.")
+@click.option("--port", default=30001, type=int, help="Robot or emulator port.")
+@click.option("--command_port", default=None, type=int, help="Separate command/query channel port.")
+@click.option("--frequency", "-f", default=100, type=int, help="Controller frequency in Hz.")
+@click.option("--duration", "-d", default=10.0, type=float, help="Benchmark duration in Sec.")
+@click.option("--latency", "-l", default=0.002, type=float, help="Emulated reply latency in Sec.")
+@click.option("--jitter", "-j", default=0.001, type=float, help="Emulated uniform reply jitter in Sec.")
+@click.option("--pipelined", is_flag=True, default=False, help="Stream setpoints without waiting for replies.")
+@click.option("--binary_protocol", is_flag=True, default=False, help="Negotiate the binary protocol.")
+@click.option("--combined_state", is_flag=True, default=False, help="One DcSeCarSt_/jpSt_ reply per tick.")
+@click.option("--joint_space", is_flag=True, default=False, help="Servo joints (servoJ) instead of the EEF pose.")
+@click.option("--local_fk", is_flag=True, default=False, help="Request only joints, EEF pose from local kinematics.")
+def main(
+    host,
+    port,
+    command_port,
+    frequency,
+    duration,
+    latency,
+    jitter,
+    pipelined,
+    binary_protocol,
+    combined_state,
+    joint_space,
+    local_fk,
+):
+    emulator = None
+    if host is None:
+        host = "127.0.0.1"
+        emulator = KukaSunriseEmulator(
+            host=host,
+            port=port,
+            command_port=command_port,
+            latency=latency,
+            jitter=jitter,
+            state=RobotStateModel(ptp_time_scale=0.1),
+        )
+        emulator.start()
+        # port 0 lets the emulator pick free ports, connect to the ones it got
+        port, command_port = emulator.port, emulator.command_port
+
+    get_max_k = 2 * frequency
+    with SharedMemoryManager() as shm_manager:
+        with IIWAPositionalController(
+            shm_manager=shm_manager,
+            receive_keys=None,
+            host=host,
+            port=port,
+            command_port=command_port,
+            frequency=frequency,
+            get_max_k=get_max_k,
+            binary_protocol=binary_protocol,
+            combined_state=combined_state,
+            pipelined=pipelined,
+            local_fk=local_fk,
+            launch_timeout=10,
+        ) as robot:
+            init_pose = np.array(robot.init_eef_pose)
+            init_jpos = robot.get_state()["Jpos"].copy()
+
+            timestamps = dict()
+            t_start = time.time()
+            while time.time() - t_start < duration:
+                # small circle in the xy plane
+                phase = 2 * np.pi * 0.5 * (time.time() - t_start)
+                if joint_space:
+                    jpos = init_jpos.copy()
+                    jpos[0] += 0.05 * np.sin(phase)
+                    robot.servoJ(jpos, duration=0.1)
+                else:
+                    pose = init_pose.copy()
+                    pose[:2] += 10.0 * np.array([np.cos(phase), np.sin(phase)])
+                    if robot.use_quat:
+                        pose = pose_euler2quat(pose)
+                    robot.servoL(pose, duration=0.1)
+
+                # collect every published sample, deduplicated by timestamp
+                state = robot.get_all_state()
+                for t, rtt in zip(state["robot_receive_timestamp"], state["robot_rtt"]):
+                    if t >= t_start:
+                        timestamps[t] = rtt
+                time.sleep(0.05)
+            loop_stats = robot.get_loop_stats()
+
+    if emulator is not None:
+        n_servo_commands = emulator.n_servo_commands
+        emulator.stop()
+
+    t = np.array(sorted(timestamps.keys()))
+    rtt = np.array([timestamps[k] for k in t])
+    periods = np.diff(t)
+    print(
+        f"Target rate      : {frequency} Hz, pipelined: {pipelined}, binary: {binary_protocol}, "
+        f"combined state: {combined_state}, "
+        f"joint space: {joint_space}, local fk: {local_fk}"
+    )
+    if len(t) < 2:
+        print(f"Achieved rate    : no samples ({len(t)} received)")
+    else:
+        print(f"Achieved rate    : {len(t) / (t[-1] - t[0]):.1f} Hz over {len(t)} samples")
+    print(f"Loop period (ms) : {percentiles(periods)}")
+    print(f"Servo RTT (ms)   : {percentiles(rtt)}")
+    print(f"Overruns         : {loop_stats['overrun_count']} of {loop_stats['iteration']} iterations")
+    if emulator is not None:
+        print(f"Servo commands   : {n_servo_commands} received by the emulator")
+
+
+if __name__ == "__main__":
+    main()
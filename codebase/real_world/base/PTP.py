@@ -1,6 +1,4 @@
 import math
-import sys
-import time
 from typing import Tuple
 from codebase.real_world.base.getters import Getters
 from codebase.real_world.base.senders import Senders
@@ -9,25 +7,37 @@ from codebase.real_world.base.base_client import BaseClient
 
 
 class PTP(BaseClient):
-    def __init__(self, host: str, port: int, trans: Tuple, sock: socket) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        trans: Tuple,
+        sock: socket,
+        ack_timeout: float = 2.0,
+        motion_timeout: float = 120.0,
+    ) -> None:
+        """
+        ack_timeout: longest wait for the ack of a sub-command
+        motion_timeout: longest wait for the end of a blocking motion
+        """
         super().__init__(host, port, trans)
 
         self.set_socket(sock)
         self.sender = Senders(host, port, trans, sock)
+        # target frames go out through the sender, bounded like every other sub-command
+        self.sender.ack_timeout = ack_timeout
         self.getter = Getters(host, port, trans, sock)
+        self.ack_timeout = ack_timeout
+        self.motion_timeout = motion_timeout
 
     def _send(self, data: str):
+        """the next sub-command goes out as soon as this one is acknowledged"""
         data = data + "\n"
         self.send(data)
-        message = self.receive()
-        # print(message)
-        # sys.stdout.flush()
-        time.sleep(0.05)
+        self.await_ack(self.ack_timeout)
 
     def awaitConfirmation(self):
-        message = self.sock.recv(1024).decode("utf-8")
-        # print(message)
-        sys.stdout.flush()
+        self.await_ack(self.motion_timeout)
 
     ## Arc motions
     def movePTPArc_AC(self, theta, c, k, vel):
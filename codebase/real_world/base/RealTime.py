@@ -3,6 +3,13 @@ from socket import socket
 from typing import Tuple
 from codebase.real_world.base.base_client import BaseClient
 
+# Sunrise server commands
+START_SERVO_JOINTS = "startDirectServoJoints"
+START_SERVO_CARTESIAN = "stDcEEf_"
+STOP_SERVO_JOINTS = "stopDirectServoJoints"
+# the server has no cartesian stop, its joint stop ends either servo mode
+STOP_SERVO_CARTESIAN = STOP_SERVO_JOINTS
+
 
 class RealTime(BaseClient):
     def __init__(self, host: str, port: int, trans: Tuple, sock: socket) -> None:
@@ -16,22 +23,22 @@ class RealTime(BaseClient):
         self.receive()
 
     def realTime_startDirectServoJoints(self):
-        theCommand = "startDirectServoJoints"
+        theCommand = START_SERVO_JOINTS
         self._send(theCommand)
         time.sleep(0.3)
 
     def realTime_stopDirectServoJoints(self):
-        theCommand = "stopDirectServoJoints"
+        theCommand = STOP_SERVO_JOINTS
         self._send(theCommand)
         time.sleep(0.3)
 
     def realTime_startDirectServoCartesian(self):
-        theCommand = "stDcEEf_"
+        theCommand = START_SERVO_CARTESIAN
         self._send(theCommand)
         time.sleep(0.3)
 
     def realTime_stopDirectServoCartesian(self):
-        theCommand = "stopDirectServoJoints"
+        theCommand = STOP_SERVO_CARTESIAN
         self._send(theCommand)
         time.sleep(0.3)
 
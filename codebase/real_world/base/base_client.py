@@ -2,7 +2,15 @@ from typing import Tuple, Union, Optional
 from abc import ABCMeta, abstractmethod
 import logging
 import socket
-import time
+import numpy as np
+from codebase.real_world.base.binary_protocol import (
+    BinaryProtocol,
+    ProtocolDesyncError,
+    OPCODES,
+    PROTOCOL_VERSION,
+    HEADER,
+    DOUBLE_SIZE,
+)
 
 FORMAT = "[%(asctime)s][%(levelname)s]: %(message)s"
 logging.basicConfig(
@@ -12,6 +20,138 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class FramedSocket:
+    """
+    TCP socket with one preallocated receive buffer, shared by every client
+    of the connection so that no reply bytes are lost between them.
+
+    Text replies are framed by "\\n", binary replies by the length in their header.
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = 65536) -> None:
+        self.sock = sock
+        # servo commands are tiny, don't let Nagle hold them back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    @classmethod
+    def create_connection(cls, host: str, port: int, timeout: float = 15.0):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect((host, port))
+        return cls(sock)
+
+    @property
+    def n_buffered(self):
+        return self._end - self._start
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def settimeout(self, timeout: Optional[float]):
+        self.sock.settimeout(timeout)
+
+    def gettimeout(self):
+        return self.sock.gettimeout()
+
+    def send(self, data) -> int:
+        return self.sock.send(data)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+    def _fill(self):
+        """receive once into the free tail of the buffer"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer):
+            # compact, move pending bytes to the front
+            n = self._end - self._start
+            self._buffer[:n] = self._buffer[self._start : self._end]
+            self._start, self._end = 0, n
+        if self._end == len(self._buffer):
+            raise ProtocolDesyncError("Receive buffer overflow, frame larger than buffer.")
+
+        n = self.sock.recv_into(self._view[self._end :])
+        if n == 0:
+            raise ConnectionError("Connection closed by server.")
+        self._end += n
+
+    def receive_pending(self):
+        """receive once, only call when the socket is readable"""
+        self._fill()
+
+    def try_read_line(self) -> Optional[str]:
+        """Return: one buffered text reply, None if not complete yet, never receives"""
+        idx = self._buffer.find(b"\n", self._start, self._end)
+        if idx < 0:
+            return None
+        line = self._buffer[self._start : idx].decode("utf-8")
+        self._start = idx + 1
+        return line
+
+    def peek(self, size: int) -> Optional[memoryview]:
+        """Return: view on the next buffered bytes without consuming them, None if too few"""
+        if self.n_buffered < size:
+            return None
+        return self._view[self._start : self._start + size]
+
+    def read_line(self) -> str:
+        """Return: one text reply without the trailing newline"""
+        # bytes already searched, relative to the start of the pending data
+        n_searched = 0
+        while True:
+            idx = self._buffer.find(b"\n", self._start + n_searched, self._end)
+            if idx >= 0:
+                line = self._buffer[self._start : idx].decode("utf-8")
+                self._start = idx + 1
+                return line
+            n_searched = self.n_buffered
+            self._fill()
+
+    def read_line_within(self, timeout: Optional[float]) -> str:
+        """
+        read_line waiting at most `timeout` seconds, a partial line stays buffered
+        Raise: TimeoutError
+        """
+        prev_timeout = self.sock.gettimeout()
+        self.sock.settimeout(timeout)
+        try:
+            return self.read_line()
+        except socket.timeout:
+            raise TimeoutError(f"No reply within {timeout}s.")
+        finally:
+            self.sock.settimeout(prev_timeout)
+
+    def end_session(self, timeout: float = 1.0):
+        """send "end", wait for its acknowledgement (bounded) and close"""
+        try:
+            self.sendall("end\n".encode("utf-8"))
+            self.read_line_within(timeout)
+        except (OSError, ConnectionError) as e:
+            # TimeoutError included, the server may close without an ack
+            logger.warning(f"No acknowledgement for end: {e}")
+        self.close()
+
+    def read_exact(self, view: memoryview):
+        """fill the whole view, buffered bytes first"""
+        n_copy = min(len(view), self.n_buffered)
+        view[:n_copy] = self._view[self._start : self._start + n_copy]
+        self._start += n_copy
+        view = view[n_copy:]
+        while len(view) > 0:
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise ConnectionError("Connection closed by server.")
+            view = view[n:]
+
+
 class BaseClient(metaclass=ABCMeta):
     def __init__(
         self,
@@ -23,37 +163,106 @@ class BaseClient(metaclass=ABCMeta):
         self.port = port
         self.trans = trans
         self.sock = None
+        # None -> text protocol
+        self.protocol: Optional[BinaryProtocol] = None
 
     @property
     def remote_info(self):
         return (self.host, self.port)
 
-    def set_socket(self, sock: socket.socket):
+    def set_socket(self, sock: Union[FramedSocket, socket.socket]):
+        """clients sharing one connection must share one FramedSocket"""
+        if isinstance(sock, socket.socket):
+            sock = FramedSocket(sock)
         self.sock = sock
 
+    def set_protocol(self, protocol: Optional[BinaryProtocol]):
+        self.protocol = protocol
+
+    def negotiate_protocol(self, timeout: float = 1.0) -> Optional[BinaryProtocol]:
+        """
+        Ask the server for the binary protocol, a server without support
+        answers anything else and the text protocol is kept.
+        Raise: ProtocolDesyncError when there is no answer within `timeout`,
+            a late answer would shift every following reply
+        """
+        assert self.sock, "No connection is detected."
+
+        self.sock.sendall(f"protocol_binary_{PROTOCOL_VERSION}\n".encode("utf-8"))
+        try:
+            reply = self.sock.read_line_within(timeout)
+        except TimeoutError as e:
+            raise ProtocolDesyncError(
+                f"No answer to the protocol negotiation within {timeout}s, reconnect."
+            ) from e
+
+        if reply.strip() == f"binary_{PROTOCOL_VERSION}":
+            logger.info(f"Using binary protocol v{PROTOCOL_VERSION}.")
+            return BinaryProtocol()
+        logger.info("Binary protocol not supported by server, falling back to text.")
+        return None
+
     def close(self):
         assert self.sock, "No connection is detected."
 
-        self.sock.send("end\n".encode("utf-8"))
-        time.sleep(1)
-        self.sock.close()
+        self.sock.end_session()
 
         logger.info(f"Connection to {self.host}:{self.port} was destroyed.")
 
     def send(self, data: str):
         assert self.sock, "No connection is detected."
 
+        # a broken connection is for the owner to reconnect, not to paper over
         try:
-            self.sock.send(data.encode("utf-8"))
+            self.sock.sendall(data.encode("utf-8"))
         except socket.error as e:
-            self.close()
             logger.error(f"Send error: {e}.")
+            raise
+
+    def await_ack(self, timeout: Optional[float]) -> str:
+        """
+        wait for the next acknowledgement, at most `timeout` seconds
+        Raise: TimeoutError
+        """
+        assert self.sock, "No connection is detected."
+
+        try:
+            return self.sock.read_line_within(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"No acknowledgement from {self.host}:{self.port} within {timeout}s.")
 
-    def receive(self, buffer_size=1024):
+    def receive(self):
+        """Return: exactly one reply line"""
         assert self.sock, "No connection is detected."
 
         try:
-            return self.sock.recv(buffer_size).decode("utf-8")
+            return self.sock.read_line()
         except socket.error as e:
-            self.close()
             logger.error(f"Recv error: {e}.")
+            raise
+
+    def request_binary(self, cmd: str, values=(), mask: int = 0) -> np.ndarray:
+        """
+        one binary request/reply round trip
+        Return: doubles of the reply, a view valid until the next request
+        """
+        assert self.sock, "No connection is detected."
+        assert self.protocol, "Binary protocol was not negotiated."
+
+        try:
+            self.sock.sendall(self.protocol.encode(cmd, values, mask))
+            buffer = memoryview(self.protocol.recv_buffer)
+            self.sock.read_exact(buffer[: HEADER.size])
+            opcode, _, seq, n = self.protocol.decode_header(buffer)
+            self.sock.read_exact(buffer[HEADER.size : HEADER.size + DOUBLE_SIZE * n])
+        except socket.error as e:
+            logger.error(f"Binary request error: {e}.")
+            raise
+        # a stale reply (e.g. after a timed out request) must not pass as this one
+        expected_opcode = OPCODES[cmd.rstrip("_")]
+        if opcode != expected_opcode or seq != self.protocol.seq:
+            raise ProtocolDesyncError(
+                f"Reply (opcode {opcode}, seq {seq}) does not match request "
+                f"(opcode {expected_opcode}, seq {self.protocol.seq}), stream is out of sync."
+            )
+        return self.protocol.decode_payload(self.protocol.recv_buffer, n)
@@ -0,0 +1,85 @@
+import struct
+from typing import Sequence, Tuple
+import numpy as np
+
+PROTOCOL_VERSION = 1
+# first byte is not printable ascii, so the server can tell binary frames from text lines
+MAGIC = 0x1AB1
+# magic, opcode, state field mask, sequence number, number of doubles
+HEADER = struct.Struct("<HBBIH")
+DOUBLE_SIZE = 8
+
+# text command (without trailing "_") -> binary opcode
+OPCODES = {
+    # EEF servo
+    "DcSeCarW": 1,
+    "DcSeCarExT": 2,
+    "DcSeCarEEfP": 3,
+    "DcSeCarJP": 4,
+    "DcSeCarMT": 5,
+    "DcSeCarSt": 6,
+    # joint servo
+    "jp": 16,
+    "jpMT": 17,
+    "jpEEfP": 18,
+    "DcSeCarEEfFrelEEF": 19,
+    "jpExT": 20,
+    "jpJP": 21,
+    "jpSt": 22,
+    # getters
+    "Eef_pos": 32,
+    "Eef_force": 33,
+    "Eef_moment": 34,
+    "getJointsPositions": 35,
+    "Torques_ext_J": 36,
+    "Torques_m_J": 37,
+}
+
+
+class ProtocolDesyncError(ConnectionError):
+    """replies no longer line up with the requests, the connection must be rebuilt"""
+
+
+class BinaryProtocol:
+    """
+    Fixed-width binary framing for servo commands and state queries.
+
+    frame: HEADER + n little-endian doubles, replies echo opcode, mask and seq.
+    Both buffers are allocated once and reused for every frame.
+    """
+
+    def __init__(self, max_doubles: int = 64) -> None:
+        self.max_doubles = max_doubles
+        self.send_buffer = bytearray(HEADER.size + DOUBLE_SIZE * max_doubles)
+        self.recv_buffer = bytearray(HEADER.size + DOUBLE_SIZE * max_doubles)
+        self.seq = 0
+        self._structs = dict()
+
+    def _doubles(self, n: int) -> struct.Struct:
+        if n not in self._structs:
+            self._structs[n] = struct.Struct(f"<{n}d")
+        return self._structs[n]
+
+    def encode(self, cmd: str, values: Sequence[float] = (), mask: int = 0) -> memoryview:
+        """pack one request frame into the send buffer, Return: view of the frame"""
+        n = len(values)
+        assert n <= self.max_doubles, f"At most {self.max_doubles} values per frame."
+
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        HEADER.pack_into(self.send_buffer, 0, MAGIC, OPCODES[cmd.rstrip("_")], mask, self.seq, n)
+        if n > 0:
+            self._doubles(n).pack_into(self.send_buffer, HEADER.size, *values)
+        return memoryview(self.send_buffer)[: HEADER.size + DOUBLE_SIZE * n]
+
+    def decode_header(self, data) -> Tuple[int, int, int, int]:
+        """Return: (opcode, mask, seq, n_doubles)"""
+        magic, opcode, mask, seq, n = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ProtocolDesyncError(f"Bad frame magic {magic:#x}, stream is out of sync.")
+        if n > self.max_doubles:
+            raise ProtocolDesyncError(f"Frame carries {n} values, at most {self.max_doubles} supported.")
+        return opcode, mask, seq, n
+
+    def decode_payload(self, data, n: int) -> np.ndarray:
+        """view on the doubles following the header, valid until the next receive"""
+        return np.frombuffer(data, dtype="<f8", count=n, offset=HEADER.size)
@@ -0,0 +1,68 @@
+import logging
+from typing import List, Optional
+from codebase.real_world.base.base_client import FramedSocket
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Owns the connections to the robot server.
+
+    servo channel: low-latency real-time stream (Senders, RealTime)
+    command channel: ad-hoc queries and blocking motions (Getters, Setters, PTP)
+
+    Without `command_port` both channels are the same socket, as before,
+    so the servo stream and queries serialize behind each other.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        command_port: Optional[int] = None,
+        timeout: float = 15.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.command_port = command_port
+        self.timeout = timeout
+        self.servo_channel: Optional[FramedSocket] = None
+        self.command_channel: Optional[FramedSocket] = None
+
+    @property
+    def is_split(self):
+        return self.command_port is not None
+
+    @property
+    def channels(self) -> List[FramedSocket]:
+        if self.servo_channel is None:
+            return []
+        if self.command_channel is self.servo_channel:
+            return [self.servo_channel]
+        return [self.servo_channel, self.command_channel]
+
+    def connect(self):
+        self.servo_channel = FramedSocket.create_connection(self.host, self.port, self.timeout)
+        logger.info(f"Servo channel connected to {self.host}:{self.port}")
+        if self.is_split:
+            self.command_channel = FramedSocket.create_connection(
+                self.host, self.command_port, self.timeout
+            )
+            logger.info(f"Command channel connected to {self.host}:{self.command_port}")
+        else:
+            self.command_channel = self.servo_channel
+
+    def drop(self):
+        """close every channel without ending the session, e.g. after a connection error"""
+        for channel in self.channels:
+            channel.close()
+        self.servo_channel = self.command_channel = None
+
+    def close(self, timeout: float = 1.0):
+        """end the session on every channel, each waits for its ack at most `timeout`"""
+        for channel in self.channels:
+            channel.end_session(timeout)
+        self.servo_channel = self.command_channel = None
+
+        logger.info(f"Connection to {self.host}:{self.port} was destroyed.")
@@ -1,26 +1,47 @@
-from typing import Tuple
+import logging
+import warnings
+from typing import Optional, Tuple
 from utils.data_utils import String2Double
 from socket import socket
 from codebase.real_world.base.base_client import BaseClient
+from codebase.real_world.base.binary_protocol import OPCODES
+
+logger = logging.getLogger(__name__)
 
 
 class Getters(BaseClient):
     def __init__(
-        self, host: str, port: int, trans: Tuple, sock: socket, iter: int = 5
+        self, host: str, port: int, trans: Tuple, sock: socket, iter: Optional[int] = None
     ) -> None:
+        """
+        iter: deprecated and ignored, replies are framed so a request is never resent
+        """
         super().__init__(host, port, trans)
         self.set_socket(sock)
-        self.retry = iter
+        if iter is not None:
+            warnings.warn(
+                "Getters(iter=...) is deprecated and ignored, requests are no longer retried.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
 
     def _get_data(self, command: str, size):
-        command = command + "\n"
-        for _ in range(self.retry):
-            self.send(command)
-            message = self.receive()
-            data = String2Double(message=message, size=size)
-            if data:
-                return data
-        return []
+        # commands without an opcode (e.g. getPin) stay on the text protocol
+        if self.protocol is not None and command in OPCODES:
+            data = self.request_binary(command)
+            if len(data) >= size:
+                return data[:size].tolist()
+            return []
+
+        # replies are framed, one request gets exactly one complete line,
+        # resending on a short read would only desync later replies
+        self.send(command + "\n")
+        message = self.receive()
+        try:
+            return String2Double(message=message, size=size)
+        except (AssertionError, AttributeError, ValueError):
+            logger.error(f"Unexpected reply to {command}: {message}")
+            return []
 
     def get_EEF_pos(self):
         return self._get_data("Eef_pos", 6)
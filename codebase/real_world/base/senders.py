@@ -1,8 +1,54 @@
 import math
-from typing import Tuple
+import enum
+from typing import Dict, List, Tuple
 from utils.data_utils import String2Double
 from socket import socket
 from codebase.real_world.base.base_client import BaseClient
+from codebase.real_world.base.binary_protocol import ProtocolDesyncError
+
+
+class StateField(enum.IntFlag):
+    """robot state fields carried by one combined servo reply, in reply order"""
+
+    EEF_POSE = 1
+    JOINT_POS = 2
+    EXT_TORQUE = 4
+    MEASURED_TORQUE = 8
+    EEF_FORCE = 16
+    EEF_MOMENT = 32
+
+
+STATE_FIELD_SIZES = {
+    StateField.EEF_POSE: 6,
+    StateField.JOINT_POS: 7,
+    StateField.EXT_TORQUE: 7,
+    StateField.MEASURED_TORQUE: 7,
+    StateField.EEF_FORCE: 3,
+    StateField.EEF_MOMENT: 3,
+}
+
+
+def state_size(fields: StateField) -> int:
+    """number of doubles in the combined reply for these fields"""
+    return sum(size for field, size in STATE_FIELD_SIZES.items() if field in fields)
+
+
+# servers without DcSeCarSt_/jpSt_ answer one field per servo command
+EEF_STATE_COMMANDS = {
+    StateField.EEF_POSE: "DcSeCarEEfP_",
+    StateField.JOINT_POS: "DcSeCarJP_",
+    StateField.EXT_TORQUE: "DcSeCarExT_",
+    StateField.MEASURED_TORQUE: "DcSeCarMT_",
+}
+JOINT_STATE_COMMANDS = {
+    StateField.EEF_POSE: "jpEEfP_",
+    StateField.JOINT_POS: "jpJP_",
+    StateField.EXT_TORQUE: "jpExT_",
+    StateField.MEASURED_TORQUE: "jpMT_",
+}
+LEGACY_STATE_FIELDS = (
+    StateField.EEF_POSE | StateField.JOINT_POS | StateField.EXT_TORQUE | StateField.MEASURED_TORQUE
+)
 
 
 class Senders(BaseClient):
@@ -10,27 +56,42 @@ class Senders(BaseClient):
         super().__init__(host, port, trans)
 
         self.set_socket(sock)
+        # the server implements DcSeCarSt_/jpSt_, else one legacy command per field
+        self.combined_state = False
+        # bounded wait for text replies, None keeps the socket's own timeout
+        self.ack_timeout = None
+
+    def set_combined_state(self, combined_state: bool):
+        self.combined_state = combined_state
 
     def _send(self, data: str):
         data = data + "\n"
         self.send(data)
+        if self.ack_timeout is not None:
+            return self.await_ack(self.ack_timeout)
         return self.receive()
 
     # EEF commond
-    def _send_EEF_info(self, data, cmd, ret=False):
+    def _send_EEF_info(self, data, cmd, ret=False, mask=0):
         assert len(data) == 6, "EEF position should be an array of 6 elements."
 
+        if self.protocol is not None:
+            result = self.request_binary(cmd, data, mask)
+            if ret:
+                return result.copy()
+            return
+
+        result = self._send(self._format_EEF_info(data, cmd))
+        if ret:
+            return result
+
+    def _format_EEF_info(self, data, cmd) -> str:
         num = 10000
         formatted_data = [
             str(math.ceil(value * num) / num) if i < 3 else str(value)
             for i, value in enumerate(data)
         ]
-
-        buff = cmd + "_".join(formatted_data) + "\n"
-
-        result = self._send(buff)
-        if ret:
-            return result
+        return cmd + "_".join(formatted_data) + "\n"
 
     def sendEEfPosition(self, x):
         self._send_EEF_info(data=x, cmd="DcSeCarW_", ret=False)
@@ -38,58 +99,128 @@ class Senders(BaseClient):
     def sendEEfPositions(self, x):
         self._send_EEF_info(data=x, cmd="cArtixanPosition_", ret=False)
 
+    def _parse(self, reply, size):
+        """
+        binary replies are already decoded, text replies are parsed
+        Raise: ProtocolDesyncError for a text line that is not the expected reply
+        """
+        if self.protocol is not None:
+            return reply[:size]
+        try:
+            return String2Double(reply, size)
+        except (AssertionError, AttributeError, ValueError) as e:
+            # every later reply would be read as the answer to the wrong command
+            raise ProtocolDesyncError(f"Unexpected servo reply {reply!r}: {e!r}") from e
+
     def sendEEfPositionExTorque(self, x):
-        return String2Double(
-            self._send_EEF_info(data=x, cmd="DcSeCarExT_", ret=True), 7
-        )
+        return self._parse(self._send_EEF_info(data=x, cmd="DcSeCarExT_", ret=True), 7)
 
     def sendEEfPositionGetActualEEFpos(self, x):
-        return String2Double(
-            self._send_EEF_info(data=x, cmd="DcSeCarEEfP_", ret=True), 6
-        )
+        return self._parse(self._send_EEF_info(data=x, cmd="DcSeCarEEfP_", ret=True), 6)
 
     def sendEEfPositionGetActualJpos(self, x):
-        return String2Double(self._send_EEF_info(data=x, cmd="DcSeCarJP_", ret=True), 7)
+        return self._parse(self._send_EEF_info(data=x, cmd="DcSeCarJP_", ret=True), 7)
 
     def sendEEfPositionGetEEF_Force_rel_EEF(self, x):
-        return String2Double(
-            self._send_EEF_info(data=x, cmd="DcSeCarEEfP_", ret=True), 6
-        )
+        return self._parse(self._send_EEF_info(data=x, cmd="DcSeCarEEfP_", ret=True), 6)
 
     def sendEEfPositionMTorque(self, x):
-        return String2Double(self._send_EEF_info(data=x, cmd="DcSeCarMT_", ret=True), 7)
-
-    def _send_Joints_info(self, data, cmd, ret=False):
+        return self._parse(self._send_EEF_info(data=x, cmd="DcSeCarMT_", ret=True), 7)
+
+    def sendEEfPositionGetState(
+        self, x, fields: StateField = StateField.EEF_POSE | StateField.JOINT_POS
+    ) -> Dict[StateField, List[float]]:
+        """
+        Send one EEF servo command, the single reply carries every requested field
+        "DcSeCarSt_<mask>_x_y_z_a_b_c" -> fields concatenated in StateField order
+        Without combined_state the setpoint goes out once per field, legacy commands.
+        """
+        if not self.combined_state:
+            return self._get_state_legacy(x, fields, EEF_STATE_COMMANDS, self._send_EEF_info)
+        if self.protocol is not None:
+            # the mask travels in the frame header
+            reply = self._send_EEF_info(data=x, cmd="DcSeCarSt_", ret=True, mask=int(fields))
+        else:
+            reply = self._send_EEF_info(data=x, cmd=f"DcSeCarSt_{int(fields)}_", ret=True)
+        return self.split_state(self._parse(reply, state_size(fields)), fields)
+
+    def _get_state_legacy(
+        self, x, fields: StateField, commands: Dict[StateField, str], send_info
+    ) -> Dict[StateField, List[float]]:
+        assert fields & ~LEGACY_STATE_FIELDS == 0, "EEF force & moment need the combined state command."
+        state = dict()
+        for field in StateField:
+            if field in fields:
+                reply = send_info(data=x, cmd=commands[field], ret=True)
+                state[field] = self._parse(reply, STATE_FIELD_SIZES[field])
+        return state
+
+    @staticmethod
+    def split_state(values, fields: StateField) -> Dict[StateField, List[float]]:
+        """split the values of one combined reply into its fields"""
+        state = dict()
+        idx = 0
+        for field in StateField:
+            if field in fields:
+                size = STATE_FIELD_SIZES[field]
+                state[field] = values[idx : idx + size]
+                idx += size
+        return state
+
+    def _send_Joints_info(self, data, cmd, ret=False, mask=0):
         assert len(data) == 7, "Joints should be an array of 7 elements."
 
-        num = 10000
-        formatted_data = [str(math.ceil(value * num) / num) for value in data]
+        if self.protocol is not None:
+            result = self.request_binary(cmd, data, mask)
+            if ret:
+                return result.copy()
+            return
 
-        buff = cmd + "_".join(formatted_data) + "\n"
-        result = self._send(buff)
+        result = self._send(self._format_Joints_info(data, cmd))
 
         if ret:
             return result
 
+    def _format_Joints_info(self, data, cmd) -> str:
+        num = 10000
+        formatted_data = [str(math.ceil(value * num) / num) for value in data]
+        return cmd + "_".join(formatted_data) + "\n"
+
     def sendJointsPositions(self, x):
         self._send_Joints_info(data=x, cmd="jp_", ret=False)
 
     def sendJointsPositionsGetMTorque(self, x):
-        return String2Double(self._send_Joints_info(data=x, cmd="jpMT_", ret=True), 7)
+        return self._parse(self._send_Joints_info(data=x, cmd="jpMT_", ret=True), 7)
 
     def sendJointsPositionsGetActualEEFpos(self, x):
-        return String2Double(self._send_Joints_info(data=x, cmd="jpEEfP_", ret=True), 6)
+        return self._parse(self._send_Joints_info(data=x, cmd="jpEEfP_", ret=True), 6)
 
     def sendJointsPositionsGetEEF_Force_rel_EEF(self, x):
-        return String2Double(
+        return self._parse(
             self._send_Joints_info(data=x, cmd="DcSeCarEEfFrelEEF_", ret=True), 6
         )
 
     def sendJointsPositionsGetExTorque(self, x):
-        return String2Double(self._send_Joints_info(data=x, cmd="jpExT_", ret=True), 7)
+        return self._parse(self._send_Joints_info(data=x, cmd="jpExT_", ret=True), 7)
 
     def sendJointsPositionsGetActualJpos(self, x):
-        return String2Double(self._send_Joints_info(data=x, cmd="jpJP_", ret=True), 7)
+        return self._parse(self._send_Joints_info(data=x, cmd="jpJP_", ret=True), 7)
+
+    def sendJointsPositionsGetState(
+        self, x, fields: StateField = StateField.EEF_POSE | StateField.JOINT_POS
+    ) -> Dict[StateField, List[float]]:
+        """
+        Send one joint servo command, the single reply carries every requested field
+        "jpSt_<mask>_j1_..._j7" -> fields concatenated in StateField order
+        Without combined_state the setpoint goes out once per field, legacy commands.
+        """
+        if not self.combined_state:
+            return self._get_state_legacy(x, fields, JOINT_STATE_COMMANDS, self._send_Joints_info)
+        if self.protocol is not None:
+            reply = self._send_Joints_info(data=x, cmd="jpSt_", ret=True, mask=int(fields))
+        else:
+            reply = self._send_Joints_info(data=x, cmd=f"jpSt_{int(fields)}_", ret=True)
+        return self.split_state(self._parse(reply, state_size(fields)), fields)
 
     # functions for arc motion
     def sendCirc1FramePos(self, fpos):
@@ -0,0 +1,178 @@
+import collections
+import selectors
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from codebase.real_world.base.binary_protocol import HEADER, DOUBLE_SIZE, ProtocolDesyncError
+from codebase.real_world.base.senders import (
+    Senders,
+    StateField,
+    state_size,
+    STATE_FIELD_SIZES,
+    EEF_STATE_COMMANDS,
+    JOINT_STATE_COMMANDS,
+    LEGACY_STATE_FIELDS,
+)
+
+
+class ServoPipeline:
+    """
+    Pipelined EEF or joint servo streaming over the sender's connection.
+
+    Setpoints go out on schedule while earlier replies are still in flight,
+    replies are read without blocking and matched to their command by sequence
+    number (from the frame header in binary mode, by order in text mode).
+    Without the sender's combined_state every setpoint goes out once per field
+    with the legacy commands, its state is complete once every reply arrived.
+    Call `drain()` before any blocking request on the same connection.
+    A reply older than `reply_timeout` raises TimeoutError from `poll`, so a link
+    that went silent without closing is detected even while nothing can be sent.
+    """
+
+    def __init__(
+        self,
+        sender: Senders,
+        fields: StateField = StateField.EEF_POSE | StateField.JOINT_POS,
+        max_in_flight: int = 2,
+        reply_timeout: Optional[float] = None,
+    ) -> None:
+        assert max_in_flight >= 1, "At least one command must be allowed in flight."
+
+        self.sender = sender
+        self.sock = sender.sock
+        self.fields = fields
+        self.size = state_size(fields)
+        self.combined_state = sender.combined_state
+        if not self.combined_state:
+            assert fields & ~LEGACY_STATE_FIELDS == 0, "EEF force & moment need the combined state command."
+        self.max_in_flight = max_in_flight
+        self.reply_timeout = reply_timeout
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        # (seq, send monotonic time) of every setpoint without complete state, oldest first
+        self.in_flight = collections.deque()
+        # (seq, field or None for the combined reply) of every frame without reply
+        self.frames = collections.deque()
+        # legacy replies received so far for the oldest setpoint
+        self.partial = dict()
+        self.seq = 0
+
+    @property
+    def n_in_flight(self):
+        return len(self.in_flight)
+
+    @property
+    def can_send(self):
+        return len(self.in_flight) < self.max_in_flight
+
+    def send(self, pose) -> int:
+        """send one EEF setpoint without waiting, Return: its sequence number"""
+        return self._send("DcSeCarSt_", EEF_STATE_COMMANDS, pose, self.sender._format_EEF_info)
+
+    def send_joints(self, jpos) -> int:
+        """send one joint setpoint without waiting, Return: its sequence number"""
+        return self._send("jpSt_", JOINT_STATE_COMMANDS, jpos, self.sender._format_Joints_info)
+
+    def _send(self, cmd: str, legacy_commands: Dict[StateField, str], values, format_info) -> int:
+        if self.combined_state:
+            frame, seq = self._encode(cmd, values, int(self.fields), format_info)
+            self.frames.append((seq, None))
+        else:
+            # the encode buffer is reused, join copies of every frame
+            frames = list()
+            for field in StateField:
+                if field in self.fields:
+                    frame, seq = self._encode(legacy_commands[field], values, 0, format_info)
+                    frames.append(bytes(frame))
+                    self.frames.append((seq, field))
+            frame = b"".join(frames)
+
+        t_send = time.monotonic()
+        self.sock.sendall(frame)
+        self.in_flight.append((seq, t_send))
+        return seq
+
+    def _encode(self, cmd: str, values, mask: int, format_info):
+        """Return: (frame, seq) of one command"""
+        protocol = self.sender.protocol
+        if protocol is not None:
+            frame = protocol.encode(cmd, values, mask)
+            return frame, protocol.seq
+        if self.combined_state:
+            cmd = f"{cmd}{mask}_"
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return format_info(values, cmd).encode("utf-8"), self.seq
+
+    def _next_reply(self) -> Optional[Tuple[Optional[int], np.ndarray]]:
+        """one complete reply from the receive buffer, None if not fully received yet"""
+        protocol = self.sender.protocol
+        if protocol is None:
+            line = self.sock.try_read_line()
+            if line is None:
+                return None
+            field = self.frames[0][1]
+            size = self.size if field is None else STATE_FIELD_SIZES[field]
+            return None, np.array(self.sender._parse(line, size))
+
+        header = self.sock.peek(HEADER.size)
+        if header is None:
+            return None
+        _, _, seq, n = protocol.decode_header(header)
+        frame_size = HEADER.size + DOUBLE_SIZE * n
+        if self.sock.n_buffered < frame_size:
+            return None
+        # fully buffered, does not block
+        self.sock.read_exact(memoryview(protocol.recv_buffer)[:frame_size])
+        return seq, protocol.decode_payload(protocol.recv_buffer, n).copy()
+
+    def poll(self, timeout: float = 0.0) -> List[Tuple[int, Dict[StateField, np.ndarray], float, float]]:
+        """
+        collect every reply received so far, waits at most `timeout` for the first one
+        Return: list of (seq, state, rtt, receive monotonic time), oldest first
+        """
+        replies = list()
+        while self.in_flight:
+            reply = self._next_reply()
+            if reply is None:
+                if not self.selector.select(timeout):
+                    break
+                self.sock.receive_pending()
+                timeout = 0.0
+                continue
+
+            t_recv = time.monotonic()
+            seq, values = reply
+            expected_seq, field = self.frames.popleft()
+            if seq is not None and seq != expected_seq:
+                raise ProtocolDesyncError(
+                    f"Reply {seq} does not match command {expected_seq}, stream is out of sync."
+                )
+            if field is None:
+                state = Senders.split_state(values, self.fields)
+            else:
+                self.partial[field] = values
+                # the setpoint's last frame carries its seq
+                if expected_seq != self.in_flight[0][0]:
+                    continue
+                state, self.partial = self.partial, dict()
+            _, t_send = self.in_flight.popleft()
+            replies.append((expected_seq, state, t_recv - t_send, t_recv))
+        if self.reply_timeout is not None and self.in_flight:
+            age = time.monotonic() - self.in_flight[0][1]
+            if age > self.reply_timeout:
+                raise TimeoutError(f"No servo reply for {age:.3f}s, {len(self.in_flight)} in flight.")
+        return replies
+
+    def drain(self, timeout: float = 1.0):
+        """wait for every reply in flight, Return: the collected replies"""
+        deadline = time.monotonic() + timeout
+        replies = list()
+        while self.in_flight:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{len(self.in_flight)} servo replies still in flight.")
+            replies.extend(self.poll(timeout=remaining))
+        return replies
+
+    def close(self):
+        self.selector.close()
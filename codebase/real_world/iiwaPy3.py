@@ -1,11 +1,9 @@
 import numpy as np
 from typing import Tuple, Union
 import logging
-import socket
 import time
 import copy
 import enum
-import os
 from termcolor import colored, cprint
 from utils.data_utils import pose_euler2quat
 
@@ -16,19 +14,23 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-from codebase.real_world.base.PTP import PTP
-from codebase.real_world.base.getters import Getters
-from codebase.real_world.base.senders import Senders
-from codebase.real_world.base.setters import Setters
-from codebase.real_world.base.RealTime import RealTime
-from codebase.real_world.base.base_client import BaseClient
+from codebase.real_world.base.senders import StateField, STATE_FIELD_SIZES, LEGACY_STATE_FIELDS
+from codebase.real_world.base.servo_pipeline import ServoPipeline
+from codebase.real_world.iiwa_client import IIWAClient
+from codebase.real_world.iiwa_kinematics import iiwa7_fk
 
 import multiprocessing as mp
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict
 from multiprocessing.managers import SharedMemoryManager
 from codebase.shared_memory.shared_memory_queue import SharedMemoryQueue, Full, Empty
 from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+from codebase.shared_memory.shared_ndarray import SharedNDArray
 from common.pose_trajectory_interpolator import PoseTrajectoryInterpolator
+from common.joint_trajectory_interpolator import JposTrajectoryInterpolator
+from common.loop_stats import LoopStats
+from common.latency_compensation import AcquisitionTimeEstimator
+from common.precise_sleep import DeadlineScheduler
+from common.realtime import apply_realtime_config, SOFT_REAL_TIME
 
 np.set_printoptions(precision=2, suppress=True, linewidth=100)
 
@@ -38,57 +40,147 @@ class Command(enum.Enum):
     SERVOL = 1
     SCHEDULE_WAYPOINT = 2
     RESET = 3
-
-
-class IIWAPositionalController(BaseClient, mp.Process):
+    SERVOJ = 4
+    SCHEDULE_JOINT_WAYPOINT = 5
+    QUERY = 6
+
+
+# commands that need the robot in Cartesian / joint direct servo mode
+CARTESIAN_COMMANDS = (Command.SERVOL.value, Command.SCHEDULE_WAYPOINT.value)
+JOINT_COMMANDS = (Command.SERVOJ.value, Command.SCHEDULE_JOINT_WAYPOINT.value)
+
+# receive key -> (field of the combined servo reply, part of it)
+RECEIVE_KEY_FIELDS = {
+    "EEFpos": (StateField.EEF_POSE, slice(0, 3)),
+    "EEFrot": (StateField.EEF_POSE, slice(3, 6)),
+    "Jpos": (StateField.JOINT_POS, slice(None)),
+    "ExtTorque": (StateField.EXT_TORQUE, slice(None)),
+    "MeasuredTorque": (StateField.MEASURED_TORQUE, slice(None)),
+    "EEFforce": (StateField.EEF_FORCE, slice(None)),
+    "EEFmoment": (StateField.EEF_MOMENT, slice(None)),
+}
+
+# query -> (field of the servo reply answering it, robot getter if the reply doesn't)
+QUERIES = {
+    "EEFpose": (StateField.EEF_POSE, "getEEFPos"),
+    "Jpos": (StateField.JOINT_POS, "getJointsPos"),
+    "ExtTorque": (StateField.EXT_TORQUE, "getJointsExternalTorques"),
+    "MeasuredTorque": (StateField.MEASURED_TORQUE, "getJointsMeasuredTorques"),
+    "EEFforce": (StateField.EEF_FORCE, "getEEF_Force"),
+    "EEFmoment": (StateField.EEF_MOMENT, "getEEF_Moment"),
+    "Pin3": (None, "getPin3State"),
+    "Pin10": (None, "getPin10State"),
+    "Pin13": (None, "getPin13State"),
+    "Pin16": (None, "getPin16State"),
+}
+QUERY_NAMES = list(QUERIES)
+# reply slot: request seq, answered seq, number of values, values
+QUERY_SLOT_SIZE = 3 + max(STATE_FIELD_SIZES.values())
+
+
+class IIWAPositionalController(IIWAClient, mp.Process):
     def __init__(
         self,
         shm_manager: SharedMemoryManager,
         receive_keys: Optional[List],
         host: str = "172.31.1.147",
         port: int = 30001,
+        command_port: Optional[int] = None,
         trans: Tuple = (0, 0, 0, 0, 0, 0),
         frequency: int = 100,
         max_pos_speed: float = 32,
         max_rot_speed: float = 0.5,
-        launch_timeout: int = 3,
+        max_joint_speed: float = 0.5,
+        launch_timeout: int = 60,
         soft_real_time: bool = False,
+        rt_config: Optional[Dict] = None,
         verbose: bool = False,
         get_max_k: int = 128,
         use_quat: bool = True,
+        binary_protocol: bool = False,
+        combined_state: bool = False,
+        pipelined: bool = False,
+        max_in_flight: int = 2,
+        deadline_policy: str = "skip",
+        servo_timeout: float = 1.0,
+        reconnect_timeout: float = 30.0,
+        timestamp_method: str = "midpoint",
+        local_fk: bool = False,
+        log_trajectory: bool = False,
     ) -> None:
         """
         frequency: socket connection frequency
-        receive_keys: data definition
+        command_port: separate channel for queries & PTP, None -> share the servo socket
+        receive_keys: published state, any of RECEIVE_KEY_FIELDS, read from the servo reply every tick
         real max_pos_speed: mm/s
         real max_rot_speed: rad/s
+        launch_timeout: covers connecting and homing, both run in the controller process
+        max_joint_speed: rad/s, largest joint displacement per second for SERVOJ
         soft_real_time: enables round-robin scheduling and real-time priority reuqires running scripts before hand
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime, overrides soft_real_time
+        binary_protocol: try the fixed-width binary protocol for servo/state traffic, falls back to text
+        combined_state: the server implements DcSeCarSt_/jpSt_, one reply per tick carries every field,
+            else the setpoint goes out once per field (legacy Sunrise application, no force & moment)
+        pipelined: stream setpoints without waiting for the previous reply, at most max_in_flight unanswered
+        deadline_policy: "skip" or "catch_up" iterations that missed their deadline
+        servo_timeout: longest wait for a servo reply before the link counts as lost
+        reconnect_timeout: give up reconnecting after this many seconds
+        timestamp_method: how robot_timestamp estimates when the robot sampled a reply,
+            "receive", "midpoint" or "fitted", see AcquisitionTimeEstimator
+        local_fk: request only joints every tick, EEF pose from the iiwa7 model including trans
+        log_trajectory: publish every tick's setpoint with the latest actual state to trajectory_buffer
         """
-        # super init
-        BaseClient.__init__(self, host, port, trans)
+        # super init, connected in the controller process so other devices start up meanwhile
+        IIWAClient.__init__(
+            self,
+            host=host,
+            port=port,
+            command_port=command_port,
+            trans=trans,
+            binary_protocol=binary_protocol,
+            combined_state=combined_state,
+            servo_timeout=servo_timeout,
+            reconnect_timeout=reconnect_timeout,
+        )
         mp.Process.__init__(self, name="IIWAPositionalController")
 
-        # robot connection
-        self.connect()
-        self.setter = Setters(host, port, trans, self.sock)
-        self.getter = Getters(host, port, trans, self.sock)
-        self.sender = Senders(host, port, trans, self.sock)
-        self.rtl = RealTime(host, port, trans, self.sock)
-        self.ptp = PTP(host, port, trans, self.sock)
-        self.TCPtrans = trans
-
         self.frequency = frequency
         self.max_pos_speed = max_pos_speed
         self.max_rot_speed = max_rot_speed
+        self.max_joint_speed = max_joint_speed
         self.launch_timeout = launch_timeout
         self.soft_real_time = soft_real_time
+        if rt_config is None and soft_real_time:
+            rt_config = SOFT_REAL_TIME
+        self.rt_config = rt_config
         self.verbose = verbose
         self.get_max_k = get_max_k
         self.use_quat = use_quat
-
-        # init pose (PTP)
-        self.reset_initial_state()
-        self.init_eef_pose = self.getEEFPos()
+        self.pipelined = pipelined
+        self.max_in_flight = max_in_flight
+        self.deadline_policy = deadline_policy
+        self.timestamp_estimator = AcquisitionTimeEstimator(method=timestamp_method)
+        # build ring buffer keys, every one piggybacks on the servo reply
+        if receive_keys is None:
+            receive_keys = ["EEFpos", "EEFrot", "Jpos"]
+        for key in receive_keys:
+            assert key in RECEIVE_KEY_FIELDS, f"Unsupported receive key {key}."
+
+        # fields returned by the combined servo reply every tick,
+        # pose & joints are always needed to restart interpolation,
+        # with local_fk the pose is computed from the joints instead
+        self.local_fk = local_fk
+        self.state_fields = StateField.JOINT_POS
+        if not local_fk:
+            self.state_fields |= StateField.EEF_POSE
+        for key in receive_keys:
+            field = RECEIVE_KEY_FIELDS[key][0]
+            if not (local_fk and field == StateField.EEF_POSE):
+                self.state_fields |= field
+        if not combined_state:
+            assert (
+                self.state_fields & ~LEGACY_STATE_FIELDS == 0
+            ), "EEFforce & EEFmoment receive keys need combined_state."
 
         # build input queue
         example = {
@@ -96,8 +188,11 @@ class IIWAPositionalController(BaseClient, mp.Process):
             "target_pose": np.zeros((7,), dtype=np.float64)
             if self.use_quat
             else np.zeros((6,), dtype=np.float64),
+            "target_jpos": np.zeros((7,), dtype=np.float64),
             "duration": 0.0,  # desired time to reach pose
             "target_time": 0.0,
+            "query": 0,
+            "query_seq": 0,
         }
 
         input_queue = SharedMemoryQueue.create_from_examples(
@@ -107,15 +202,13 @@ class IIWAPositionalController(BaseClient, mp.Process):
         )
 
         # build ring buffer
-        if receive_keys is None:
-            receive_keys = ["EEFpos", "EEFrot", "Jpos"]
-
         example = dict()
-        pose = np.array(getattr(self, "getEEFPos")())
-        example[receive_keys[0]] = pose[:3]
-        example[receive_keys[1]] = pose[3:]
-        example[receive_keys[2]] = np.array(getattr(self, "getJointsPos")())
+        for key in receive_keys:
+            field, part = RECEIVE_KEY_FIELDS[key]
+            example[key] = np.zeros((STATE_FIELD_SIZES[field],), dtype=np.float64)[part]
         example["robot_receive_timestamp"] = time.time()
+        example["robot_timestamp"] = time.time()
+        example["robot_rtt"] = 0.0
         ring_buffer = SharedMemoryRingBuffer.create_from_examples(
             shm_manager=shm_manager,
             examples=example,
@@ -124,11 +217,59 @@ class IIWAPositionalController(BaseClient, mp.Process):
             put_desired_frequency=frequency,
         )
 
+        # every tick's setpoint & the latest actual state, for high-rate recording,
+        # the setpoint of the inactive servo mode is nan
+        trajectory_buffer = None
+        if log_trajectory:
+            example = {
+                "commanded_pose": np.zeros((6,), dtype=np.float64),
+                "commanded_jpos": np.zeros((7,), dtype=np.float64),
+                "actual_pose": np.zeros((6,), dtype=np.float64),
+                "actual_jpos": np.zeros((7,), dtype=np.float64),
+                "robot_timestamp": time.time(),
+                "timestamp": time.time(),
+            }
+            trajectory_buffer = SharedMemoryRingBuffer.create_from_examples(
+                shm_manager=shm_manager,
+                examples=example,
+                get_max_k=get_max_k,
+                get_time_budget=0.2,
+                put_desired_frequency=frequency,
+            )
+
+        # timing telemetry, readable from any process
+        loop_stats = LoopStats(shm_manager=shm_manager, frequency=frequency)
+
+        # EEF pose after homing, written by the controller process
+        init_eef_pose = SharedNDArray.create_from_shape(
+            mem_mgr=shm_manager, shape=(6,), dtype=np.float64
+        )
+
+        # answers to queries, written by the controller process
+        query_slot = SharedNDArray.create_from_shape(
+            mem_mgr=shm_manager, shape=(QUERY_SLOT_SIZE,), dtype=np.float64
+        )
+
         self.ready_event = mp.Event()
+        # ready_event is also set when the process exits, this tells the two apart
+        self.setup_ok = mp.Event()
         self.ready_servo = mp.Event()
+        self.query_lock = mp.Lock()
+        self._query_slot = query_slot
+        # latest servo reply & its robot_timestamp, controller process only
+        self.last_reply = None
+        self.last_robot_timestamp = 0.0
+        self.trajectory_buffer = trajectory_buffer
         self.input_queue = input_queue
         self.ring_buffer = ring_buffer
         self.receive_keys = receive_keys
+        self.loop_stats = loop_stats
+        self._init_eef_pose = init_eef_pose
+
+    @property
+    def init_eef_pose(self) -> np.ndarray:
+        """EEF pose after the last homing, valid once the controller is ready"""
+        return self._init_eef_pose.get().copy()
 
     # ========= launch method ===========
     def start(self, wait=True):
@@ -152,6 +293,10 @@ class IIWAPositionalController(BaseClient, mp.Process):
 
     def start_wait(self):
         self.ready_event.wait(self.launch_timeout)
+        if not self.setup_ok.is_set():
+            raise RuntimeError(
+                "[IIWAPositionalController] Setup failed or timed out, see the controller log."
+            )
         assert self.is_alive()
 
     def stop_wait(self):
@@ -159,7 +304,7 @@ class IIWAPositionalController(BaseClient, mp.Process):
 
     @property
     def is_ready(self):
-        return self.ready_event.is_set()
+        return self.setup_ok.is_set() and self.ready_event.is_set()
 
     # ========= context manager ===========
     def __enter__(self):
@@ -186,16 +331,62 @@ class IIWAPositionalController(BaseClient, mp.Process):
         }
         self.input_queue.put(message)
 
+    def servoJ(self, jpos, duration=0.1):
+        """
+        joint space servo, the arm leaves Cartesian servoing until the next servoL
+        duration: desired time to reach jpos
+        """
+        assert duration >= (1 / self.frequency)
+        jpos = np.array(jpos)
+        assert jpos.shape == (7,)
+
+        message = {
+            "cmd": Command.SERVOJ.value,
+            "target_jpos": jpos,
+            "duration": duration,
+        }
+        self.input_queue.put(message)
+
     def reset_robot(self):
         message = {
             "cmd": Command.RESET.value,
         }
         self.input_queue.put(message)
 
+    def query(self, name: str, timeout: float = 1.0) -> np.ndarray:
+        """
+        ad-hoc robot query from any process, served by the controller between
+        servo ticks: from its latest servo reply if that carries the field,
+        else with one getter call on the command channel
+        name: one of QUERIES
+        Return: the values, empty if the robot's reply was malformed
+        Raise: RuntimeError when the controller could not answer, TimeoutError
+        """
+        assert name in QUERIES, f"Unsupported query {name}."
+        slot = self._query_slot.get()
+        with self.query_lock:
+            seq = slot[0] + 1
+            slot[0] = seq
+            message = {
+                "cmd": Command.QUERY.value,
+                "query": QUERY_NAMES.index(name),
+                "query_seq": seq,
+            }
+            self.input_queue.put(message)
+
+            deadline = time.monotonic() + timeout
+            while slot[1] != seq:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Query {name} not answered within {timeout}s.")
+                time.sleep(0.001)
+            if slot[2] < 0:
+                raise RuntimeError(f"Query {name} failed in the controller.")
+            return slot[3 : 3 + int(slot[2])].copy()
+
     def schedule_waypoint(self, pose, target_time):
         assert target_time > time.time()
         pose = np.array(pose)
-        assert pose.shape == (6,)
+        assert pose.shape == self.pose_shape
 
         message = {
             "cmd": Command.SCHEDULE_WAYPOINT.value,
@@ -204,6 +395,41 @@ class IIWAPositionalController(BaseClient, mp.Process):
         }
         self.input_queue.put(message)
 
+    def schedule_waypoints(self, poses, target_times):
+        """
+        schedule a whole action chunk with a single queue write
+        poses: (N, 7) or (N, 6) matching use_quat, target_times: (N,) global time
+        """
+        poses = np.array(poses, dtype=np.float64)
+        target_times = np.array(target_times, dtype=np.float64)
+        assert poses.shape[1:] == self.pose_shape
+        assert len(poses) == len(target_times)
+        if len(poses) == 0:
+            return
+
+        message = {
+            "cmd": Command.SCHEDULE_WAYPOINT.value,
+            "target_pose": poses,
+            "target_time": target_times,
+        }
+        self.input_queue.put_k(message)
+
+    def schedule_joint_waypoint(self, jpos, target_time):
+        assert target_time > time.time()
+        jpos = np.array(jpos)
+        assert jpos.shape == (7,)
+
+        message = {
+            "cmd": Command.SCHEDULE_JOINT_WAYPOINT.value,
+            "target_jpos": jpos,
+            "target_time": target_time,
+        }
+        self.input_queue.put(message)
+
+    @property
+    def pose_shape(self):
+        return (7,) if self.use_quat else (6,)
+
     # ========= receive APIs =============
     def get_state(self, k=None, out=None):
         if k is None:
@@ -214,12 +440,30 @@ class IIWAPositionalController(BaseClient, mp.Process):
     def get_all_state(self):
         return self.ring_buffer.get_all()
 
+    def get_trajectory(self):
+        """last get_max_k ticks of setpoints & actual state, needs log_trajectory"""
+        assert self.trajectory_buffer is not None, "Trajectory logging is disabled."
+        return self.trajectory_buffer.get_all()
+
+    def get_loop_stats(self, out=None):
+        """latest loop period, send/recv & interpolation time, overruns and latency histogram"""
+        return self.loop_stats.get(out=out)
+
     def run(self):
         cprint("Now Robot threading is running!", "yellow")
-        if self.soft_real_time:
-            os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(20))
+        apply_realtime_config(
+            self.rt_config,
+            buffers=[self.input_queue, self.ring_buffer, self.loop_stats.ring_buffer],
+            name=self.name,
+        )
 
+        pipeline = None
+        # the finally block stops whichever servo mode is active
+        servo_mode = "cartesian"
         try:
+            # connect & home here, in parallel with the other devices
+            self.setup_robot()
+
             # main loop
             dt = 1.0 / self.frequency
             curr_pose = self.getEEFPos()
@@ -234,334 +478,372 @@ class IIWAPositionalController(BaseClient, mp.Process):
                 times=[curr_t], poses=[target_pose]
             )
 
+            # joint space interpolation, only while servoing joints
+            jpos_interp = None
+
             iter_idx = 0
             keep_running = True
 
+            if self.pipelined:
+                pipeline = ServoPipeline(
+                    self.sender,
+                    fields=self.state_fields,
+                    max_in_flight=self.max_in_flight,
+                    reply_timeout=self.servo_timeout,
+                )
+
             self.realTime_startDirectServoCartesian()
             self.ready_servo.set()
 
+            # absolute deadlines t0 + k*dt, overruns don't shift the schedule
+            scheduler = DeadlineScheduler(dt=dt, policy=self.deadline_policy)
             while keep_running:
-                t_start = time.perf_counter()
-
-                t_now = time.monotonic()
-                # diff = t_now - pose_interp.times[-1]
-                # if diff > 0:
-                #     print("extrapolate", diff)
-                pose_command = pose_interp(t_now)
-                if self.use_quat:
-                    pose_command = pose_euler2quat(pose_command)
-                # print(pose_command)
-                # update robot state
-                state = dict()
-                ActualPose = np.array(
-                    getattr(self, "sendEEfPositionGetActualEEFpos")(pose_command)
-                )
-                state["EEFpos"] = ActualPose[:3]
-                state["EEFrot"] = ActualPose[3:]
-                state["Jpos"] = np.array(
-                    getattr(self, "sendEEfPositionGetActualJpos")(pose_command)
-                )
-
-                state["robot_receive_timestamp"] = time.time()
-                self.ring_buffer.put(state)
-
-                # fetch command from queue
                 try:
-                    commands = self.input_queue.get_all()
-                    n_cmd = len(commands["cmd"])
-                except Empty:
-                    n_cmd = 0
-
-                # execute commands
-                for i in range(n_cmd):
-                    command = dict()
-                    for key, value in commands.items():
-                        command[key] = value[i]
-                    cmd = command["cmd"]
-
-                    if cmd == Command.STOP.value:
-                        keep_running = False
-                        # stop immediately, ignore later commands
-                        break
-                    elif cmd == Command.SERVOL.value:
-                        # since curr_pose always lag behind curr_target_pose
-                        # if we start the next interpolation with curr_pose
-                        # the command robot receive will have discontinouity
-                        # and cause jittery robot behavior.
-                        target_pose = command["target_pose"]
-                        duration = float(command["duration"])
-                        curr_time = t_now + dt
-                        t_insert = curr_time + duration
-                        pose_interp = pose_interp.drive_to_waypoint(
-                            pose=target_pose,
-                            time=t_insert,
-                            curr_time=curr_time,
-                            max_pos_speed=self.max_pos_speed,
-                            max_rot_speed=self.max_rot_speed,
+                    t_start = time.perf_counter()
+
+                    t_now = time.monotonic()
+                    # diff = t_now - pose_interp.times[-1]
+                    # if diff > 0:
+                    #     print("extrapolate", diff)
+                    if servo_mode == "joint":
+                        jpos_command = jpos_interp(t_now)
+                    else:
+                        pose_command = pose_interp(t_now)
+                        if self.use_quat:
+                            pose_command = pose_euler2quat(pose_command)
+                    t_interp = time.perf_counter()
+                    # print(pose_command)
+                    # update robot state, one command & one reply per tick
+                    if pipeline is None:
+                        t_send = time.monotonic()
+                        if servo_mode == "joint":
+                            reply = self.sendJointsPositionsGetState(jpos_command, self.state_fields)
+                        else:
+                            reply = self.sendEEfPositionGetState(pose_command, self.state_fields)
+                        self._put_state(reply, rtt=time.monotonic() - t_send, t_recv=time.monotonic())
+                    else:
+                        # publish whatever arrived, the next setpoint goes out regardless
+                        for _, reply, rtt, t_recv in pipeline.poll():
+                            self._put_state(reply, rtt=rtt, t_recv=t_recv)
+                        if pipeline.can_send:
+                            if servo_mode == "joint":
+                                pipeline.send_joints(jpos_command)
+                            else:
+                                pipeline.send(pose_command)
+                    t_send_recv = time.perf_counter()
+
+                    if self.trajectory_buffer is not None and self.last_reply is not None:
+                        self._put_trajectory(
+                            servo_mode,
+                            jpos_command if servo_mode == "joint" else pose_command,
+                            t_command=AcquisitionTimeEstimator.to_wall_time(t_now),
                         )
-                        last_waypoint_time = t_insert
-                        if self.verbose:
-                            cprint(
-                                f"[IIWAPositionalController] New pose target:{target_pose} duration:{duration}s",
-                                "red",
+
+                    # fetch command from queue
+                    try:
+                        commands = self.input_queue.get_all()
+                        n_cmd = len(commands["cmd"])
+                    except Empty:
+                        n_cmd = 0
+
+                    # execute commands
+                    for i in range(n_cmd):
+                        command = dict()
+                        for key, value in commands.items():
+                            command[key] = value[i]
+                        cmd = command["cmd"]
+
+                        # mode switches block, interpolation restarts from the measured state
+                        if cmd in CARTESIAN_COMMANDS and servo_mode != "cartesian":
+                            servo_mode = self._switch_servo_mode("cartesian", pipeline)
+                            t_now = time.monotonic()
+                            last_waypoint_time = t_now
+                            target_pose = np.array(self.last_reply[StateField.EEF_POSE])
+                            if self.use_quat:
+                                target_pose = pose_euler2quat(target_pose)
+                            pose_interp = PoseTrajectoryInterpolator(
+                                times=[t_now], poses=[target_pose]
                             )
-                    elif cmd == Command.SCHEDULE_WAYPOINT.value:
-                        target_pose = command["target_pose"]
-                        target_time = float(command["target_time"])
-                        # translate global time to monotonic time
-                        target_time = time.monotonic() - time.time() + target_time
-                        curr_time = t_now + dt
-                        pose_interp = pose_interp.schedule_waypoint(
-                            pose=target_pose,
-                            time=target_time,
-                            max_pos_speed=self.max_pos_speed,
-                            max_rot_speed=self.max_rot_speed,
-                            curr_time=curr_time,
-                            last_waypoint_time=last_waypoint_time,
-                        )
-                        last_waypoint_time = target_time
-                    elif cmd == Command.RESET.value:
-                        self.realTime_stopDirectServoCartesian()
-                        self.reset_initial_state()
-                        target_pose = self.getEEFPos()
-                        curr_time = time.monotonic()
-                        self.init_eef_pose = target_pose
-                        if self.use_quat:
-                            target_pose = pose_euler2quat(target_pose)
-                        if self.verbose:
-                            cprint(
-                                f"After resetting, target pose -> {target_pose}",
-                                color="blue",
+                            scheduler.reset()
+                        elif cmd in JOINT_COMMANDS and servo_mode != "joint":
+                            servo_mode = self._switch_servo_mode("joint", pipeline)
+                            t_now = time.monotonic()
+                            last_waypoint_time = t_now
+                            jpos_interp = JposTrajectoryInterpolator(
+                                times=[t_now], jposes=[self.last_reply[StateField.JOINT_POS]]
                             )
-                        self.realTime_startDirectServoCartesian()
-
-                        del pose_interp
-                        pose_interp = PoseTrajectoryInterpolator(
-                            times=[curr_time], poses=[target_pose]
+                            scheduler.reset()
+
+                        if cmd == Command.STOP.value:
+                            keep_running = False
+                            # stop immediately, ignore later commands
+                            self._fail_queries(commands, start=i + 1)
+                            break
+                        elif cmd == Command.SERVOL.value:
+                            # since curr_pose always lag behind curr_target_pose
+                            # if we start the next interpolation with curr_pose
+                            # the command robot receive will have discontinouity
+                            # and cause jittery robot behavior.
+                            target_pose = command["target_pose"]
+                            duration = float(command["duration"])
+                            curr_time = t_now + dt
+                            t_insert = curr_time + duration
+                            pose_interp = pose_interp.drive_to_waypoint(
+                                pose=target_pose,
+                                time=t_insert,
+                                curr_time=curr_time,
+                                max_pos_speed=self.max_pos_speed,
+                                max_rot_speed=self.max_rot_speed,
+                            )
+                            last_waypoint_time = t_insert
+                            if self.verbose:
+                                cprint(
+                                    f"[IIWAPositionalController] New pose target:{target_pose} duration:{duration}s",
+                                    "red",
+                                )
+                        elif cmd == Command.SCHEDULE_WAYPOINT.value:
+                            target_pose = command["target_pose"]
+                            target_time = float(command["target_time"])
+                            # translate global time to monotonic time
+                            target_time = time.monotonic() - time.time() + target_time
+                            curr_time = t_now + dt
+                            pose_interp = pose_interp.schedule_waypoint(
+                                pose=target_pose,
+                                time=target_time,
+                                max_pos_speed=self.max_pos_speed,
+                                max_rot_speed=self.max_rot_speed,
+                                curr_time=curr_time,
+                                last_waypoint_time=last_waypoint_time,
+                            )
+                            last_waypoint_time = target_time
+                        elif cmd in JOINT_COMMANDS:
+                            target_jpos = command["target_jpos"]
+                            curr_time = t_now + dt
+                            if cmd == Command.SERVOJ.value:
+                                t_insert = curr_time + float(command["duration"])
+                                jpos_interp = jpos_interp.drive_to_waypoint(
+                                    jpos=target_jpos,
+                                    time=t_insert,
+                                    curr_time=curr_time,
+                                    max_rot_speed=self.max_joint_speed,
+                                )
+                            else:
+                                # translate global time to monotonic time
+                                t_insert = time.monotonic() - time.time() + float(command["target_time"])
+                                jpos_interp = jpos_interp.schedule_waypoint(
+                                    jpos=target_jpos,
+                                    time=t_insert,
+                                    max_rot_speed=self.max_joint_speed,
+                                    curr_time=curr_time,
+                                    last_waypoint_time=last_waypoint_time,
+                                )
+                            last_waypoint_time = t_insert
+                        elif cmd == Command.RESET.value:
+                            if pipeline is not None:
+                                pipeline.drain()
+                            if servo_mode == "joint":
+                                self.realTime_stopDirectServoJoints()
+                                servo_mode = "cartesian"
+                            else:
+                                self.realTime_stopDirectServoCartesian()
+                            self.reset_initial_state()
+                            target_pose = self.getEEFPos()
+                            curr_time = time.monotonic()
+                            self._init_eef_pose.get()[:] = target_pose
+                            if self.use_quat:
+                                target_pose = pose_euler2quat(target_pose)
+                            if self.verbose:
+                                cprint(
+                                    f"After resetting, target pose -> {target_pose}",
+                                    color="blue",
+                                )
+                            self.realTime_startDirectServoCartesian()
+
+                            del pose_interp
+                            pose_interp = PoseTrajectoryInterpolator(
+                                times=[curr_time], poses=[target_pose]
+                            )
+                            # homing blocked on purpose, don't count it as overruns
+                            scheduler.reset()
+                            self._fail_queries(commands, start=i + 1)
+                            break
+                        elif cmd == Command.QUERY.value:
+                            self._answer_query(
+                                QUERY_NAMES[int(command["query"])],
+                                command["query_seq"],
+                                pipeline,
+                            )
+                        else:
+                            keep_running = False
+                            self._fail_queries(commands, start=i + 1)
+                            break
+                    if pipeline is not None:
+                        # wait on the socket, so replies are stamped as they arrive
+                        t_wait = scheduler.next_deadline - scheduler.slack_time - time.monotonic()
+                        while pipeline.n_in_flight > 0 and t_wait > 0:
+                            for _, reply, rtt, t_recv in pipeline.poll(timeout=t_wait):
+                                self._put_state(reply, rtt=rtt, t_recv=t_recv)
+                            t_wait = scheduler.next_deadline - scheduler.slack_time - time.monotonic()
+                except OSError as e:
+                    # link lost: reconnect without homing, resync from the actual state
+                    cprint(f"[IIWAPositionalController] Connection lost: {e}", "red")
+                    if pipeline is not None:
+                        pipeline.close()
+                    outage, target_pose, jpos = self.reconnect(servo_mode)
+                    self.loop_stats.record_outage(outage)
+                    # the new connection may take another route
+                    self.timestamp_estimator.reset()
+                    if self.pipelined:
+                        pipeline = ServoPipeline(
+                            self.sender,
+                            fields=self.state_fields,
+                            max_in_flight=self.max_in_flight,
+                            reply_timeout=self.servo_timeout,
                         )
-                        break
-                    else:
-                        keep_running = False
-                        break
-                t_end = time.perf_counter()
-                if t_end - t_start < dt:
-                    time.sleep(dt - t_end + t_start)
+
+                    t_now = time.monotonic()
+                    last_waypoint_time = t_now
+                    if self.use_quat:
+                        target_pose = pose_euler2quat(target_pose)
+                    pose_interp = PoseTrajectoryInterpolator(
+                        times=[t_now], poses=[target_pose]
+                    )
+                    jpos_interp = JposTrajectoryInterpolator(times=[t_now], jposes=[jpos])
+                    scheduler.reset()
+                    continue
+                n_missed = scheduler.wait()
 
                 # first loop successful, ready to receive command
                 if iter_idx == 0:
                     print("IIWA ready event is set!!!")
+                    self.setup_ok.set()
                     self.ready_event.set()
                 iter_idx += 1
 
-                if self.verbose:
-                    print(
-                        f"[IIWAPositionalController] Actual frequency {1/(time.perf_counter() - t_start)}"
-                    )
+                self.loop_stats.record(
+                    loop_period=time.perf_counter() - t_start,
+                    send_recv_time=t_send_recv - t_interp,
+                    interp_time=t_interp - t_start,
+                    overrun=n_missed,
+                )
 
         finally:
             # terminate
-            self.realTime_stopDirectServoCartesian()
-            self.reset_initial_state()
-            self.close()
+            try:
+                if pipeline is not None:
+                    pipeline.drain()
+                    pipeline.close()
+                if self.ptp is not None:
+                    if servo_mode == "joint":
+                        self.realTime_stopDirectServoJoints()
+                    else:
+                        self.realTime_stopDirectServoCartesian()
+                    self.reset_initial_state()
+                    self.close()
+            except OSError as e:
+                logger.error(f"Shutdown without homing, connection lost: {e}")
             self.ready_event.set()
 
-    def connect(self):
-        try:
-            self.set_socket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
-            self.sock.settimeout(15.0)
-            self.sock.connect((self.host, self.port))
-            logger.info(f"Connected to {self.host}:{self.port}")
-        except socket.error as e:
-            logger.error(f"Connection failed: {e}")
-
-        # Update the transform of the TCP if one is specified
-        if all(num == 0 for num in self.trans):
-            logger.info("No TCP transform in Flange Frame is defined.")
-            logger.info(
-                f"The following (default) TCP transform is utilized: {self.trans}"
-            )
-            return
-
-        logger.info("Trying to mount the following TCP transform:")
-        string_tuple = (
-            "x (mm)",
-            "y (mm)",
-            "z (mm)",
-            "alfa (rad)",
-            "beta (rad)",
-            "gamma (rad)",
+    def _put_state(self, reply, rtt: float, t_recv: float):
+        """t_recv: time.monotonic() the reply arrived"""
+        if self.local_fk:
+            reply[StateField.EEF_POSE] = iiwa7_fk(reply[StateField.JOINT_POS], self.trans)
+        state = dict()
+        for key in self.receive_keys:
+            field, part = RECEIVE_KEY_FIELDS[key]
+            state[key] = np.asarray(reply[field])[part]
+        state["robot_receive_timestamp"] = self.timestamp_estimator.to_wall_time(t_recv)
+        state["robot_timestamp"] = self.timestamp_estimator.to_wall_time(
+            self.timestamp_estimator(t_send=t_recv - rtt, t_recv=t_recv)
         )
-
-        for i in range(6):
-            print(string_tuple[i] + ": " + str(self.trans[i]))
-
-        da_message = "TFtrans_" + "_".join(map(str, self.trans)) + "\n"
-        self.send(da_message)
-        return_ack_nack = self.receive()
-
-        if "done" in return_ack_nack:
-            logger.info("Specified TCP transform mounted successfully")
+        state["robot_rtt"] = rtt
+        self.ring_buffer.put(state)
+        self.loop_stats.record_latency(rtt)
+        self.last_reply = reply
+        self.last_robot_timestamp = state["robot_timestamp"]
+
+    def _put_trajectory(self, servo_mode: str, command, t_command: float):
+        """t_command: time.time() the setpoint was interpolated for"""
+        commanded_pose = np.full((6,), np.nan)
+        commanded_jpos = np.full((7,), np.nan)
+        if servo_mode == "joint":
+            commanded_jpos[:] = command
         else:
-            raise RuntimeError("Could not mount the specified TCP")
-
-    def reset_initial_state(self):
-        init_jpos = [0, np.pi * 30 / 180, 0, -np.pi * 80 / 180, 0, np.pi * 70 / 180, 0]
-        # joint_deviations = np.random.uniform(
-        #     low=-1.0 * 3.14 / 180, high=1.0 * 3.14 / 180, size=7
-        # )
-        # init_jpos += joint_deviations
-        init_vel = [0.2]
-        cprint(f"Reset to jpos: {init_jpos}", "blue")
-        self.movePTPJointSpace(jpos=init_jpos, relVel=init_vel)
-
-    # PTP motion
-    """
-    Joint space motion
-    """
-
-    def movePTPJointSpace(self, jpos, relVel):
-        self.ptp.movePTPJointSpace(jpos, relVel)
-
-    def movePTPHomeJointSpace(self, relVel):
-        self.ptp.movePTPHomeJointSpace(relVel)
-
-    def movePTPTransportPositionJointSpace(self, relVel):
-        self.ptp.movePTPTransportPositionJointSpace(relVel)
-
-    def movePTPLineEEF(self, pos, vel):
-        self.ptp.movePTPLineEEF(pos, vel)
-
-    """
-    Cartesian linear  motion
-    """
-
-    def movePTPLineEEF(self, pos, vel):
-        self.ptp.movePTPLineEEF(pos, vel)
-
-    def movePTPLineEefRelBase(self, pos, vel):
-        self.ptp.movePTPLineEefRelBase(pos, vel)
-
-    def movePTPLineEefRelEef(self, pos, vel):
-        self.ptp.movePTPLineEefRelEef(pos, vel)
-
-    """
-    Circular motion
-    """
-
-    def movePTPCirc1OrintationInter(self, f1, f2, vel):
-        self.ptp.movePTPCirc1OrintationInter(f1, f2, vel)
-
-    def movePTPArcYZ_AC(self, theta, c, vel):
-        self.ptp.movePTPArcYZ_AC(theta, c, vel)
-
-    def movePTPArcXZ_AC(self, theta, c, vel):
-        self.ptp.movePTPArcXZ_AC(theta, c, vel)
-
-    def movePTPArcXY_AC(self, theta, c, vel):
-        self.ptp.movePTPArcXY_AC(theta, c, vel)
-
-    def movePTPArc_AC(self, theta, c, k, vel):
-        self.ptp.movePTPArc_AC(theta, c, k, vel)
-
-    # realtime motion control
-    def realTime_stopImpedanceJoints(self):
-        self.rtl.realTime_stopImpedanceJoints()
-
-    def realTime_startDirectServoCartesian(self):
-        self.rtl.realTime_startDirectServoCartesian()
-
-    def realTime_stopDirectServoCartesian(self):
-        self.rtl.realTime_stopDirectServoCartesian()
-
-    def realTime_stopDirectServoJoints(self):
-        self.rtl.realTime_stopDirectServoJoints()
-
-    def realTime_startDirectServoJoints(self):
-        self.rtl.realTime_startDirectServoJoints()
-
-    def realTime_startImpedanceJoints(
-        self, weightOfTool, cOMx, cOMy, cOMz, cStiness, rStifness, nStifness
-    ):
-        self.rtl.realTime_startImpedanceJoints(
-            weightOfTool, cOMx, cOMy, cOMz, cStiness, rStifness, nStifness
+            commanded_pose[:] = command
+        self.trajectory_buffer.put(
+            {
+                "commanded_pose": commanded_pose,
+                "commanded_jpos": commanded_jpos,
+                "actual_pose": self.last_reply[StateField.EEF_POSE],
+                "actual_jpos": self.last_reply[StateField.JOINT_POS],
+                "robot_timestamp": self.last_robot_timestamp,
+                "timestamp": t_command,
+            }
         )
 
-    # Joint space servo command
-    def sendJointsPositionsGetMTorque(self, x):
-        return self.sender.sendJointsPositionsGetMTorque(x)
-
-    def sendJointsPositionsGetExTorque(self, x):
-        return self.sender.sendJointsPositionsGetExTorque(x)
-
-    def sendJointsPositionsGetActualEEFpos(self, x):
-        return self.sender.sendJointsPositionsGetActualEEFpos(x)
-
-    def sendJointsPositionsGetEEF_Force_rel_EEF(self, x):
-        return self.sender.sendJointsPositionsGetEEF_Force_rel_EEF(x)
-
-    def sendJointsPositionsGetActualJpos(self, x):
-        return self.sender.sendJointsPositionsGetActualJpos(x)
-
-    # Crtesian space servo command
-    def sendEEfPosition(self, x):
-        self.sender.sendEEfPosition(x)
-
-    def sendEEfPositionGetExTorque(self, x):
-        return self.sender.sendEEfPositionExTorque(x)
-
-    def sendEEfPositionGetActualEEFpos(self, x):
-        return self.sender.sendEEfPositionGetActualEEFpos(x)
-
-    def sendEEfPositionGetActualJpos(self, x):
-        return self.sender.sendEEfPositionGetActualJpos(x)
-
-    def sendEEfPositionGetEEF_Force_rel_EEF(self, x):
-        return self.sender.sendEEfPositionGetEEF_Force_rel_EEF(x)
-
-    def sendEEfPositionGetMTorque(self, x):
-        return self.sender.sendEEfPositionMTorque(x)
-
-    # getters
-    def getEEFPos(self):
-        return self.getter.get_EEF_pos()
-
-    def getEEF_Force(self):
-        return self.getter.get_EEF_force()
-
-    def getEEFCartizianPosition(self):
-        return self.getter.get_EEF_CartizianPos()
-
-    def getEEF_Moment(self):
-        return self.getter.get_EEF_moment()
-
-    def getJointsPos(self):
-        return self.getter.get_JointPos()
-
-    def getJointsExternalTorques(self):
-        return self.getter.get_Joints_ExternalTorques()
-
-    def getJointsMeasuredTorques(self):
-        return self.getter.get_Joints_MeasuredTorques()
-
-    def getMeasuredTorqueAtJoint(self, x):
-        return self.getter.get_MeasuredTorques_at_Joint(x)
-
-    def getEEFCartizianOrientation(self):
-        return self.getter.get_EEF_CartizianOrientation()
-
-    # get pin states
-    def getPin3State(self):
-        return self.getter.get_pinState(3)
-
-    def getPin10State(self):
-        return self.getter.get_pinState(10)
+    def _answer_query(self, name: str, seq: float, pipeline: Optional[ServoPipeline]):
+        field, getter = QUERIES[name]
+        try:
+            if self.last_reply is not None and field in self.last_reply:
+                values = self.last_reply[field]
+            else:
+                if pipeline is not None and not self.connection.is_split:
+                    # the getter reply must not interleave with servo replies in flight
+                    for _, reply, rtt, t_recv in pipeline.drain():
+                        self._put_state(reply, rtt=rtt, t_recv=t_recv)
+                values = getattr(self, getter)()
+            values = np.asarray(values, dtype=np.float64).reshape(-1)
+        except OSError:
+            # link lost, the loop reconnects
+            self._publish_query(seq, None)
+            raise
+        except Exception as e:
+            # a bad query must not take down the servo loop
+            logger.error(f"Query {name} failed: {e!r}")
+            self._publish_query(seq, None)
+            return
+        self._publish_query(seq, values)
+
+    def _fail_queries(self, commands: Dict[str, np.ndarray], start: int):
+        """fail the queries of a command batch that won't be executed"""
+        for i in range(start, len(commands["cmd"])):
+            if commands["cmd"][i] == Command.QUERY.value:
+                self._publish_query(commands["query_seq"][i], None)
+
+    def _publish_query(self, seq: float, values: Optional[np.ndarray]):
+        """values None -> the query failed"""
+        slot = self._query_slot.get()
+        if values is None:
+            slot[2] = -1
+        else:
+            slot[3 : 3 + len(values)] = values
+            slot[2] = len(values)
+        # publish last, the caller waits for it
+        slot[1] = seq
 
-    def getPin13State(self):
-        return self.getter.get_pinState(13)
+    def _switch_servo_mode(self, mode: str, pipeline: Optional[ServoPipeline]) -> str:
+        """
+        switch the direct servo mode of the robot, blocks for the switch (~0.6s)
+        Return: the new mode
+        """
+        if pipeline is not None:
+            # every reply in flight belongs to the old mode
+            for _, reply, rtt, t_recv in pipeline.drain():
+                self._put_state(reply, rtt=rtt, t_recv=t_recv)
+        if mode == "joint":
+            self.realTime_stopDirectServoCartesian()
+            self.realTime_startDirectServoJoints()
+        else:
+            self.realTime_stopDirectServoJoints()
+            self.realTime_startDirectServoCartesian()
+        if self.verbose:
+            cprint(f"[IIWAPositionalController] Servo mode -> {mode}", "red")
+        return mode
 
-    def getPin16State(self):
-        return self.getter.get_pinState(16)
+    def setup_robot(self):
+        """connect every client, negotiate the protocol and home the robot (PTP)"""
+        self.connect_clients()
 
-    # setters
-    def set_OnOff(self, cmd):
-        self.setter.set_OnOff(cmd)
+        # init pose (PTP)
+        self.reset_initial_state()
+        self._init_eef_pose.get()[:] = self.getEEFPos()
@@ -0,0 +1,329 @@
+import numpy as np
+from typing import List, Optional, Tuple
+import logging
+import socket
+import time
+from termcolor import cprint
+
+FORMAT = "[%(asctime)s][%(levelname)s]: %(message)s"
+logging.basicConfig(
+    level=logging.INFO, format=FORMAT, handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+from codebase.real_world.base.PTP import PTP
+from codebase.real_world.base.getters import Getters
+from codebase.real_world.base.senders import Senders
+from codebase.real_world.base.setters import Setters
+from codebase.real_world.base.RealTime import RealTime
+from codebase.real_world.base.base_client import BaseClient
+from codebase.real_world.base.connection_manager import ConnectionManager
+
+
+class IIWAClient(BaseClient):
+    """
+    Every client of one iiwa arm on its connection channels, no process or loop.
+    Connecting happens explicitly through `connect_clients`.
+    """
+
+    def __init__(
+        self,
+        host: str = "172.31.1.147",
+        port: int = 30001,
+        command_port: Optional[int] = None,
+        trans: Tuple = (0, 0, 0, 0, 0, 0),
+        binary_protocol: bool = False,
+        combined_state: bool = False,
+        servo_timeout: float = 1.0,
+        reconnect_timeout: float = 30.0,
+    ) -> None:
+        """
+        command_port: separate channel for queries & PTP, None -> share the servo socket
+        binary_protocol: try the fixed-width binary protocol for servo/state traffic, falls back to text
+        combined_state: the server implements DcSeCarSt_/jpSt_, one reply per servo tick,
+            else one legacy servo command per state field
+        servo_timeout: longest wait for a servo reply before the link counts as lost
+        reconnect_timeout: give up reconnecting after this many seconds
+        """
+        BaseClient.__init__(self, host, port, trans)
+
+        # servo stream and queries/PTP on their own channels
+        self.connection = ConnectionManager(host, port, command_port)
+        self.setter = None
+        self.getter = None
+        self.sender = None
+        self.rtl = None
+        self.ptp = None
+        self.TCPtrans = trans
+        self.binary_protocol = binary_protocol
+        self.combined_state = combined_state
+        self.servo_timeout = servo_timeout
+        self.reconnect_timeout = reconnect_timeout
+
+    def connect_clients(self):
+        """(re)connect and build every client on the fresh channels"""
+        host, port, trans = self.host, self.port, self.trans
+        self.connect()
+        servo_channel = self.connection.servo_channel
+        # a dead link must surface within the loop, not after the connect timeout
+        servo_channel.settimeout(self.servo_timeout)
+        command_channel = self.connection.command_channel
+        self.setter = Setters(host, port, trans, command_channel)
+        self.getter = Getters(host, port, trans, command_channel)
+        self.sender = Senders(host, port, trans, servo_channel)
+        self.sender.set_combined_state(self.combined_state)
+        self.rtl = RealTime(host, port, trans, servo_channel)
+        self.ptp = PTP(host, port, trans, command_channel)
+
+        # servo commands & state queries go binary if the server supports it
+        if self.binary_protocol:
+            self.set_protocol(self.negotiate_protocol())
+            self.sender.set_protocol(self.protocol)
+            if self.connection.is_split:
+                self.getter.set_protocol(self.getter.negotiate_protocol())
+            else:
+                self.getter.set_protocol(self.protocol)
+
+    def reconnect(self, servo_mode: str) -> Tuple[float, List, List]:
+        """
+        reconnect with exponential backoff and resume servoing, without homing
+        Return: outage duration in seconds, actual EEF pose, actual joints
+        Raise: ConnectionError when still down after reconnect_timeout
+        """
+        t_lost = time.monotonic()
+        backoff = 0.1
+        while True:
+            self.connection.drop()
+            try:
+                self.connect_clients()
+                if servo_mode == "joint":
+                    self.realTime_startDirectServoJoints()
+                else:
+                    self.realTime_startDirectServoCartesian()
+                eef_pose = self.getEEFPos()
+                jpos = self.getJointsPos()
+                break
+            except OSError as e:
+                if time.monotonic() - t_lost + backoff > self.reconnect_timeout:
+                    raise ConnectionError(
+                        f"Robot unreachable for {self.reconnect_timeout}s."
+                    ) from e
+                logger.warning(f"Reconnect failed: {e}, retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(2 * backoff, 2.0)
+        outage = time.monotonic() - t_lost
+        logger.info(f"Reconnected to {self.host}:{self.port} after {outage:.2f}s")
+        return outage, eef_pose, jpos
+
+    def connect(self):
+        try:
+            # every client of a channel reads through the same framed buffer
+            self.connection.connect()
+            self.set_socket(self.connection.servo_channel)
+            logger.info(f"Connected to {self.host}:{self.port}")
+        except socket.error as e:
+            logger.error(f"Connection failed: {e}")
+            raise
+
+        # Update the transform of the TCP if one is specified
+        if all(num == 0 for num in self.trans):
+            logger.info("No TCP transform in Flange Frame is defined.")
+            logger.info(
+                f"The following (default) TCP transform is utilized: {self.trans}"
+            )
+            return
+
+        logger.info("Trying to mount the following TCP transform:")
+        string_tuple = (
+            "x (mm)",
+            "y (mm)",
+            "z (mm)",
+            "alfa (rad)",
+            "beta (rad)",
+            "gamma (rad)",
+        )
+
+        for i in range(6):
+            print(string_tuple[i] + ": " + str(self.trans[i]))
+
+        da_message = "TFtrans_" + "_".join(map(str, self.trans)) + "\n"
+        for channel in self.connection.channels:
+            channel.sendall(da_message.encode("utf-8"))
+            return_ack_nack = channel.read_line()
+
+            if "done" in return_ack_nack:
+                logger.info("Specified TCP transform mounted successfully")
+            else:
+                raise RuntimeError("Could not mount the specified TCP")
+
+    def close(self):
+        self.connection.close()
+
+    def reset_initial_state(self):
+        init_jpos = [0, np.pi * 30 / 180, 0, -np.pi * 80 / 180, 0, np.pi * 70 / 180, 0]
+        # joint_deviations = np.random.uniform(
+        #     low=-1.0 * 3.14 / 180, high=1.0 * 3.14 / 180, size=7
+        # )
+        # init_jpos += joint_deviations
+        init_vel = [0.2]
+        cprint(f"Reset to jpos: {init_jpos}", "blue")
+        self.movePTPJointSpace(jpos=init_jpos, relVel=init_vel)
+
+    # PTP motion
+    """
+    Joint space motion
+    """
+
+    def movePTPJointSpace(self, jpos, relVel):
+        self.ptp.movePTPJointSpace(jpos, relVel)
+
+    def movePTPHomeJointSpace(self, relVel):
+        self.ptp.movePTPHomeJointSpace(relVel)
+
+    def movePTPTransportPositionJointSpace(self, relVel):
+        self.ptp.movePTPTransportPositionJointSpace(relVel)
+
+    def movePTPLineEEF(self, pos, vel):
+        self.ptp.movePTPLineEEF(pos, vel)
+
+    """
+    Cartesian linear  motion
+    """
+
+    def movePTPLineEEF(self, pos, vel):
+        self.ptp.movePTPLineEEF(pos, vel)
+
+    def movePTPLineEefRelBase(self, pos, vel):
+        self.ptp.movePTPLineEefRelBase(pos, vel)
+
+    def movePTPLineEefRelEef(self, pos, vel):
+        self.ptp.movePTPLineEefRelEef(pos, vel)
+
+    """
+    Circular motion
+    """
+
+    def movePTPCirc1OrintationInter(self, f1, f2, vel):
+        self.ptp.movePTPCirc1OrintationInter(f1, f2, vel)
+
+    def movePTPArcYZ_AC(self, theta, c, vel):
+        self.ptp.movePTPArcYZ_AC(theta, c, vel)
+
+    def movePTPArcXZ_AC(self, theta, c, vel):
+        self.ptp.movePTPArcXZ_AC(theta, c, vel)
+
+    def movePTPArcXY_AC(self, theta, c, vel):
+        self.ptp.movePTPArcXY_AC(theta, c, vel)
+
+    def movePTPArc_AC(self, theta, c, k, vel):
+        self.ptp.movePTPArc_AC(theta, c, k, vel)
+
+    # realtime motion control
+    def realTime_stopImpedanceJoints(self):
+        self.rtl.realTime_stopImpedanceJoints()
+
+    def realTime_startDirectServoCartesian(self):
+        self.rtl.realTime_startDirectServoCartesian()
+
+    def realTime_stopDirectServoCartesian(self):
+        self.rtl.realTime_stopDirectServoCartesian()
+
+    def realTime_stopDirectServoJoints(self):
+        self.rtl.realTime_stopDirectServoJoints()
+
+    def realTime_startDirectServoJoints(self):
+        self.rtl.realTime_startDirectServoJoints()
+
+    def realTime_startImpedanceJoints(
+        self, weightOfTool, cOMx, cOMy, cOMz, cStiness, rStifness, nStifness
+    ):
+        self.rtl.realTime_startImpedanceJoints(
+            weightOfTool, cOMx, cOMy, cOMz, cStiness, rStifness, nStifness
+        )
+
+    # Joint space servo command
+    def sendJointsPositionsGetMTorque(self, x):
+        return self.sender.sendJointsPositionsGetMTorque(x)
+
+    def sendJointsPositionsGetExTorque(self, x):
+        return self.sender.sendJointsPositionsGetExTorque(x)
+
+    def sendJointsPositionsGetActualEEFpos(self, x):
+        return self.sender.sendJointsPositionsGetActualEEFpos(x)
+
+    def sendJointsPositionsGetEEF_Force_rel_EEF(self, x):
+        return self.sender.sendJointsPositionsGetEEF_Force_rel_EEF(x)
+
+    def sendJointsPositionsGetActualJpos(self, x):
+        return self.sender.sendJointsPositionsGetActualJpos(x)
+
+    def sendJointsPositionsGetState(self, x, fields):
+        return self.sender.sendJointsPositionsGetState(x, fields)
+
+    # Crtesian space servo command
+    def sendEEfPosition(self, x):
+        self.sender.sendEEfPosition(x)
+
+    def sendEEfPositionGetExTorque(self, x):
+        return self.sender.sendEEfPositionExTorque(x)
+
+    def sendEEfPositionGetActualEEFpos(self, x):
+        return self.sender.sendEEfPositionGetActualEEFpos(x)
+
+    def sendEEfPositionGetActualJpos(self, x):
+        return self.sender.sendEEfPositionGetActualJpos(x)
+
+    def sendEEfPositionGetEEF_Force_rel_EEF(self, x):
+        return self.sender.sendEEfPositionGetEEF_Force_rel_EEF(x)
+
+    def sendEEfPositionGetMTorque(self, x):
+        return self.sender.sendEEfPositionMTorque(x)
+
+    def sendEEfPositionGetState(self, x, fields):
+        return self.sender.sendEEfPositionGetState(x, fields)
+
+    # getters
+    def getEEFPos(self):
+        return self.getter.get_EEF_pos()
+
+    def getEEF_Force(self):
+        return self.getter.get_EEF_force()
+
+    def getEEFCartizianPosition(self):
+        return self.getter.get_EEF_CartizianPos()
+
+    def getEEF_Moment(self):
+        return self.getter.get_EEF_moment()
+
+    def getJointsPos(self):
+        return self.getter.get_JointPos()
+
+    def getJointsExternalTorques(self):
+        return self.getter.get_Joints_ExternalTorques()
+
+    def getJointsMeasuredTorques(self):
+        return self.getter.get_Joints_MeasuredTorques()
+
+    def getMeasuredTorqueAtJoint(self, x):
+        return self.getter.get_MeasuredTorques_at_Joint(x)
+
+    def getEEFCartizianOrientation(self):
+        return self.getter.get_EEF_CartizianOrientation()
+
+    # get pin states
+    def getPin3State(self):
+        return self.getter.get_pinState(3)
+
+    def getPin10State(self):
+        return self.getter.get_pinState(10)
+
+    def getPin13State(self):
+        return self.getter.get_pinState(13)
+
+    def getPin16State(self):
+        return self.getter.get_pinState(16)
+
+    # setters
+    def set_OnOff(self, cmd):
+        self.setter.set_OnOff(cmd)
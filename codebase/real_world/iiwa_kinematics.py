@@ -0,0 +1,92 @@
+import numpy as np
+import scipy.spatial.transform as st
+from typing import Sequence
+
+# LBR iiwa 7 R800, standard DH per joint: (a [mm], alpha [rad], d [mm])
+IIWA7_DH = np.array(
+    [
+        [0.0, -np.pi / 2, 340.0],
+        [0.0, np.pi / 2, 0.0],
+        [0.0, np.pi / 2, 400.0],
+        [0.0, -np.pi / 2, 0.0],
+        [0.0, -np.pi / 2, 400.0],
+        [0.0, np.pi / 2, 0.0],
+        # joint 7 to the media flange
+        [0.0, 0.0, 126.0],
+    ]
+)
+
+
+def pose_to_mat(pose: np.ndarray) -> np.ndarray:
+    """(..., 6) x, y, z [mm], A, B, C [rad] -> (..., 4, 4), R = Rz(A) Ry(B) Rx(C)"""
+    pose = np.asarray(pose, dtype=np.float64)
+    batch_shape = pose.shape[:-1]
+    mat = np.zeros(batch_shape + (4, 4))
+    mat[..., :3, :3] = (
+        # scipy's uppercase axes are intrinsic, lowercase "zyx" would be Rx(C) Ry(B) Rz(A)
+        st.Rotation.from_euler("ZYX", pose[..., 3:].reshape(-1, 3))
+        .as_matrix()
+        .reshape(batch_shape + (3, 3))
+    )
+    mat[..., :3, 3] = pose[..., :3]
+    mat[..., 3, 3] = 1.0
+    return mat
+
+
+def mat_to_pose(mat: np.ndarray) -> np.ndarray:
+    """(..., 4, 4) -> (..., 6) x, y, z, A, B, C, KUKA ABC is intrinsic ZYX"""
+    batch_shape = mat.shape[:-2]
+    pose = np.zeros(batch_shape + (6,))
+    pose[..., :3] = mat[..., :3, 3]
+    pose[..., 3:] = (
+        st.Rotation.from_matrix(mat[..., :3, :3].reshape(-1, 3, 3))
+        .as_euler("ZYX")
+        .reshape(batch_shape + (3,))
+    )
+    return pose
+
+
+def iiwa7_fk_mat(
+    jpos: np.ndarray, trans: Sequence[float] = (0, 0, 0, 0, 0, 0)
+) -> np.ndarray:
+    """
+    jpos: (..., 7) joint positions [rad], any batch shape
+    trans: TCP transform in the flange frame, as mounted with TFtrans
+    Return: (..., 4, 4) TCP in the robot base frame, translation in mm
+    """
+    jpos = np.asarray(jpos, dtype=np.float64)
+    assert jpos.shape[-1] == 7, "Expected 7 joint positions."
+    a, alpha, d = IIWA7_DH.T
+    ct, st_ = np.cos(jpos), np.sin(jpos)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+
+    # (..., 7, 4, 4) link transforms
+    links = np.zeros(jpos.shape + (4, 4))
+    links[..., 0, 0] = ct
+    links[..., 0, 1] = -st_ * ca
+    links[..., 0, 2] = st_ * sa
+    links[..., 0, 3] = a * ct
+    links[..., 1, 0] = st_
+    links[..., 1, 1] = ct * ca
+    links[..., 1, 2] = -ct * sa
+    links[..., 1, 3] = a * st_
+    links[..., 2, 1] = sa
+    links[..., 2, 2] = ca
+    links[..., 2, 3] = d
+    links[..., 3, 3] = 1.0
+
+    mat = links[..., 0, :, :]
+    for i in range(1, 7):
+        mat = mat @ links[..., i, :, :]
+    if any(x != 0 for x in trans):
+        mat = mat @ pose_to_mat(trans)
+    return mat
+
+
+def iiwa7_fk(jpos: np.ndarray, trans: Sequence[float] = (0, 0, 0, 0, 0, 0)) -> np.ndarray:
+    """
+    EEF pose as the robot reports it, computed from joint positions.
+    jpos: (..., 7), e.g. a single reply or a whole joint trajectory
+    Return: (..., 6) x, y, z [mm], A, B, C [rad]
+    """
+    return mat_to_pose(iiwa7_fk_mat(jpos, trans))
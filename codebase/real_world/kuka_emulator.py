@@ -0,0 +1,392 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent.parent)
+sys.path.append(ROOT_DIR)
+
+import math
+import queue
+import socket
+import struct
+import threading
+import time
+import logging
+import numpy as np
+from typing import List, Optional, Tuple
+
+from codebase.real_world.base.binary_protocol import (
+    HEADER,
+    MAGIC,
+    OPCODES,
+    PROTOCOL_VERSION,
+)
+from codebase.real_world.base.senders import StateField
+
+FORMAT = "[%(asctime)s][%(levelname)s]: %(message)s"
+logging.basicConfig(
+    level=logging.INFO, format=FORMAT, handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+OPCODE_NAMES = {opcode: name for name, opcode in OPCODES.items()}
+MAGIC_BYTE = struct.pack("<H", MAGIC)[:1]
+
+
+class RobotStateModel:
+    """
+    Kinematic state of the emulated arm: no dynamics, servo setpoints are
+    reached immediately, PTP motions take time proportional to the joint distance.
+    """
+
+    def __init__(
+        self,
+        init_jpos: Optional[List] = None,
+        init_eef_pose: Optional[List] = None,
+        max_joint_speed: float = 1.5,
+        ptp_time_scale: float = 1.0,
+    ) -> None:
+        """
+        max_joint_speed: rad/s at relVel 1
+        ptp_time_scale: scales PTP motion time, < 1 for fast benchmarks
+        """
+        self.lock = threading.Lock()
+        self.jpos = np.zeros(7) if init_jpos is None else np.array(init_jpos, dtype=np.float64)
+        self.eef_pose = (
+            np.array([530.0, 0.0, 495.0, math.pi, 0.0, math.pi])
+            if init_eef_pose is None
+            else np.array(init_eef_pose, dtype=np.float64)
+        )
+        self.ext_torque = np.zeros(7)
+        self.measured_torque = np.zeros(7)
+        self.eef_force = np.zeros(3)
+        self.eef_moment = np.zeros(3)
+        self.max_joint_speed = max_joint_speed
+        self.ptp_time_scale = ptp_time_scale
+        self.rel_vel = 0.2
+        # None, "joint" or "cartesian"
+        self.servo_mode = None
+        # targets of the next PTP motion
+        self.ptp_jpos = self.jpos.copy()
+        self.ptp_eef_pose = self.eef_pose.copy()
+
+    def servo_eef(self, pose):
+        with self.lock:
+            self.eef_pose[:] = pose
+
+    def servo_joints(self, jpos):
+        with self.lock:
+            self.jpos[:] = jpos
+
+    def ptp_duration(self, jpos) -> float:
+        distance = np.max(np.abs(np.asarray(jpos) - self.jpos))
+        return self.ptp_time_scale * distance / (self.max_joint_speed * max(self.rel_vel, 1e-3))
+
+    def field(self, field: StateField) -> np.ndarray:
+        if field == StateField.EEF_POSE:
+            return self.eef_pose
+        return {
+            StateField.JOINT_POS: self.jpos,
+            StateField.EXT_TORQUE: self.ext_torque,
+            StateField.MEASURED_TORQUE: self.measured_torque,
+            StateField.EEF_FORCE: self.eef_force,
+            StateField.EEF_MOMENT: self.eef_moment,
+        }[field]
+
+    def fields(self, mask: int) -> np.ndarray:
+        with self.lock:
+            return np.concatenate(
+                [self.field(field) for field in StateField if field & mask]
+            )
+
+
+class KukaSunriseEmulator:
+    """
+    Local TCP server speaking the iiwaPy3 command vocabulary of the Sunrise
+    server, text lines and binary frames, against a RobotStateModel.
+
+    Every reply is delayed by `latency` plus uniform `jitter` as if on the wire,
+    without blocking the processing of following commands. Each accepted
+    connection is served by its own reader and writer thread.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 30001,
+        command_port: Optional[int] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        binary: bool = True,
+        combined_state: bool = True,
+        state: Optional[RobotStateModel] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        command_port: also listen here, for a separate command/query channel
+        latency: base delay of every reply in seconds
+        jitter: extra uniform random delay in [0, jitter] seconds
+        binary: accept the binary protocol during negotiation
+        combined_state: serve DcSeCarSt_/jpSt_, False behaves like the original
+            Sunrise application and drops the connection on them
+        """
+        self.host = host
+        self.port = port
+        self.command_port = command_port
+        self.latency = latency
+        self.jitter = jitter
+        self.binary = binary
+        self.combined_state = combined_state
+        self.state = RobotStateModel() if state is None else state
+        self.rng = np.random.default_rng(seed)
+
+        self.n_servo_commands = 0
+        self.n_requests = 0
+        self._servers = list()
+        self._stop_event = threading.Event()
+        self._threads = list()
+        self._connections = list()
+        # connections whose replies are silently discarded
+        self._stalled = set()
+
+    # ========= launch method ===========
+    def start(self):
+        self.port = self._listen(self.port)
+        if self.command_port is not None:
+            self.command_port = self._listen(self.command_port)
+
+    def _listen(self, port: int) -> int:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, port))
+        # port 0 -> pick a free one
+        port = server.getsockname()[1]
+        server.listen()
+        server.settimeout(0.1)
+        thread = threading.Thread(target=self._accept_loop, args=(server,), daemon=True)
+        thread.start()
+        self._servers.append(server)
+        self._threads.append(thread)
+        logger.info(f"KUKA emulator listening on {self.host}:{port}")
+        return port
+
+    def drop_connections(self):
+        """cut every open connection like a network blip, new ones are still accepted"""
+        connections, self._connections = self._connections, list()
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stall_connections(self):
+        """stop replying on every open connection without closing it, like a dead link"""
+        self._stalled.update(self._connections)
+
+    def stop(self):
+        self._stop_event.set()
+        self.drop_connections()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        for server in self._servers:
+            server.close()
+
+    # ========= context manager ===========
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # ========= connection handling ===========
+    def _accept_loop(self, server: socket.socket):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections.append(conn)
+            replies = queue.Queue()
+            for target in (self._read_loop, self._write_loop):
+                thread = threading.Thread(target=target, args=(conn, replies), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _delay(self) -> float:
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.rng.uniform(0.0, self.jitter)
+        return delay
+
+    def _read_loop(self, conn: socket.socket, replies: queue.Queue):
+        reader = conn.makefile("rb")
+        last_due = 0.0
+        try:
+            while not self._stop_event.is_set():
+                first = reader.peek(1)[:1]
+                if not first:
+                    break
+                if first == MAGIC_BYTE:
+                    header = reader.read(HEADER.size)
+                    _, opcode, mask, seq, n = HEADER.unpack(header)
+                    values = np.frombuffer(reader.read(8 * n), dtype="<f8")
+                    answers = self._handle_binary(opcode, mask, seq, values)
+                else:
+                    line = reader.readline().decode("utf-8").strip()
+                    if not line:
+                        continue
+                    answers = self._handle_text(line)
+                self.n_requests += 1
+
+                t_recv = time.monotonic()
+                for answer, extra_delay in answers:
+                    # replies keep their order on the wire
+                    due = max(t_recv + self._delay() + extra_delay, last_due)
+                    last_due = due
+                    replies.put((due, answer))
+                if answers and answers[-1][0] is None:
+                    break
+        except (OSError, ValueError, struct.error):
+            pass
+        finally:
+            replies.put((0.0, None))
+
+    def _write_loop(self, conn: socket.socket, replies: queue.Queue):
+        try:
+            while True:
+                due, answer = replies.get()
+                if answer is None:
+                    break
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                if conn in self._stalled:
+                    continue
+                conn.sendall(answer)
+        except OSError:
+            pass
+        finally:
+            self._stalled.discard(conn)
+            conn.close()
+
+    # ========= protocol ===========
+    @staticmethod
+    def _text(values) -> bytes:
+        return ("_".join(repr(float(v)) for v in values) + "\n").encode("utf-8")
+
+    def _handle_binary(self, opcode: int, mask: int, seq: int, values: np.ndarray):
+        name = OPCODE_NAMES.get(opcode)
+        if name is None:
+            raise ValueError(f"Unknown opcode {opcode}")
+        reply = self._execute(name, list(values), mask)
+        payload = np.asarray(reply, dtype="<f8")
+        frame = HEADER.pack(MAGIC, opcode, mask, seq, len(payload)) + payload.tobytes()
+        return [(frame, 0.0)]
+
+    def _handle_text(self, line: str) -> List[Tuple[Optional[bytes], float]]:
+        done = b"done\n"
+        if line == "end":
+            # acknowledge, then close
+            return [(done, 0.0), (None, 0.0)]
+        if line.startswith("protocol_binary_"):
+            if self.binary and line == f"protocol_binary_{PROTOCOL_VERSION}":
+                return [(f"binary_{PROTOCOL_VERSION}\n".encode("utf-8"), 0.0)]
+            return [(b"nak\n", 0.0)]
+
+        # getters, the reply carries values
+        getter = {
+            "Eef_pos": lambda: self.state.eef_pose,
+            "Eef_force": lambda: self.state.eef_force,
+            "Eef_moment": lambda: self.state.eef_moment,
+            "getJointsPositions": lambda: self.state.jpos,
+            "Torques_ext_J": lambda: self.state.ext_torque,
+            "Torques_m_J": lambda: self.state.measured_torque,
+        }.get(line)
+        if getter is not None:
+            with self.state.lock:
+                return [(self._text(getter()), 0.0)]
+        if line.startswith("getPin"):
+            return [(self._text([0.0]), 0.0)]
+
+        tokens = line.split("_")
+        name = tokens[0]
+        args = [float(token) for token in tokens[1:] if token]
+
+        # PTP motions, immediate ack then a second one once the motion is over
+        if name.startswith("doPTP"):
+            with self.state.lock:
+                if name == "doPTPinJS":
+                    duration = self.state.ptp_duration(self.state.ptp_jpos)
+                    self.state.jpos[:] = self.state.ptp_jpos
+                else:
+                    duration = self.state.ptp_time_scale * 0.5
+                    self.state.eef_pose[:] = self.state.ptp_eef_pose
+            return [(done, 0.0), (done, duration)]
+        if name == "jRelVel":
+            self.state.rel_vel = args[0]
+            return [(done, 0.0)]
+        if name == "jp" and self.state.servo_mode != "joint":
+            self.state.ptp_jpos = np.array(args)
+            return [(done, 0.0)]
+        if name.startswith("cArtixanPosition"):
+            self.state.ptp_eef_pose = np.array(args[:6])
+            return [(done, 0.0)]
+
+        if name in OPCODES:
+            mask = 0
+            if name in ("DcSeCarSt", "jpSt"):
+                mask, args = int(args[0]), args[1:]
+            reply = self._execute(name, args, mask)
+            if len(reply) == 0:
+                return [(done, 0.0)]
+            return [(self._text(reply), 0.0)]
+
+        # real time mode switches, TCP transform, outputs
+        if name in ("stDcEEf", "startDirectServoJoints", "stopDirectServoJoints"):
+            self.state.servo_mode = {
+                "stDcEEf": "cartesian",
+                "startDirectServoJoints": "joint",
+            }.get(name)
+        return [(done, 0.0)]
+
+    def _execute(self, name: str, args: List[float], mask: int = 0) -> np.ndarray:
+        """servo commands and getters shared by text and binary, Return: reply values"""
+        if name in ("DcSeCarSt", "jpSt") and not self.combined_state:
+            raise ValueError(f"Unsupported command {name}")
+        if name.startswith("DcSeCar") and name != "DcSeCarEEfFrelEEF":
+            self.n_servo_commands += 1
+            self.state.servo_eef(args[:6])
+        elif name.startswith("jp") or name == "DcSeCarEEfFrelEEF":
+            self.n_servo_commands += 1
+            self.state.servo_joints(args[:7])
+
+        if name in ("DcSeCarSt", "jpSt"):
+            return self.state.fields(mask)
+        with self.state.lock:
+            return {
+                "DcSeCarExT": self.state.ext_torque,
+                "DcSeCarEEfP": self.state.eef_pose,
+                "DcSeCarJP": self.state.jpos,
+                "DcSeCarMT": self.state.measured_torque,
+                "jpMT": self.state.measured_torque,
+                "jpEEfP": self.state.eef_pose,
+                "DcSeCarEEfFrelEEF": np.concatenate([self.state.eef_force, self.state.eef_moment]),
+                "jpExT": self.state.ext_torque,
+                "jpJP": self.state.jpos,
+                "Eef_pos": self.state.eef_pose,
+                "Eef_force": self.state.eef_force,
+                "Eef_moment": self.state.eef_moment,
+                "getJointsPositions": self.state.jpos,
+                "Torques_ext_J": self.state.ext_torque,
+                "Torques_m_J": self.state.measured_torque,
+            }.get(name, np.zeros(0)).copy()
+
+
+if __name__ == "__main__":
+    with KukaSunriseEmulator(host="127.0.0.1", port=30001, latency=0.002, jitter=0.001) as emulator:
+        while True:
+            time.sleep(1.0)
@@ -0,0 +1,494 @@
+import numpy as np
+import time
+import logging
+import concurrent.futures
+import multiprocessing as mp
+from typing import Callable, Dict, List, Optional, Tuple
+from multiprocessing.managers import SharedMemoryManager
+from termcolor import cprint
+from utils.data_utils import pose_euler2quat
+
+from codebase.real_world.base.senders import StateField, STATE_FIELD_SIZES, LEGACY_STATE_FIELDS
+from codebase.real_world.base.servo_pipeline import ServoPipeline
+from codebase.real_world.iiwa_client import IIWAClient
+from codebase.real_world.iiwa_kinematics import iiwa7_fk
+from codebase.real_world.iiwaPy3 import Command, RECEIVE_KEY_FIELDS
+from codebase.shared_memory.shared_memory_queue import SharedMemoryQueue, Empty
+from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+from codebase.shared_memory.shared_ndarray import SharedNDArray
+from common.pose_trajectory_interpolator import PoseTrajectoryInterpolator
+from common.loop_stats import LoopStats
+from common.latency_compensation import AcquisitionTimeEstimator
+from common.precise_sleep import DeadlineScheduler
+from common.realtime import apply_realtime_config, SOFT_REAL_TIME
+
+logger = logging.getLogger(__name__)
+
+
+class MultiIIWAPositionalController(mp.Process):
+    """
+    N iiwa arms serviced by one deadline-scheduled loop.
+
+    Every tick all arms get their setpoint before any reply is awaited, so the
+    round trips overlap, and the state of all arms is published as one stacked
+    ring buffer entry: every receive key has shape (N, ...).
+    Commands address all arms at once, poses are (N, 7) or (N, 6) matching use_quat.
+    """
+
+    def __init__(
+        self,
+        shm_manager: SharedMemoryManager,
+        hosts: List[str],
+        ports: List[int],
+        command_ports: Optional[List[Optional[int]]] = None,
+        trans: Optional[List[Tuple]] = None,
+        receive_keys: Optional[List] = None,
+        frequency: int = 100,
+        max_pos_speed: float = 32,
+        max_rot_speed: float = 0.5,
+        launch_timeout: int = 60,
+        soft_real_time: bool = False,
+        rt_config: Optional[Dict] = None,
+        verbose: bool = False,
+        get_max_k: int = 128,
+        use_quat: bool = True,
+        binary_protocol: bool = False,
+        combined_state: bool = False,
+        deadline_policy: str = "skip",
+        servo_timeout: float = 1.0,
+        timestamp_method: str = "midpoint",
+        local_fk: bool = False,
+    ) -> None:
+        """
+        hosts, ports, command_ports, trans: one entry per arm
+        receive_keys: published state, any of RECEIVE_KEY_FIELDS
+        real max_pos_speed: mm/s
+        real max_rot_speed: rad/s
+        launch_timeout: covers connecting and homing, arms are homed in parallel
+        servo_timeout: longest wait for the servo replies of one tick
+        timestamp_method: "receive", "midpoint" or "fitted", see AcquisitionTimeEstimator
+        local_fk: request only joints every tick, EEF poses from the iiwa7 model including trans
+        combined_state: the servers implement DcSeCarSt_, else one legacy servo command per state field
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime, overrides soft_real_time
+        """
+        assert len(hosts) == len(ports), "One port per arm."
+        n_arms = len(hosts)
+        if command_ports is None:
+            command_ports = [None] * n_arms
+        if trans is None:
+            trans = [(0, 0, 0, 0, 0, 0)] * n_arms
+        assert len(command_ports) == n_arms and len(trans) == n_arms
+
+        super().__init__(name="MultiIIWAPositionalController")
+
+        # connected in the controller process
+        self.arms = [
+            IIWAClient(
+                host=host,
+                port=port,
+                command_port=command_port,
+                trans=arm_trans,
+                binary_protocol=binary_protocol,
+                combined_state=combined_state,
+                servo_timeout=servo_timeout,
+            )
+            for host, port, command_port, arm_trans in zip(hosts, ports, command_ports, trans)
+        ]
+
+        self.n_arms = n_arms
+        self.frequency = frequency
+        self.max_pos_speed = max_pos_speed
+        self.max_rot_speed = max_rot_speed
+        self.launch_timeout = launch_timeout
+        self.soft_real_time = soft_real_time
+        if rt_config is None and soft_real_time:
+            rt_config = SOFT_REAL_TIME
+        self.rt_config = rt_config
+        self.verbose = verbose
+        self.get_max_k = get_max_k
+        self.use_quat = use_quat
+        self.deadline_policy = deadline_policy
+        self.servo_timeout = servo_timeout
+        self.timestamp_estimators = [
+            AcquisitionTimeEstimator(method=timestamp_method) for _ in range(n_arms)
+        ]
+
+        if receive_keys is None:
+            receive_keys = ["EEFpos", "EEFrot", "Jpos"]
+        for key in receive_keys:
+            assert key in RECEIVE_KEY_FIELDS, f"Unsupported receive key {key}."
+        self.local_fk = local_fk
+        self.state_fields = StateField.JOINT_POS
+        if not local_fk:
+            self.state_fields |= StateField.EEF_POSE
+        for key in receive_keys:
+            field = RECEIVE_KEY_FIELDS[key][0]
+            if not (local_fk and field == StateField.EEF_POSE):
+                self.state_fields |= field
+        if not combined_state:
+            assert (
+                self.state_fields & ~LEGACY_STATE_FIELDS == 0
+            ), "EEFforce & EEFmoment receive keys need combined_state."
+
+        # build input queue
+        example = {
+            "cmd": Command.SERVOL.value,
+            "target_pose": np.zeros((n_arms,) + self.pose_shape, dtype=np.float64),
+            "duration": 0.0,
+            "target_time": 0.0,
+        }
+        input_queue = SharedMemoryQueue.create_from_examples(
+            shm_manager=shm_manager,
+            examples=example,
+            buffer_size=256,
+        )
+
+        # build ring buffer, stacked over arms
+        example = dict()
+        for key in receive_keys:
+            field, part = RECEIVE_KEY_FIELDS[key]
+            example[key] = np.zeros((n_arms, STATE_FIELD_SIZES[field]), dtype=np.float64)[:, part]
+        example["robot_receive_timestamp"] = time.time()
+        # per arm estimated sampling time
+        example["robot_timestamp"] = np.zeros((n_arms,), dtype=np.float64)
+        example["robot_rtt"] = np.zeros((n_arms,), dtype=np.float64)
+        ring_buffer = SharedMemoryRingBuffer.create_from_examples(
+            shm_manager=shm_manager,
+            examples=example,
+            get_max_k=get_max_k,
+            get_time_budget=0.2,
+            put_desired_frequency=frequency,
+        )
+
+        # timing telemetry, latency is the slowest arm of each tick
+        loop_stats = LoopStats(shm_manager=shm_manager, frequency=frequency)
+
+        # EEF poses after homing, written by the controller process
+        init_eef_pose = SharedNDArray.create_from_shape(
+            mem_mgr=shm_manager, shape=(n_arms, 6), dtype=np.float64
+        )
+
+        self.ready_event = mp.Event()
+        # ready_event is also set when the process exits, this tells the two apart
+        self.setup_ok = mp.Event()
+        self.input_queue = input_queue
+        self.ring_buffer = ring_buffer
+        self.receive_keys = receive_keys
+        self.loop_stats = loop_stats
+        self._init_eef_pose = init_eef_pose
+
+    @property
+    def pose_shape(self):
+        return (7,) if self.use_quat else (6,)
+
+    @property
+    def init_eef_pose(self) -> np.ndarray:
+        """(N, 6) EEF poses after the last homing, valid once the controller is ready"""
+        return self._init_eef_pose.get().copy()
+
+    # ========= launch method ===========
+    def start(self, wait=True):
+        super().start()
+        if wait:
+            self.start_wait()
+        if self.verbose:
+            cprint(
+                f"[MultiIIWAPositionalController] Controller process spawned at {self.pid}",
+                "white",
+                "on_green",
+            )
+
+    def stop(self, wait=True):
+        message = {
+            "cmd": Command.STOP.value,
+        }
+        self.input_queue.put(message)
+        if wait:
+            self.stop_wait()
+
+    def start_wait(self):
+        self.ready_event.wait(self.launch_timeout)
+        if not self.setup_ok.is_set():
+            raise RuntimeError(
+                "[MultiIIWAPositionalController] Setup failed or timed out, see the controller log."
+            )
+        assert self.is_alive()
+
+    def stop_wait(self):
+        self.join()
+
+    @property
+    def is_ready(self):
+        return self.setup_ok.is_set() and self.ready_event.is_set()
+
+    # ========= context manager ===========
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # ========= command methods ============
+    def servoL(self, poses, duration=0.1):
+        """
+        poses: (N, 7) or (N, 6), one target per arm
+        duration: desired time to reach the poses
+        """
+        assert duration >= (1 / self.frequency)
+        poses = np.array(poses)
+        assert poses.shape == (self.n_arms,) + self.pose_shape
+
+        message = {
+            "cmd": Command.SERVOL.value,
+            "target_pose": poses,
+            "duration": duration,
+        }
+        self.input_queue.put(message)
+
+    def schedule_waypoint(self, poses, target_time):
+        assert target_time > time.time()
+        poses = np.array(poses)
+        assert poses.shape == (self.n_arms,) + self.pose_shape
+
+        message = {
+            "cmd": Command.SCHEDULE_WAYPOINT.value,
+            "target_pose": poses,
+            "target_time": target_time,
+        }
+        self.input_queue.put(message)
+
+    def schedule_waypoints(self, poses, target_times):
+        """
+        schedule a whole action chunk for every arm with a single queue write
+        poses: (K, N, 7) or (K, N, 6), target_times: (K,) global time
+        """
+        poses = np.array(poses, dtype=np.float64)
+        target_times = np.array(target_times, dtype=np.float64)
+        assert poses.shape[1:] == (self.n_arms,) + self.pose_shape
+        assert len(poses) == len(target_times)
+        if len(poses) == 0:
+            return
+
+        message = {
+            "cmd": Command.SCHEDULE_WAYPOINT.value,
+            "target_pose": poses,
+            "target_time": target_times,
+        }
+        self.input_queue.put_k(message)
+
+    def reset_robot(self):
+        message = {
+            "cmd": Command.RESET.value,
+        }
+        self.input_queue.put(message)
+
+    # ========= receive APIs =============
+    def get_state(self, k=None, out=None):
+        if k is None:
+            return self.ring_buffer.get(out=out)
+        else:
+            return self.ring_buffer.get_last_k(k=k, out=out)
+
+    def get_all_state(self):
+        return self.ring_buffer.get_all()
+
+    def get_loop_stats(self, out=None):
+        return self.loop_stats.get(out=out)
+
+    # ========= main loop in process ============
+    def run(self):
+        cprint("Now multi-arm Robot threading is running!", "yellow")
+        apply_realtime_config(
+            self.rt_config,
+            buffers=[self.input_queue, self.ring_buffer, self.loop_stats.ring_buffer],
+            name=self.name,
+        )
+
+        # blocking per-arm calls (connect, homing, mode switches) run in parallel
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.n_arms)
+        pipelines = list()
+        try:
+            self._for_each_arm(executor, lambda arm: arm.connect_clients())
+            self._for_each_arm(executor, lambda arm: arm.reset_initial_state())
+
+            dt = 1.0 / self.frequency
+            curr_t = time.monotonic()
+            pose_interps = self._hold_poses(curr_t)
+            last_waypoint_time = curr_t
+
+            # one command in flight per arm, sent together, collected together
+            pipelines = [
+                ServoPipeline(
+                    arm.sender,
+                    fields=self.state_fields,
+                    max_in_flight=1,
+                    reply_timeout=self.servo_timeout,
+                )
+                for arm in self.arms
+            ]
+            self._for_each_arm(executor, lambda arm: arm.realTime_startDirectServoCartesian())
+
+            iter_idx = 0
+            keep_running = True
+            # absolute deadlines t0 + k*dt, shared by every arm
+            scheduler = DeadlineScheduler(dt=dt, policy=self.deadline_policy)
+            while keep_running:
+                t_start = time.perf_counter()
+
+                t_now = time.monotonic()
+                pose_commands = list()
+                for pose_interp in pose_interps:
+                    pose_command = pose_interp(t_now)
+                    if self.use_quat:
+                        pose_command = pose_euler2quat(pose_command)
+                    pose_commands.append(pose_command)
+                t_interp = time.perf_counter()
+
+                # every arm's setpoint goes out before any reply is awaited
+                for pipeline, pose_command in zip(pipelines, pose_commands):
+                    pipeline.send(pose_command)
+                replies = [pipeline.drain(timeout=self.servo_timeout)[-1] for pipeline in pipelines]
+                self._put_state(replies)
+                t_send_recv = time.perf_counter()
+
+                # fetch command from queue
+                try:
+                    commands = self.input_queue.get_all()
+                    n_cmd = len(commands["cmd"])
+                except Empty:
+                    n_cmd = 0
+
+                # execute commands
+                for i in range(n_cmd):
+                    command = dict()
+                    for key, value in commands.items():
+                        command[key] = value[i]
+                    cmd = command["cmd"]
+
+                    if cmd == Command.STOP.value:
+                        keep_running = False
+                        # stop immediately, ignore later commands
+                        break
+                    elif cmd == Command.SERVOL.value:
+                        duration = float(command["duration"])
+                        curr_time = t_now + dt
+                        t_insert = curr_time + duration
+                        pose_interps = [
+                            pose_interp.drive_to_waypoint(
+                                pose=target_pose,
+                                time=t_insert,
+                                curr_time=curr_time,
+                                max_pos_speed=self.max_pos_speed,
+                                max_rot_speed=self.max_rot_speed,
+                            )
+                            for pose_interp, target_pose in zip(pose_interps, command["target_pose"])
+                        ]
+                        last_waypoint_time = t_insert
+                    elif cmd == Command.SCHEDULE_WAYPOINT.value:
+                        # translate global time to monotonic time
+                        target_time = time.monotonic() - time.time() + float(command["target_time"])
+                        curr_time = t_now + dt
+                        pose_interps = [
+                            pose_interp.schedule_waypoint(
+                                pose=target_pose,
+                                time=target_time,
+                                max_pos_speed=self.max_pos_speed,
+                                max_rot_speed=self.max_rot_speed,
+                                curr_time=curr_time,
+                                last_waypoint_time=last_waypoint_time,
+                            )
+                            for pose_interp, target_pose in zip(pose_interps, command["target_pose"])
+                        ]
+                        last_waypoint_time = target_time
+                    elif cmd == Command.RESET.value:
+                        self._for_each_arm(executor, self._home_arm)
+                        curr_t = time.monotonic()
+                        pose_interps = self._hold_poses(curr_t)
+                        last_waypoint_time = curr_t
+                        # homing blocked on purpose, don't count it as overruns
+                        scheduler.reset()
+                        break
+                    else:
+                        keep_running = False
+                        break
+
+                n_missed = scheduler.wait()
+
+                # first loop successful, ready to receive command
+                if iter_idx == 0:
+                    print("Multi-arm IIWA ready event is set!!!")
+                    self.setup_ok.set()
+                    self.ready_event.set()
+                iter_idx += 1
+
+                self.loop_stats.record(
+                    loop_period=time.perf_counter() - t_start,
+                    send_recv_time=t_send_recv - t_interp,
+                    interp_time=t_interp - t_start,
+                    overrun=n_missed,
+                )
+
+        finally:
+            # terminate
+            try:
+                for pipeline in pipelines:
+                    pipeline.close()
+                self._for_each_arm(executor, self._shutdown_arm)
+            except OSError as e:
+                logger.error(f"Shutdown without homing, connection lost: {e}")
+            executor.shutdown()
+            self.ready_event.set()
+
+    def _for_each_arm(self, executor, fn: Callable[[IIWAClient], object]) -> List:
+        """run fn on every arm in parallel, Return: results in arm order"""
+        return list(executor.map(fn, self.arms))
+
+    def _hold_poses(self, t: float) -> List[PoseTrajectoryInterpolator]:
+        """interpolators holding every arm at its actual pose"""
+        poses = np.array([arm.getEEFPos() for arm in self.arms])
+        self._init_eef_pose.get()[:] = poses
+        pose_interps = list()
+        for pose in poses:
+            if self.use_quat:
+                pose = pose_euler2quat(pose)
+            pose_interps.append(
+                PoseTrajectoryInterpolator(times=[t], poses=[pose], use_quat=self.use_quat)
+            )
+        return pose_interps
+
+    @staticmethod
+    def _home_arm(arm: IIWAClient):
+        arm.realTime_stopDirectServoCartesian()
+        arm.reset_initial_state()
+        arm.realTime_startDirectServoCartesian()
+
+    @staticmethod
+    def _shutdown_arm(arm: IIWAClient):
+        if arm.ptp is None:
+            return
+        arm.realTime_stopDirectServoCartesian()
+        arm.reset_initial_state()
+        arm.close()
+
+    def _put_state(self, replies):
+        if self.local_fk:
+            for arm, (_, reply, _, _) in zip(self.arms, replies):
+                reply[StateField.EEF_POSE] = iiwa7_fk(reply[StateField.JOINT_POS], arm.trans)
+        state = dict()
+        for key in self.receive_keys:
+            field, part = RECEIVE_KEY_FIELDS[key]
+            state[key] = np.stack([np.asarray(reply[1][field])[part] for reply in replies])
+        state["robot_receive_timestamp"] = AcquisitionTimeEstimator.to_wall_time(
+            max(reply[3] for reply in replies)
+        )
+        state["robot_timestamp"] = np.array(
+            [
+                estimator.to_wall_time(estimator(t_send=t_recv - rtt, t_recv=t_recv))
+                for estimator, (_, _, rtt, t_recv) in zip(self.timestamp_estimators, replies)
+            ]
+        )
+        rtts = np.array([reply[2] for reply in replies])
+        state["robot_rtt"] = rtts
+        self.ring_buffer.put(state)
+        self.loop_stats.record_latency(np.max(rtts))
@@ -1,6 +1,7 @@
 import time
 import math
 import shutil
+import threading
 import pathlib
 import numpy as np
 from termcolor import colored, cprint
@@ -21,7 +22,7 @@ from common.timestamp_accumulator import (
     align_timestamps,
 )
 from codebase.real_world.realsense.multi_camera_visualizer import MultiCameraVisualizer
-from common.replay_buffer import ReplayBuffer
+from common.replay_buffer import ReplayBuffer, rechunk_recompress_array
 from utils.cv2_utils import get_image_transform, optimal_row_cols
 
 DEFAULT_OBS_KEY_MAP = {
@@ -29,6 +30,10 @@ DEFAULT_OBS_KEY_MAP = {
     "EEFpos": "robot_eef_pos",
     "EEFrot": "robot_eef_rot",
     "Jpos": "robot_joint",
+    "ExtTorque": "robot_ext_torque",
+    "MeasuredTorque": "robot_measured_torque",
+    "EEFforce": "robot_eef_force",
+    "EEFmoment": "robot_eef_moment",
     # gripper
     "OpenOrClose": "gripper_pose",
     "camera_0": "agent_view",
@@ -39,12 +44,23 @@ DEFAULT_OBS_KEY_MAP = {
 }
 
 
+# processes started by RealEnv that take a real-time config
+RT_PROCESSES = ("robot", "gripper", "camera", "visualizer")
+
+
 class RealEnv:
     def __init__(
         self,
         output_dir: str,
         robot_ip: str = "172.31.1.147",
         robot_port: int = 30001,
+        robot_binary_protocol: bool = False,
+        robot_combined_state: bool = False,
+        robot_pipelined: bool = False,
+        robot_local_fk: bool = False,
+        # controller rate setpoints & state, stored in the "trajectory" group
+        record_trajectory: bool = False,
+        robot_receive_keys: Optional[List] = None,
         # env params
         frequency: int = 10,
         n_obs_steps: int = 2,
@@ -67,6 +83,8 @@ class RealEnv:
         # vis params
         enable_multi_cam_vis: bool = True,
         multi_cam_vis_resolution: Tuple = (1280, 720),
+        # real-time setup, process -> set_realtime kwargs, see RT_PROCESSES
+        process_rt_config: Optional[Dict[str, Dict]] = None,
         # shared memory
         shm_manager: Optional[SharedMemoryManager] = None,
         **kwargs,
@@ -78,6 +96,21 @@ class RealEnv:
         video_dir.mkdir(parents=True, exist_ok=True)
         zarr_path = str(output_dir.joinpath("replay_buffer.zarr").absolute())
         replay_buffer = ReplayBuffer.create_from_path(zarr_path=zarr_path, mode="a")
+        trajectory_buffer = None
+        if record_trajectory:
+            # episode i of the group belongs to episode i of the replay buffer
+            trajectory_buffer = ReplayBuffer.create_from_group(
+                replay_buffer.root.require_group("trajectory")
+            )
+            n_missing = replay_buffer.n_episodes - trajectory_buffer.n_episodes
+            assert n_missing >= 0, "Trajectory group out of sync with the recorded episodes."
+            # stores recorded before trajectory logging get empty episodes
+            add_empty_episodes(trajectory_buffer, n_missing)
+
+        if process_rt_config is None:
+            process_rt_config = dict()
+        for name in process_rt_config:
+            assert name in RT_PROCESSES, f"Unsupported real-time process {name}."
 
         if shm_manager is None:
             shm_manager = SharedMemoryManager()
@@ -147,27 +180,39 @@ class RealEnv:
             vis_transform=vis_transform,
             recording_transform=recording_transform,
             video_recorder=video_recorder,
+            rt_config=process_rt_config.get("camera"),
             verbose=False,
         )
 
         multi_cam_vis = None
         if enable_multi_cam_vis:
             multi_cam_vis = MultiCameraVisualizer(
-                realsense=realsense, row=row, col=col, rgb_to_bgr=False
+                realsense=realsense,
+                row=row,
+                col=col,
+                rgb_to_bgr=False,
+                rt_config=process_rt_config.get("visualizer"),
             )
 
         robot = IIWAPositionalController(
             shm_manager=shm_manager,
             host=robot_ip,
             port=robot_port,
-            receive_keys=None,
+            receive_keys=robot_receive_keys,
             max_pos_speed=max_pos_speed,
             max_rot_speed=max_rot_speed,
+            binary_protocol=robot_binary_protocol,
+            combined_state=robot_combined_state,
+            pipelined=robot_pipelined,
+            local_fk=robot_local_fk,
+            log_trajectory=record_trajectory,
+            rt_config=process_rt_config.get("robot"),
         )
         gripper = Robotiq85(
             shm_manager=shm_manager,
             frequency=100,
             receive_keys=None,
+            rt_config=process_rt_config.get("gripper"),
         )
 
         self.realsense = realsense
@@ -185,6 +230,7 @@ class RealEnv:
         self.output_dir = output_dir
         self.video_dir = video_dir
         self.replay_buffer = replay_buffer
+        self.trajectory_buffer = trajectory_buffer
         # temp memory buffers
         self.last_realsense_data = None
         # recording buffers
@@ -192,6 +238,10 @@ class RealEnv:
         self.action_accumulator = None
         self.delta_action_accumulator = None
         self.stage_accumulator = None
+        self.trajectory_chunks = None
+        self.last_trajectory_timestamp = None
+        self.trajectory_thread = None
+        self.trajectory_stop_event = threading.Event()
 
         self.start_time = None
 
@@ -250,7 +300,7 @@ class RealEnv:
         k = math.ceil(self.n_obs_steps * (self.video_capture_fps / self.frequency))
         self.last_realsense_data = self.realsense.get(k=k, out=self.last_realsense_data)
 
-        # 125 hz, robot_receive_timestamp
+        # 125 hz, robot_timestamp
         last_robot_data = self.robot.get_all_state()
         last_gripper_data = self.gripper.get_all_state()
         # both have more than n_obs_steps data
@@ -276,7 +326,8 @@ class RealEnv:
             camera_obs[f"camera_{camera_idx}"] = value["color"][this_idxs]
 
         # robot obs
-        robot_timestamps = last_robot_data["robot_receive_timestamp"]
+        # estimated robot-side sampling time, network delay compensated
+        robot_timestamps = last_robot_data["robot_timestamp"]
         this_timestamps = robot_timestamps
         this_idxs = list()
         for t in obs_align_timestamps:
@@ -326,6 +377,30 @@ class RealEnv:
         obs_data["timestamp"] = obs_align_timestamps
         return obs_data
 
+    def _accumulate_trajectory(self):
+        """collect controller ticks published since the last call, at most get_max_k ticks back"""
+        data = self.robot.get_trajectory()
+        is_new = data["timestamp"] > self.last_trajectory_timestamp
+        if len(is_new) >= self.robot.get_max_k and np.all(is_new):
+            # the whole read window is new, ticks before it were overwritten
+            gap = data["timestamp"][0] - self.last_trajectory_timestamp
+            cprint(f"Trajectory overrun, up to {gap:.3f}s of controller ticks lost.", "yellow")
+        self.trajectory_chunks.append({key: value[is_new] for key, value in data.items()})
+        if np.any(is_new):
+            self.last_trajectory_timestamp = data["timestamp"][is_new][-1]
+
+    def _trajectory_loop(self):
+        # drain at 4x the ring buffer turnover, independent of the get_obs rate
+        period = self.robot.get_max_k / self.robot.frequency / 4
+        while not self.trajectory_stop_event.wait(period):
+            self._accumulate_trajectory()
+
+    def _stop_trajectory_thread(self):
+        if self.trajectory_thread is not None:
+            self.trajectory_stop_event.set()
+            self.trajectory_thread.join()
+            self.trajectory_thread = None
+
     def exec_actions(
         self,
         actions: np.ndarray,
@@ -353,12 +428,13 @@ class RealEnv:
         new_delta_actions = delta_actions[is_new]
         new_stages = stages[is_new]
 
-        for i in range(len(new_actions)):
-            self.robot.servoL(
-                pose=new_actions[i][:-1], duration=1 / self.frequency
-            )  # duration = SpaceMouseDeadzone / RealEnvFrequency
-            self.gripper.execute(
-                pose=[new_actions[i][-1]], duration=1 / self.frequency
+        # the whole chunk as time-stamped waypoints, one queue write per controller
+        if len(new_actions) > 0:
+            self.robot.schedule_waypoints(
+                poses=new_actions[:, :-1], target_times=new_timestamps
+            )
+            self.gripper.schedule_waypoints(
+                poses=new_actions[:, -1:], target_times=new_timestamps
             )
 
         # record actions
@@ -372,6 +448,9 @@ class RealEnv:
     def get_robot_state(self):
         return self.robot.get_state()
 
+    def get_robot_loop_stats(self):
+        return self.robot.get_loop_stats()
+
     def get_gripper_state(self):
         return self.gripper.get_state()
 
@@ -409,6 +488,14 @@ class RealEnv:
         self.stage_accumulator = TimestampActionAccumulator(
             start_time=start_time, dt=1 / self.frequency
         )
+        if self.trajectory_buffer is not None:
+            self.trajectory_chunks = list()
+            self.last_trajectory_timestamp = start_time
+            self.trajectory_stop_event.clear()
+            self.trajectory_thread = threading.Thread(
+                target=self._trajectory_loop, daemon=True
+            )
+            self.trajectory_thread.start()
         print(f"Episode {episode_id} started!")
 
     def end_episode(self):
@@ -416,6 +503,8 @@ class RealEnv:
 
         # stop video recorder
 
+        # the drain thread must not append while the episode is assembled
+        self._stop_trajectory_thread()
         if self.obs_accumulator is not None:
             # recording
             assert self.action_accumulator is not None
@@ -442,6 +531,17 @@ class RealEnv:
                 for key, value in obs_data.items():
                     episode[key] = value[:n_steps]
                 self.replay_buffer.add_episode(episode, compressors="disk")
+                if self.trajectory_chunks is not None:
+                    self._accumulate_trajectory()
+                    trajectory = dict()
+                    for key in self.trajectory_chunks[0].keys():
+                        trajectory[key] = np.concatenate(
+                            [chunk[key] for chunk in self.trajectory_chunks]
+                        )
+                    if len(trajectory["timestamp"]) > 0:
+                        self.trajectory_buffer.add_episode(trajectory, compressors="disk")
+                    else:
+                        add_empty_episodes(self.trajectory_buffer, 1)
                 episode_id = self.replay_buffer.n_episodes - 1
                 print(f"Episode {episode_id} saved!")
 
@@ -449,13 +549,33 @@ class RealEnv:
             self.action_accumulator = None
             self.delta_action_accumulator = None
             self.stage_accumulator = None
+            self.trajectory_chunks = None
         self.realsense.stop_recording()
 
     def drop_episode(self):
         self.end_episode()
         self.replay_buffer.drop_episode()
+        if self.trajectory_buffer is not None:
+            if self.trajectory_buffer.n_episodes > self.replay_buffer.n_episodes:
+                self.trajectory_buffer.drop_episode()
         episode_id = self.replay_buffer.n_episodes
         this_video_dir = self.video_dir.joinpath(str(episode_id))
         if this_video_dir.exists():
             shutil.rmtree(str(this_video_dir))
         print(f"Episode {episode_id} dropped!")
+
+
+def add_empty_episodes(replay_buffer: ReplayBuffer, n_episodes: int):
+    """append zero-length episodes, also before the first array exists"""
+    if n_episodes <= 0:
+        return
+    n_steps = replay_buffer.n_steps
+    episode_ends = replay_buffer.episode_ends
+    episode_ends.resize(episode_ends.shape[0] + n_episodes)
+    episode_ends[-n_episodes:] = n_steps
+    if episode_ends.chunks[0] < episode_ends.shape[0]:
+        rechunk_recompress_array(
+            replay_buffer.meta,
+            "episode_ends",
+            chunk_length=int(episode_ends.shape[0] * 1.5),
+        )
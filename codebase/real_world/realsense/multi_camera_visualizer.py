@@ -2,9 +2,11 @@ import cv2
 import time
 import numpy as np
 import multiprocessing as mp
+from typing import Dict, Optional
 from threadpoolctl import threadpool_limits
 
 from codebase.real_world.realsense.multi_realsense import MultiRealsense
+from common.realtime import apply_realtime_config
 
 
 class MultiCameraVisualizer(mp.Process):
@@ -17,7 +19,11 @@ class MultiCameraVisualizer(mp.Process):
         vis_fps=60,
         fill_value=0,
         rgb_to_bgr=True,
+        rt_config: Optional[Dict] = None,
     ):
+        """
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime
+        """
         super().__init__()
         self.row, self.col = row, col
         self.window_name = window_name
@@ -25,6 +31,7 @@ class MultiCameraVisualizer(mp.Process):
         self.fill_value = fill_value
         self.rgb_to_bgr = rgb_to_bgr
         self.realsense = realsense
+        self.rt_config = rt_config
         # shared variables
         self.stop_event = mp.Event()
 
@@ -43,6 +50,7 @@ class MultiCameraVisualizer(mp.Process):
         self.join()
 
     def run(self):
+        apply_realtime_config(self.rt_config, name="visualizer")
         cv2.setNumThreads(1)
         threadpool_limits(1)
         channel_slice = slice(None)
@@ -33,6 +33,7 @@ class MultiRealsense:
             Union[Callable[[Dict], Dict], List[Callable]]
         ] = None,
         video_recorder: Optional[Union[VideoRecorder, List[VideoRecorder]]] = None,
+        rt_config: Optional[Union[dict, List[dict]]] = None,
         verbose=False,
     ):
         if shm_manager is None:
@@ -48,6 +49,7 @@ class MultiRealsense:
         recording_transform = repeat_to_list(recording_transform, n_cameras, Callable)
 
         video_recorder = repeat_to_list(video_recorder, n_cameras, VideoRecorder)
+        rt_config = repeat_to_list(rt_config, n_cameras, dict)
 
         cameras = dict()
         for i, serial in enumerate(serial_numbers):
@@ -68,6 +70,7 @@ class MultiRealsense:
                 vis_transform=vis_transform[i],
                 recording_transform=recording_transform[i],
                 video_recorder=video_recorder[i],
+                rt_config=rt_config[i],
                 verbose=verbose,
             )
 
@@ -17,6 +17,7 @@ from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuf
 from codebase.shared_memory.shared_memory_queue import SharedMemoryQueue, Full, Empty
 from codebase.real_world.realsense.video_recoder import VideoRecorder
 from common.timestamp_accumulator import get_accumulate_timestamp_idxs
+from common.realtime import apply_realtime_config
 
 
 class Command(enum.Enum):
@@ -48,8 +49,13 @@ class SingleRealsense(mp.Process):
         vis_transform: Optional[Callable[[Dict], Dict]] = None,
         recording_transform: Optional[Callable[[Dict], Dict]] = None,
         video_recorder: Optional[VideoRecorder] = None,
+        rt_config: Optional[Dict] = None,
         verbose=False,
     ):
+        """
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime,
+            the affinity also binds the video encoding threads
+        """
         super().__init__()
 
         if put_fps is None:
@@ -142,6 +148,7 @@ class SingleRealsense(mp.Process):
         self.vis_transform = vis_transform
         self.recording_transform = recording_transform
         self.video_recorder = video_recorder
+        self.rt_config = rt_config
         self.verbose = verbose
         self.put_start_time = None
 
@@ -281,6 +288,11 @@ class SingleRealsense(mp.Process):
 
     # ========= interval API ===========
     def run(self):
+        apply_realtime_config(
+            self.rt_config,
+            buffers=[self.ring_buffer, self.vis_ring_buffer, self.command_queue],
+            name=f"camera {self.serial_number}",
+        )
         # limit threads
         threadpool_limits(1)
         cv2.setNumThreads(1)
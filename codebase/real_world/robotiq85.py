@@ -20,11 +20,15 @@ sys.path.append(ROOT_DIR)
 from multiprocessing.managers import SharedMemoryManager
 from codebase.shared_memory.shared_memory_queue import SharedMemoryQueue, Full, Empty
 from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+from common.loop_stats import LoopStats
+from common.precise_sleep import DeadlineScheduler
+from common.realtime import apply_realtime_config, SOFT_REAL_TIME
 
 
 class Command(enum.Enum):
     STOP = 0
     ACTIVATE = 1
+    SCHEDULE_WAYPOINT = 2
 
 
 class Robotiq85(mp.Process):
@@ -33,35 +37,39 @@ class Robotiq85(mp.Process):
         shm_manager: SharedMemoryManager,
         frequency: int,
         receive_keys: Optional[List],
-        launch_timeout: int = 3,
+        launch_timeout: int = 10,
         soft_real_time: bool = False,
+        rt_config: Optional[Dict] = None,
         get_max_k: int = 128,
         verbose: bool = False,
+        deadline_policy: str = "skip",
     ):
+        """
+        launch_timeout: covers connecting and activation, both run in the controller process
+        deadline_policy: "skip" or "catch_up" iterations that missed their deadline
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime, overrides soft_real_time
+        """
         super().__init__(name="ROBOTIQ85Controller")
 
+        # connected in the controller process so other devices start up meanwhile
         self.client = None
-        for _ in range(20):
-            if not self.connectToDevice("/dev/ttyUSB0"):
-                print("reconnecting to robotiq85...")
-                time.sleep(0.2)
-        if not self.client.connect():
-            raise Exception("gripper connect error")
-
-        self.reset()
-        self.activate(timeout=0.05)
 
         self.launch_timeout = launch_timeout
         self.frequency = frequency
         self.get_max_k = get_max_k
         self.soft_real_time = soft_real_time
+        if rt_config is None and soft_real_time:
+            rt_config = SOFT_REAL_TIME
+        self.rt_config = rt_config
         self.verbose = verbose
+        self.deadline_policy = deadline_policy
 
         # build input queue
         example = {
             "cmd": Command.ACTIVATE.value,
             "target_pose": np.zeros((1,), dtype=np.float64),
             "duration": 0.0,
+            "target_time": 0.0,
         }
 
         input_queue = SharedMemoryQueue.create_from_examples(
@@ -86,10 +94,16 @@ class Robotiq85(mp.Process):
             put_desired_frequency=frequency,
         )
 
+        # timing telemetry, readable from any process
+        loop_stats = LoopStats(shm_manager=shm_manager, frequency=frequency)
+
         self.ready_event = mp.Event()
+        # ready_event is also set when the process exits, this tells the two apart
+        self.setup_ok = mp.Event()
         self.input_queue = input_queue
         self.ring_buffer = ring_buffer
         self.receive_keys = receive_keys
+        self.loop_stats = loop_stats
 
     # ========= launch method ===========
     def start(self, wait=True):
@@ -113,6 +127,10 @@ class Robotiq85(mp.Process):
 
     def start_wait(self):
         self.ready_event.wait(self.launch_timeout)
+        if not self.setup_ok.is_set():
+            raise RuntimeError(
+                "[Robotiq85Controller] Setup failed or timed out, see the controller log."
+            )
         assert self.is_alive()
 
     def stop_wait(self):
@@ -120,7 +138,7 @@ class Robotiq85(mp.Process):
 
     @property
     def is_ready(self):
-        return self.ready_event.is_set()
+        return self.setup_ok.is_set() and self.ready_event.is_set()
 
     # ========= context manager ===========
     def __enter__(self):
@@ -142,6 +160,25 @@ class Robotiq85(mp.Process):
         }
         self.input_queue.put(message)
 
+    def schedule_waypoints(self, poses, target_times):
+        """
+        open/close targets applied at their global target times, one queue write
+        poses: (N, 1), target_times: (N,)
+        """
+        poses = np.array(poses, dtype=np.float64)
+        target_times = np.array(target_times, dtype=np.float64)
+        assert poses.shape[1:] == (1,)
+        assert len(poses) == len(target_times)
+        if len(poses) == 0:
+            return
+
+        message = {
+            "cmd": Command.SCHEDULE_WAYPOINT.value,
+            "target_pose": poses,
+            "target_time": target_times,
+        }
+        self.input_queue.put_k(message)
+
     def get_state(self, k=None, out=None):
         if k is None:
             return self.ring_buffer.get(out=out)
@@ -151,12 +188,20 @@ class Robotiq85(mp.Process):
     def get_all_state(self):
         return self.ring_buffer.get_all()
 
+    def get_loop_stats(self, out=None):
+        return self.loop_stats.get(out=out)
+
     def run(self):
         cprint("Now Gripper threading is running!", "yellow")
-        if self.soft_real_time:
-            os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(20))
+        apply_realtime_config(
+            self.rt_config,
+            buffers=[self.input_queue, self.ring_buffer, self.loop_stats.ring_buffer],
+            name=self.name,
+        )
 
         try:
+            self.setup_gripper()
+
             # init pose
             self.reset()
             self.activate(timeout=0.05)
@@ -167,11 +212,18 @@ class Robotiq85(mp.Process):
             iter_idx = 0
             target_pose = 0  # open
             curr_status = "OPEN"
+            # scheduled (monotonic time, target), sorted by time
+            waypoints = list()
             keep_running = True
+            # absolute deadlines t0 + k*dt, overruns don't shift the schedule
+            scheduler = DeadlineScheduler(dt=dt, policy=self.deadline_policy)
             while keep_running:
                 t_start = time.perf_counter()
 
                 t_now = time.monotonic()
+                # apply every scheduled target that is due
+                while waypoints and waypoints[0][0] <= t_now:
+                    target_pose = waypoints.pop(0)[1]
                 # update robot state
                 state = dict()
                 if np.around(target_pose):  # close only when it's open
@@ -182,6 +234,7 @@ class Robotiq85(mp.Process):
                     if curr_status == "CLOSE":
                         self.open()
                         curr_status = "OPEN"
+                t_send_recv = time.perf_counter()
                 for key in self.receive_keys:
                     state[key] = target_pose
                 state["gripper_receive_timestamp"] = time.time()
@@ -205,6 +258,8 @@ class Robotiq85(mp.Process):
                         # stop immediately, ignore later commands
                         break
                     elif cmd == Command.ACTIVATE.value:
+                        # immediate targets override the schedule
+                        waypoints.clear()
                         target_pose = command["target_pose"]
                         duration = float(command["duration"])
                         curr_time = t_now + dt
@@ -215,23 +270,49 @@ class Robotiq85(mp.Process):
                                 f"[ROBOTIQ85Controller] New pose target: {target_pose}",
                                 "red",
                             )
+                    elif cmd == Command.SCHEDULE_WAYPOINT.value:
+                        # translate global time to monotonic time
+                        target_time = time.monotonic() - time.time() + float(command["target_time"])
+                        # a new waypoint replaces everything scheduled after it
+                        waypoints = [w for w in waypoints if w[0] < target_time]
+                        waypoints.append((target_time, command["target_pose"].copy()))
                     else:
                         keep_running = False
                         break
                 # regulate frequency
-                t_end = time.perf_counter()
-                if t_end - t_start < dt:
-                    time.sleep(dt - t_end + t_start)
+                n_missed = scheduler.wait()
 
                 # first loop successful, ready to receive command
                 if iter_idx == 0:
                     print("Gripper ready event is set!!!")
+                    self.setup_ok.set()
                     self.ready_event.set()
                 iter_idx += 1
 
+                self.loop_stats.record(
+                    loop_period=time.perf_counter() - t_start,
+                    send_recv_time=t_send_recv - t_start,
+                    interp_time=0.0,
+                    overrun=n_missed,
+                )
+
         finally:
-            self.open()
-            self.disconnectFromDevice()
+            # wake start_wait now, setup_ok tells it whether setup succeeded
+            self.ready_event.set()
+            if self.client is not None:
+                self.open()
+                self.disconnectFromDevice()
+
+    def setup_gripper(self):
+        """connect to the gripper, retrying while the serial device comes up"""
+        for _ in range(20):
+            if self.connectToDevice("/dev/ttyUSB0"):
+                break
+            print("reconnecting to robotiq85...")
+            time.sleep(0.2)
+        else:
+            self.client = None
+            raise Exception("gripper connect error")
 
     def connectToDevice(self, device):
         """Connection to the client"""
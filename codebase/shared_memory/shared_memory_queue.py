@@ -105,6 +105,42 @@ class SharedMemoryQueue:
         # update idx
         self.write_counter.add(1)
 
+    def put_k(self, data: Dict[str, Union[np.ndarray, numbers.Number]]):
+        """
+        put k items with a single counter update, readers see all or none of them
+        data: arrays with leading dim k, numbers are repeated for every item
+        """
+        k = None
+        for value in data.values():
+            if isinstance(value, np.ndarray):
+                assert k is None or len(value) == k, "All arrays must have the same length."
+                k = len(value)
+        assert k is not None, "At least one array is needed to infer k."
+
+        read_count = self.read_counter.load()
+        write_count = self.write_counter.load()
+        n_data = write_count - read_count
+        if n_data + k > self.buffer_size:
+            raise Full()
+
+        curr_idx = write_count % self.buffer_size
+        for key, value in data.items():
+            arr = self.shared_arrays[key].get()
+            if not isinstance(value, np.ndarray):
+                value = np.full((k,), value, dtype=arr.dtype)
+
+            start = curr_idx
+            end = min(start + k, self.buffer_size)
+            arr[start:end] = value[: end - start]
+
+            remainder = k - (end - start)
+            if remainder > 0:
+                # wrap around
+                arr[:remainder] = value[end - start :]
+
+        # update idx
+        self.write_counter.add(k)
+
     def get(self, out=None) -> Dict[str, np.ndarray]:
         write_count = self.write_counter.load()
         read_count = self.read_counter.load()
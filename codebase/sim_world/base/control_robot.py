@@ -1,4 +1,3 @@
-import api.sim as sim
 from abc import ABCMeta, abstractmethod
 from typing import Optional, List, Union
 import numpy as np
@@ -10,6 +9,7 @@ import pathlib
 import math
 import json
 from utils.data_utils import *
+from codebase.sim_world.base.transport import BaseTransport
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,8 @@ class BaseRobot(metaclass=ABCMeta):
                  OtherCam: Union[List, str, None] = None,
                  Address: str = "127.0.0.1",
                  Port: int = 19999,
+                 Transport: Optional[BaseTransport] = None,
+                 CheckpointScript: Optional[str] = None,
                  ) -> None:
         self.robot_name = RobotName
         self.target_name = TargetName
@@ -35,16 +37,14 @@ class BaseRobot(metaclass=ABCMeta):
         self.meta_data = None
         self.marker_poses = None
         self.camera_dicts = {}
+        self.checkpoint_script = CheckpointScript
+        self.checkpoint = None
 
-        sim.simxFinish(-1)  # in case, close all existed connections first
-        self.clientID = sim.simxStart(
-            connectionAddress = self.address, 
-            connectionPort = self.port,
-            waitUntilConnected = True,
-            doNotReconnectOnceDisconnected = True,
-            timeOutInMs = 5000,
-            commThreadCycleInMs = 5,
-        )
+        if Transport is None:
+            # default to the legacy remote API
+            from codebase.sim_world.base.legacy_transport import LegacyRemoteApiTransport
+            Transport = LegacyRemoteApiTransport(address=self.address, port=self.port)
+        self.transport = Transport
 
         # set path for data saving
         self.data_dir = pathlib.Path(DataDir)
@@ -62,11 +62,11 @@ class BaseRobot(metaclass=ABCMeta):
         """ set up robot, if available """
         
         if self.robot_name is not None:
-            sim_ret, self.robotHandle = sim.simxGetObjectHandle(self.clientID, self.robot_name, sim.simx_opmode_blocking)
-            sim_ret, self.targetHanle = sim.simxGetObjectHandle(self.clientID, self.target_name, sim.simx_opmode_blocking)
+            self.robotHandle = self.transport.get_object_handle(self.robot_name)
+            self.targetHanle = self.transport.get_object_handle(self.target_name)
         else:
             # set robot handle to target object if no robot used
-            sim_ret, self.targetHanle = sim.simxGetObjectHandle(self.clientID, self.target_name, sim.simx_opmode_blocking)
+            self.targetHanle = self.transport.get_object_handle(self.target_name)
             self.robotHandle = self.targetHanle
 
     def _setup_cameras(self):
@@ -86,14 +86,14 @@ class BaseRobot(metaclass=ABCMeta):
         assert len(self.cam_names) != 0, "No cameras to add, exiting..."
 
         for cam_name in self.cam_names:
-            sim_ret, cam_handle = sim.simxGetObjectHandle(self.clientID, cam_name, sim.simx_opmode_blocking)
-            _, resolution, _ = sim.simxGetVisionSensorImage(self.clientID, cam_handle, 0, sim.simx_opmode_streaming) # Recommended simx_opmode_streaming (the first call) and simx_opmode_buffer (the following calls)
+            cam_handle = self.transport.get_object_handle(cam_name)
+            resolution, _ = self.transport.get_vision_sensor_image(cam_handle, 0)
 
             cam_intrinsic = _get_K(resolution)
 
             # Get camera pose and intrinsics in simulation
-            sim_ret, cam_position = sim.simxGetObjectPosition(self.clientID, cam_handle, -1, sim.simx_opmode_blocking) # absolute position
-            sim_ret, cam_quat = sim.simxGetObjectQuaternion(self.clientID, cam_handle, -1, sim.simx_opmode_blocking)
+            cam_position = self.transport.get_object_position(cam_handle, -1) # absolute position
+            cam_quat = self.transport.get_object_quaternion(cam_handle, -1)
 
             cam_pose = get_pose_mat((cam_position, cam_quat))
             cam_depth_scale = 1
@@ -110,22 +110,19 @@ class BaseRobot(metaclass=ABCMeta):
 
     def _close(self):
         """ kill the connection """
-        # make sure that the last command sent out had time to arrive
-        sim.simxGetPingTime(self.clientID)
-        # close the connection to CoppeliaSim:
-        sim.simxFinish(self.clientID)
+        self.transport.close()
 
     def _get_pose(self, obj_handle, use_quat=True):
         """ obtain object pose with position and rotation """
 
         assert obj_handle is not None, "object handler is not set."
 
-        sim_ret, position = sim.simxGetObjectPosition(self.clientID, obj_handle, -1, sim.simx_opmode_blocking)
+        position = self.transport.get_object_position(obj_handle, -1)
 
         if use_quat:
-            sim_ret, rotation = sim.simxGetObjectQuaternion(self.clientID, obj_handle, -1, sim.simx_opmode_blocking)
+            rotation = self.transport.get_object_quaternion(obj_handle, -1)
         else:
-            sim_ret, rotation = sim.simxGetObjectOrientation(self.clientID, obj_handle, -1, sim.simx_opmode_blocking)
+            rotation = self.transport.get_object_orientation(obj_handle, -1)
 
         pose = (np.array(position), np.array(rotation))
 
@@ -139,15 +136,55 @@ class BaseRobot(metaclass=ABCMeta):
             raise NotImplementedError("Only original VREP format is allowed for robot control at present.")
 
         target_pos, target_rot = target_pose
-        sim.simxSetObjectPosition(self.clientID, obj_handle, -1, target_pos, sim.simx_opmode_blocking)
+        self.transport.set_object_position(obj_handle, target_pos, -1)
 
         if len(target_rot) == 4:    # Quaternion
-            sim.simxSetObjectQuaternion(self.clientID, obj_handle, -1, target_rot, sim.simx_opmode_blocking)
+            self.transport.set_object_quaternion(obj_handle, target_rot, -1)
         elif len(target_rot) == 3:  # Orientation
-            sim.simxSetObjectOrientation(self.clientID, obj_handle, -1, target_rot, sim.simx_opmode_blocking)
+            self.transport.set_object_orientation(obj_handle, target_rot, -1)
         else:
             raise NotImplementedError("Unsupported rotation type.")
-        
+
+    def _set_poses(self, obj_handles, target_poses):
+        """
+        set several objects into target poses within one communication cycle
+            writes are queued in a transport batch, so that they are sent
+            to the server in the same message
+        """
+
+        assert len(obj_handles) == len(target_poses), "Each object handler needs a target pose."
+
+        with self.transport.batch():
+            for obj_handle, target_pose in zip(obj_handles, target_poses):
+                self._set_pose(obj_handle, target_pose)
+
+    def _save_checkpoint(self):
+        """
+        snapshot the configuration tree of the whole scene with one script call
+            the scene needs the functions in codebase/sim_world/scripts/scene_checkpoint.lua
+        """
+
+        assert self.checkpoint_script is not None, "Checkpoint script is not set."
+
+        _, _, _, buffer = self.transport.call_script_function("saveSceneCheckpoint", self.checkpoint_script)
+        if len(buffer) == 0:
+            logger.warning(f"No checkpoint returned by {self.checkpoint_script}, is the script loaded?")
+            return None
+
+        self.checkpoint = bytes(buffer)
+        return self.checkpoint
+
+    def _restore_checkpoint(self, checkpoint: Optional[bytes] = None):
+        """ restore a scene snapshot (default: the last saved one) with one script call """
+
+        if checkpoint is None:
+            checkpoint = self.checkpoint
+        assert checkpoint is not None, "No checkpoint to restore."
+
+        retInts, _, _, _ = self.transport.call_script_function(
+            "restoreSceneCheckpoint", self.checkpoint_script, buffer=checkpoint
+        )
+        return len(retInts) > 0 and retInts[0] == 1
 
     def _get_meta(self):
         if self.meta_data is not None:
@@ -169,9 +206,9 @@ class BaseRobot(metaclass=ABCMeta):
         self.meta_data = meta_data
 
     def _check_pose(self, target_obj_handle, mode="INFO"):
-        sim_ret, orientation = sim.simxGetObjectOrientation(self.clientID, target_obj_handle, -1, sim.simx_opmode_blocking)
-        sim_ret, position = sim.simxGetObjectPosition(self.clientID, target_obj_handle, -1, sim.simx_opmode_blocking)
-        sim_ret, quaternion = sim.simxGetObjectQuaternion(self.clientID, target_obj_handle, -1, sim.simx_opmode_blocking)
+        orientation = self.transport.get_object_orientation(target_obj_handle, -1)
+        position = self.transport.get_object_position(target_obj_handle, -1)
+        quaternion = self.transport.get_object_quaternion(target_obj_handle, -1)
 
         if mode == "INFO":
             logger.info(f"Trans: {position}, Orient: {orientation}, Quat: {quaternion}")
@@ -203,7 +240,7 @@ class BaseRobot(metaclass=ABCMeta):
         assert isinstance(cam_info, dict), "Camera Info must saved in dict type."
 
         cam_handle = cam_info["handle"]
-        sim_ret, resolution, raw_image = sim.simxGetVisionSensorImage(self.clientID, cam_handle, 0, sim.simx_opmode_streaming)
+        resolution, raw_image = self.transport.get_vision_sensor_image(cam_handle, 0)
 
         color_img = np.asarray(raw_image, dtype=np.uint8)
         color_img = color_img.resize([resolution[0], resolution[1], 3])
@@ -212,7 +249,7 @@ class BaseRobot(metaclass=ABCMeta):
         # color_img = np.flipud(color_img)
 
         if need_depth:
-            sim_ret, resolution, depth_buffer = sim.simxGetVisionSensorDepthBuffer(self.clientID, cam_handle, sim.simx_opmode_buffer)
+            resolution, depth_buffer = self.transport.get_vision_sensor_depth_buffer(cam_handle)
 
             depth_img = np.asarray(depth_buffer, dtype=np.uint8)
             depth_img = depth_img.resize([resolution[0], resolution[1]])
@@ -230,6 +267,16 @@ class BaseRobot(metaclass=ABCMeta):
 
         return color_img, depth_img, cam_info['name']
 
+    def _set_camera_data(self, cam_info, color_img):
+        """
+        push an rgb image back into a sim camera, e.g. rendered, augmented or recorded frames
+            color_img is laid out as returned by _get_camera_data
+        """
+        assert isinstance(cam_info, dict), "Camera Info must saved in dict type."
+
+        color_img = np.ascontiguousarray(np.fliplr(color_img), dtype=np.uint8)
+        self.transport.set_vision_sensor_image(cam_info["handle"], color_img, 0)
+
     @abstractmethod
     def run(self):
         pass
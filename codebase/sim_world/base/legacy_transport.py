@@ -0,0 +1,130 @@
+import logging
+from typing import List, Optional, Sequence
+
+import api.sim as sim
+from codebase.sim_world.base.transport import BaseTransport
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyRemoteApiTransport(BaseTransport):
+    """
+    transport over the legacy C remote API (api/sim.py)
+
+    Setters are blocking, except inside `batch()` where they are queued with
+    oneshot mode while communication is paused, so they share one comm cycle.
+    """
+
+    def __init__(
+        self,
+        address: str = "127.0.0.1",
+        port: int = 19999,
+        timeout_ms: int = 5000,
+        comm_thread_cycle_ms: int = 5,
+    ) -> None:
+        super().__init__(address, port)
+        self.timeout_ms = timeout_ms
+        self.comm_thread_cycle_ms = comm_thread_cycle_ms
+        self.clientID = -1
+        self._streamed_handles = set()
+
+        self.connect()
+
+    @property
+    def is_connected(self):
+        return self.clientID != -1
+
+    @property
+    def _set_mode(self):
+        return sim.simx_opmode_oneshot if self.in_batch else sim.simx_opmode_blocking
+
+    def connect(self):
+        sim.simxFinish(-1)  # in case, close all existed connections first
+        self.clientID = sim.simxStart(
+            connectionAddress = self.address,
+            connectionPort = self.port,
+            waitUntilConnected = True,
+            doNotReconnectOnceDisconnected = True,
+            timeOutInMs = self.timeout_ms,
+            commThreadCycleInMs = self.comm_thread_cycle_ms,
+        )
+
+    def close(self):
+        """ kill the connection """
+        # make sure that the last command sent out had time to arrive
+        sim.simxGetPingTime(self.clientID)
+        # close the connection to CoppeliaSim:
+        sim.simxFinish(self.clientID)
+        self.clientID = -1
+
+    def _begin_batch(self):
+        sim.simxPauseCommunication(self.clientID, True)
+
+    def _end_batch(self):
+        sim.simxPauseCommunication(self.clientID, False)
+
+    def get_object_handle(self, name: str) -> int:
+        sim_ret, handle = sim.simxGetObjectHandle(self.clientID, name, sim.simx_opmode_blocking)
+        return handle
+
+    def get_object_position(self, handle: int, relative_to: int = -1) -> List[float]:
+        sim_ret, position = sim.simxGetObjectPosition(self.clientID, handle, relative_to, sim.simx_opmode_blocking)
+        return position
+
+    def get_object_orientation(self, handle: int, relative_to: int = -1) -> List[float]:
+        sim_ret, orientation = sim.simxGetObjectOrientation(self.clientID, handle, relative_to, sim.simx_opmode_blocking)
+        return orientation
+
+    def get_object_quaternion(self, handle: int, relative_to: int = -1) -> List[float]:
+        sim_ret, quaternion = sim.simxGetObjectQuaternion(self.clientID, handle, relative_to, sim.simx_opmode_blocking)
+        return quaternion
+
+    def set_object_position(self, handle: int, position: Sequence[float], relative_to: int = -1):
+        sim.simxSetObjectPosition(self.clientID, handle, relative_to, position, self._set_mode)
+
+    def set_object_orientation(self, handle: int, orientation: Sequence[float], relative_to: int = -1):
+        sim.simxSetObjectOrientation(self.clientID, handle, relative_to, orientation, self._set_mode)
+
+    def set_object_quaternion(self, handle: int, quaternion: Sequence[float], relative_to: int = -1):
+        sim.simxSetObjectQuaternion(self.clientID, handle, relative_to, quaternion, self._set_mode)
+
+    def get_vision_sensor_image(self, handle: int, options: int = 0):
+        # Recommended simx_opmode_streaming (the first call) and simx_opmode_buffer (the following calls)
+        if handle in self._streamed_handles:
+            mode = sim.simx_opmode_buffer
+        else:
+            mode = sim.simx_opmode_streaming
+            self._streamed_handles.add(handle)
+        sim_ret, resolution, image = sim.simxGetVisionSensorImage(self.clientID, handle, options, mode)
+        return resolution, image
+
+    def set_vision_sensor_image(self, handle: int, image, options: int = 0):
+        sim.simxSetVisionSensorImage(self.clientID, handle, image, options, self._set_mode)
+
+    def get_vision_sensor_depth_buffer(self, handle: int):
+        sim_ret, resolution, depth_buffer = sim.simxGetVisionSensorDepthBuffer(self.clientID, handle, sim.simx_opmode_buffer)
+        return resolution, depth_buffer
+
+    def call_script_function(
+        self,
+        function_name: str,
+        script_name: str,
+        ints: Optional[List[int]] = None,
+        floats: Optional[List[float]] = None,
+        strings: Optional[List[str]] = None,
+        buffer: bytes = b"",
+    ):
+        res, retInts, retFloats, retStrings, retBuffer = sim.simxCallScriptFunction(
+            self.clientID,
+            script_name,
+            sim.sim_scripttype_childscript,
+            function_name,
+            ints or [],
+            floats or [],
+            strings or [],
+            buffer,
+            self._set_mode,
+        )
+        if res != sim.simx_return_ok and not self.in_batch:
+            logger.error(f"Script function {function_name}@{script_name} returned with error code: {res}")
+        return retInts, retFloats, retStrings, retBuffer
@@ -0,0 +1,112 @@
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
+
+
+class BaseTransport(metaclass=ABCMeta):
+    """
+    base transport class, the only layer that talks to the CoppeliaSim server
+
+    Robot classes call these methods instead of a specific remote API, so the
+    backend (legacy remote API, ZeroMQ, ...) can be swapped without touching them.
+    Inside `with transport.batch():` setter calls may be queued and sent together.
+    """
+
+    def __init__(self, address: str = "127.0.0.1", port: int = 19999) -> None:
+        self.address = address
+        self.port = port
+        self._batch_depth = 0
+
+    @property
+    def in_batch(self):
+        return self._batch_depth > 0
+
+    @contextmanager
+    def batch(self):
+        """ queue setter calls and flush them together when leaving the outermost block """
+        self._batch_depth += 1
+        if self._batch_depth == 1:
+            self._begin_batch()
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._end_batch()
+
+    @property
+    @abstractmethod
+    def is_connected(self) -> bool:
+        pass
+
+    @abstractmethod
+    def connect(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    @abstractmethod
+    def _begin_batch(self):
+        pass
+
+    @abstractmethod
+    def _end_batch(self):
+        pass
+
+    @abstractmethod
+    def get_object_handle(self, name: str) -> int:
+        pass
+
+    @abstractmethod
+    def get_object_position(self, handle: int, relative_to: int = -1) -> List[float]:
+        pass
+
+    @abstractmethod
+    def get_object_orientation(self, handle: int, relative_to: int = -1) -> List[float]:
+        pass
+
+    @abstractmethod
+    def get_object_quaternion(self, handle: int, relative_to: int = -1) -> List[float]:
+        pass
+
+    @abstractmethod
+    def set_object_position(self, handle: int, position: Sequence[float], relative_to: int = -1):
+        pass
+
+    @abstractmethod
+    def set_object_orientation(self, handle: int, orientation: Sequence[float], relative_to: int = -1):
+        pass
+
+    @abstractmethod
+    def set_object_quaternion(self, handle: int, quaternion: Sequence[float], relative_to: int = -1):
+        pass
+
+    @abstractmethod
+    def get_vision_sensor_image(self, handle: int, options: int = 0) -> Tuple[List[int], Sequence[int]]:
+        """ Return: (resolution, raw image) """
+        pass
+
+    @abstractmethod
+    def set_vision_sensor_image(self, handle: int, image, options: int = 0):
+        """ image: C-contiguous uint8 array (or bytes), sent without per-pixel conversion """
+        pass
+
+    @abstractmethod
+    def get_vision_sensor_depth_buffer(self, handle: int) -> Tuple[List[int], Sequence[float]]:
+        """ Return: (resolution, depth buffer) """
+        pass
+
+    @abstractmethod
+    def call_script_function(
+        self,
+        function_name: str,
+        script_name: str,
+        ints: Optional[List[int]] = None,
+        floats: Optional[List[float]] = None,
+        strings: Optional[List[str]] = None,
+        buffer: bytes = b"",
+    ) -> Tuple[List[int], List[float], List[str], bytes]:
+        """ call a function of a child script, Return: (ints, floats, strings, buffer) """
+        pass
@@ -0,0 +1,157 @@
+import struct
+import logging
+from typing import List, Optional, Sequence
+
+import zmq
+import cbor2
+
+from codebase.sim_world.base.transport import BaseTransport
+
+logger = logging.getLogger(__name__)
+
+
+class ZmqRemoteApiTransport(BaseTransport):
+    """
+    transport over the ZeroMQ remote API (CBOR encoded request-reply)
+
+    Request:  {"func": "sim.getObjectPosition", "args": [handle, -1]}
+    Reply:    {"success": True, "ret": [[x, y, z]]}, or {"success": False, "error": "..."}
+
+    Inside `batch()` setter calls are queued and flushed as one CBOR array of
+    requests, answered by one array of replies, i.e. a single round trip.
+    The server side must accept such arrays (see test/test_zmq_transport.py for a stand-in server).
+    """
+
+    scripttype_childscript = 1
+
+    def __init__(
+        self,
+        address: str = "127.0.0.1",
+        port: int = 23000,
+        timeout_ms: int = 5000,
+    ) -> None:
+        super().__init__(address, port)
+        self.timeout_ms = timeout_ms
+        self.context = None
+        self.socket = None
+        self._queue = list()
+
+        self.connect()
+
+    @property
+    def is_connected(self):
+        return self.socket is not None
+
+    def connect(self):
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+        self.socket.setsockopt(zmq.SNDTIMEO, self.timeout_ms)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(f"tcp://{self.address}:{self.port}")
+        logger.info(f"Connected to ZeroMQ remote API at {self.address}:{self.port}")
+
+    def close(self):
+        """ kill the connection """
+        # make sure that queued commands are sent out before closing
+        self._flush()
+        self.socket.close()
+        self.socket = None
+
+    def _request(self, payload):
+        try:
+            self.socket.send(cbor2.dumps(payload))
+            return cbor2.loads(self.socket.recv())
+        except zmq.Again:
+            # a REQ socket stays stuck awaiting the reply, start over with a fresh one
+            self.socket.close()
+            self.connect()
+            raise TimeoutError(f"No reply from the ZeroMQ remote API within {self.timeout_ms}ms.")
+
+    @staticmethod
+    def _check(func, reply):
+        if not reply.get("success", False):
+            raise RuntimeError(f"Remote call {func} failed: {reply.get('error')}")
+        return reply.get("ret", [])
+
+    def _flush(self):
+        if not self._queue:
+            return
+        requests, self._queue = self._queue, list()
+        replies = self._request(requests)
+        assert len(replies) == len(requests), "Batch reply does not match batch request."
+        for request, reply in zip(requests, replies):
+            self._check(request["func"], reply)
+
+    def _call(self, func: str, *args, queue: bool = False):
+        request = {"func": func, "args": list(args)}
+        if queue and self.in_batch:
+            self._queue.append(request)
+            return None
+        # keep call order, queued setters go out first
+        self._flush()
+        return self._check(func, self._request(request))
+
+    def _begin_batch(self):
+        pass
+
+    def _end_batch(self):
+        self._flush()
+
+    def get_object_handle(self, name: str) -> int:
+        path = name if name.startswith("/") else "/" + name
+        return self._call("sim.getObject", path)[0]
+
+    def get_object_position(self, handle: int, relative_to: int = -1) -> List[float]:
+        return self._call("sim.getObjectPosition", handle, relative_to)[0]
+
+    def get_object_orientation(self, handle: int, relative_to: int = -1) -> List[float]:
+        return self._call("sim.getObjectOrientation", handle, relative_to)[0]
+
+    def get_object_quaternion(self, handle: int, relative_to: int = -1) -> List[float]:
+        return self._call("sim.getObjectQuaternion", handle, relative_to)[0]
+
+    def set_object_position(self, handle: int, position: Sequence[float], relative_to: int = -1):
+        self._call("sim.setObjectPosition", handle, relative_to, [float(v) for v in position], queue=True)
+
+    def set_object_orientation(self, handle: int, orientation: Sequence[float], relative_to: int = -1):
+        self._call("sim.setObjectOrientation", handle, relative_to, [float(v) for v in orientation], queue=True)
+
+    def set_object_quaternion(self, handle: int, quaternion: Sequence[float], relative_to: int = -1):
+        self._call("sim.setObjectQuaternion", handle, relative_to, [float(v) for v in quaternion], queue=True)
+
+    def get_vision_sensor_image(self, handle: int, options: int = 0):
+        image, resolution = self._call("sim.getVisionSensorImg", handle, options)
+        return list(resolution), image
+
+    def set_vision_sensor_image(self, handle: int, image, options: int = 0):
+        self._call("sim.setVisionSensorImg", handle, bytes(image), options, queue=True)
+
+    def get_vision_sensor_depth_buffer(self, handle: int):
+        depth, resolution = self._call("sim.getVisionSensorDepth", handle)
+        n = len(depth) // 4
+        return list(resolution), struct.unpack(f"<{n}f", depth)
+
+    def call_script_function(
+        self,
+        function_name: str,
+        script_name: str,
+        ints: Optional[List[int]] = None,
+        floats: Optional[List[float]] = None,
+        strings: Optional[List[str]] = None,
+        buffer: bytes = b"",
+    ):
+        ret = self._call(
+            "sim.callScriptFunction",
+            f"{function_name}@{script_name}",
+            self.scripttype_childscript,
+            [int(v) for v in ints or []],
+            [float(v) for v in floats or []],
+            list(strings or []),
+            bytes(buffer),
+            queue=True,
+        )
+        if ret is None:
+            return [], [], [], b""
+        ret = list(ret) + [[], [], [], b""][len(ret):]
+        return ret[0], ret[1], ret[2], ret[3]
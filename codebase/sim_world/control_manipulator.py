@@ -10,16 +10,12 @@ import datetime
 import math
 import numpy as np
 import logging
-import threading
-import common.spacemouse as pyspacemouse
-from common.spacemouse import DeviceConfig
-from common.spacemouse import *
 from typing import Optional, Callable, List, Tuple, Union
+from multiprocessing.managers import SharedMemoryManager
 from codebase.sim_world.base.control_robot import BaseRobot
+from codebase.sim_world.base.transport import BaseTransport
+from common.spacemouse_shared_memory import Spacemouse
 from utils.data_utils import *
-from collections import namedtuple
-
-import api.sim as sim
 
 FORMAT = "[%(asctime)s][%(levelname)s]: %(message)s"
 logging.basicConfig(
@@ -27,33 +23,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-## define your DofCallback funtions & DofCallbackarr
-def show_control_state(state: namedtuple):
-    """Dof event callback funtion"""
-    if state:
-        print(
-            "\t".join(
-                [
-                    "%4s %+.4f" % (k, getattr(state, k))
-                    for k in ["x", "y", "z", "roll", "pitch", "yaw"]
-                ]
-            )
-        )
-
-
-## define your ButtonCallback funtion & ButtonCallbackarr
-def show_button_status(state, buttons):
-    """Button event callback funtion"""
-    print((("[" + " ".join(["%2d, " % buttons[k] for k in range(len(buttons))])) + "]"))
+# The teleop gains & the axis fixes in input2action were tuned for the HID reader
+# (common.spacemouse): x, y, z, roll, pitch, yaw = (hx, -hy, -hz, -ry, -rx, rz) / 350.
+# spacenavd reports (hx, -hz, -hy) & (rx, -rz, -ry), get_motion_state_transformed
+# turns that into (hy, hx, -hz) & (ry, rx, -rz) / max_value, map it back:
+SPNAV_TO_HID_AXES = np.array([1, 0, 2, 3, 4, 5])
+SPNAV_TO_HID_SIGNS = np.array([1, -1, 1, -1, -1, -1])
+HID_AXIS_SCALE = 350.0
 
 
 class ManipulatorRobot(BaseRobot):
-    """Wrapper for controlling Manipulator in CoppeliaSim with SpaceMouse"""
+    """
+    Wrapper for controlling Manipulator in CoppeliaSim with SpaceMouse
+
+    SpaceMouse input is read from the ring buffer of a started
+    common.spacemouse_shared_memory.Spacemouse process, same as real teleop.
+    """
 
     def __init__(
         self,
-        SpaceMouseConf: DeviceConfig,
+        SpaceMouse: Spacemouse,
         Address: str,
         Port: int,
         RobotName: str,
@@ -64,6 +53,8 @@ class ManipulatorRobot(BaseRobot):
         OtherCam: Union[List, str, None] = None,
         PosSensitivity: float = 1.0,
         RotSensitivity: float = 1.0,
+        Transport: Optional[BaseTransport] = None,
+        CheckpointScript: Optional[str] = None,
     ) -> None:
         super().__init__(
             RobotName=RobotName,
@@ -73,30 +64,17 @@ class ManipulatorRobot(BaseRobot):
             DataDir=DataDir,
             DefaultCam=DefaultCam,
             OtherCam=OtherCam,
+            Transport=Transport,
+            CheckpointScript=CheckpointScript,
         )
 
-        ## Connect SpaceMouse Device
-
-        # show device lists
-        logger.info(f"Mounted device: {list_devices()}")
-
-        HID = pyspacemouse.open(
-            callback=SpaceMouseConf.callback,
-            dof_callback=SpaceMouseConf.dof_callback,
-            dof_callback_arr=SpaceMouseConf.dof_callback_arr,
-            button_callback=SpaceMouseConf.button_callback,
-            button_callback_arr=SpaceMouseConf.button_callback_arr,
-            set_nonblocking_loop=SpaceMouseConf.set_nonblocking_loop,
-            device=SpaceMouseConf.device,
-            path=SpaceMouseConf.path,
-            DeviceNumber=SpaceMouseConf.DeviceNumber,
-        )
-        self.HIDevice = HID
+        ## SpaceMouse process, parsing HID input off the control path
+        self.spacemouse = SpaceMouse
 
         ## scene
         self.robot_dicts = {}
 
-        assert self.clientID != -1, "Failed to connect to simulation server."
+        assert self.transport.is_connected, "Failed to connect to simulation server."
         logger.info(
             f"Connecting to {self.robot_name} , through address {self.address} and port {self.port}."
         )
@@ -117,44 +95,36 @@ class ManipulatorRobot(BaseRobot):
         self.x, self.y, self.z = 0, 0, 0
         self.roll, self.pitch, self.yaw = 0, 0, 0
 
-        ## launch a listener thread to listen to SpaceMouse
-        self.thread = threading.Thread(target=self.run)
-        self.thread.daemon = True
-        self.thread.start()
-
     def setup_all(self):
         self._setup_robot()
         # self._setup_cameras()
+        if self.checkpoint_script is not None:
+            self._save_checkpoint()
 
     def _setup_robot(self):
         """setup any object you want here"""
         super()._setup_robot()
         self.obj_handle = {
-            obj_name: sim.simxGetObjectHandle(
-                self.clientID, obj_name, sim.simx_opmode_blocking
-            )[1]
+            obj_name: self.transport.get_object_handle(obj_name)
             for obj_name in self.obj_handle.keys()
         }
 
     def run(self):
         super().run()
-        """ Listener method that keeps pulling new message. """
-        while True:
-            if self._enable:
-                ## Read (pos, orient) from SpaceMouse
-                _, dof_changed, button_changed = self.HIDevice.read()
-
-                # button function
-                if button_changed:
-                    if self.HIDevice.control_gripper[0] == 0:  # release left button
-                        self.single_click_and_hold = False
-                    elif self.HIDevice.control_gripper[0] == 1:  # press left button
-                        if not self.single_click_and_hold:  # 0 -> 1
-                            self.gripper_changing = True
-                        self.single_click_and_hold = True
-                    if self.HIDevice.control_gripper[1] == 1:  # press right button
-                        self._reset_state = 1
-                        self._enable = False
+        """ Poll the latest SpaceMouse buttons from shared memory, non-blocking. """
+        if self._enable:
+            buttons = self.spacemouse.get_button_state()
+
+            # button function
+            if not buttons[0]:  # release left button
+                self.single_click_and_hold = False
+            else:  # press left button
+                if not self.single_click_and_hold:  # 0 -> 1
+                    self.gripper_changing = True
+                self.single_click_and_hold = True
+            if buttons[1]:  # press right button
+                self._reset_state = 1
+                self._enable = False
 
     def start_control(self):
         self._reset_internal_state()
@@ -173,29 +143,36 @@ class ManipulatorRobot(BaseRobot):
         self.single_click_and_hold = False
         self.last_gripper_state = False
 
+        # restore the whole scene (poses, joints, velocities) in one call
+        if self.checkpoint is not None and self._restore_checkpoint():
+            self.CloseOrOpen = "close"
+            return
+
         # (array([ 0.125     , -0.275114  ,  0.39874786]), array([3.1415925 , 0.08726646, 3.1415925 ]))
         target_pose = (
             np.array([0.125, -0.275114, 0.39874786]),
             np.array([3.1415925, 0, 3.1415925]),
         )
         # block (array([ 0.12800001, -0.27599999,  0.22499999]), array([-3.51055849e-17,  5.06398772e-18,  1.22060484e-20]))
-        sim_ret, block_handle = sim.simxGetObjectHandle(
-            self.clientID, "block", sim.simx_opmode_blocking
-        )
+        block_handle = self.transport.get_object_handle("block")
         block_pose = (np.array([0.128, -0.276, 0.225]), np.array([0, 0, 0]))
         self._set_pose(self.targetHanle, target_pose)
         self._set_pose(block_handle, target_pose)
         time.sleep(0.01)  # wait
 
     def input2action(self):
+        self.run()
         state: dict = self.get_controller_state
 
         dpos, rotation, raw_rotation, grasp, reset = [
             state[key] for key in state.keys()
         ]
 
-        # if we are resetting, directly return None value
+        # if we are resetting, reset the scene and directly return None value
         if reset:
+            self._reset_state = 0
+            self._enable = True
+            self._reset_internal_state()
             return None, None
 
         # some pre=processing FIXME
@@ -216,23 +193,13 @@ class ManipulatorRobot(BaseRobot):
             elif self.CloseOrOpen == "open":
                 grasp = 1
                 self.CloseOrOpen = "close"
-            res, retInts, retFloats, retStrings, retBuffer = sim.simxCallScriptFunction(
-                self.clientID,
-                "ROBOTIQ_85",
-                sim.sim_scripttype_childscript,
+            retInts, retFloats, retStrings, retBuffer = self.transport.call_script_function(
                 "ROBOTIQ_CloseOpen",
-                [grasp],
-                [],
-                [],
-                b"",
-                sim.simx_opmode_blocking,
+                "ROBOTIQ_85",
+                ints=[grasp],
             )
 
         # time.sleep(0.01) # wait
-        if self._reset_state:
-            self._reset_state = 0
-            self._enable = True
-            self._reset_internal_state()
 
     @property
     def get_controller_state(self):
@@ -243,8 +210,14 @@ class ManipulatorRobot(BaseRobot):
                 dict: a dictionary contraining dpos, nor, unmodified orn, grasp, and reset
         """
 
-        dpos = self.HIDevice.control_pose[:3] * 0.01 * self.pos_sensitivity
-        roll, pitch, yaw = self.HIDevice.control_pose[3:] * 0.05 * self.rot_sensitivity
+        control_pose = self.spacemouse.get_motion_state_transformed()
+        control_pose = (
+            control_pose[SPNAV_TO_HID_AXES]
+            * SPNAV_TO_HID_SIGNS
+            * (self.spacemouse.max_value / HID_AXIS_SCALE)
+        )
+        dpos = control_pose[:3] * 0.01 * self.pos_sensitivity
+        roll, pitch, yaw = control_pose[3:] * 0.05 * self.rot_sensitivity
 
         # convert RPY to an absolute orientation
         drot1 = rotation_matrix(angle=-pitch, direction=[1.0, 0, 0], point=None)[:3, :3]
@@ -257,35 +230,35 @@ class ManipulatorRobot(BaseRobot):
             dpos=dpos,
             rotation=self.rotation,
             raw_drotation=np.array([roll, pitch, yaw]),
-            grasp=self.HIDevice.control_gripper,
+            grasp=self.spacemouse.get_button_state(),
             reset=self._reset_state,
         )
 
 
 if __name__ == "__main__":
-    SpaceMouseConf = DeviceConfig(
-        # dof_callback = show_control_state
-    )
-    robot = ManipulatorRobot(
-        SpaceMouseConf,
-        Address="127.0.0.1",
-        Port=19999,
-        RobotName="LBR_iiwa_7_R800",
-        TargetName="targetSphere",
-        DataDir="data",
-        ObjName=["ROBOTIQ_85"],
-    )
-
-    # cnt = 0
-    # start_time = time.time() * 1000
-
-    robot.setup_all()
-    robot.start_control()
-    while True:
-        # cnt += 1
-        # if cnt % 1000 == 0:
-        #     cnt = 0
-        #     end_time = time.time() * 1000
-        #     print(f"Execute one time input2action need {(end_time - start_time - 0.02*1000) / 1000} ms averagely.")
-        #     start_time = end_time
-        robot.input2action()
+    with SharedMemoryManager() as shm_manager, Spacemouse(
+        shm_manager=shm_manager, get_max_k=30, frequency=200
+    ) as sm:
+        robot = ManipulatorRobot(
+            sm,
+            Address="127.0.0.1",
+            Port=19999,
+            RobotName="LBR_iiwa_7_R800",
+            TargetName="targetSphere",
+            DataDir="data",
+            ObjName=["ROBOTIQ_85"],
+        )
+
+        # cnt = 0
+        # start_time = time.time() * 1000
+
+        robot.setup_all()
+        robot.start_control()
+        while True:
+            # cnt += 1
+            # if cnt % 1000 == 0:
+            #     cnt = 0
+            #     end_time = time.time() * 1000
+            #     print(f"Execute one time input2action need {(end_time - start_time - 0.02*1000) / 1000} ms averagely.")
+            #     start_time = end_time
+            robot.input2action()
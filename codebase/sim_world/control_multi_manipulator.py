@@ -0,0 +1,174 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent.parent)
+sys.path.append(ROOT_DIR)
+
+import time
+import numpy as np
+import logging
+from typing import Optional, List, Tuple, Union
+from codebase.sim_world.base.control_robot import BaseRobot
+from codebase.sim_world.base.transport import BaseTransport
+
+FORMAT = "[%(asctime)s][%(levelname)s]: %(message)s"
+logging.basicConfig(
+    level=logging.INFO, format=FORMAT, handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+
+class MultiManipulatorRobot(BaseRobot):
+    """
+    Wrapper for controlling several Manipulators in CoppeliaSim through one remote-API connection.
+
+    Target dummies are moved by integrating delta actions onto locally cached target poses,
+    then all pose writes and gripper calls of one step are sent within the same comm cycle.
+    """
+
+    def __init__(
+        self,
+        Address: str,
+        Port: int,
+        RobotNames: List[str],
+        TargetNames: List[str],
+        DataDir: str,
+        GripperNames: Optional[List[str]] = None,
+        GripperFunction: str = "ROBOTIQ_CloseOpen",
+        DefaultCam: Union[List, str, None] = None,
+        OtherCam: Union[List, str, None] = None,
+        Transport: Optional[BaseTransport] = None,
+        CheckpointScript: Optional[str] = None,
+    ) -> None:
+        assert len(RobotNames) == len(TargetNames), "Each robot needs one target dummy."
+        if GripperNames is not None:
+            assert len(GripperNames) == len(RobotNames), "Each robot needs one gripper."
+
+        super().__init__(
+            RobotName=RobotNames[0],
+            TargetName=TargetNames[0],
+            Address=Address,
+            Port=Port,
+            DataDir=DataDir,
+            DefaultCam=DefaultCam,
+            OtherCam=OtherCam,
+            Transport=Transport,
+            CheckpointScript=CheckpointScript,
+        )
+
+        assert self.transport.is_connected, "Failed to connect to simulation server."
+        logger.info(
+            f"Connecting to {RobotNames} , through address {self.address} and port {self.port}."
+        )
+
+        self.robot_names = RobotNames
+        self.target_names = TargetNames
+        self.gripper_names = GripperNames
+        self.gripper_function = GripperFunction
+
+        self.robot_handles = list()
+        self.target_handles = list()
+        self.init_target_poses = list()
+        self.target_poses = list()
+        self.last_grasps = [0] * len(RobotNames)
+
+    @property
+    def n_robots(self):
+        return len(self.robot_names)
+
+    def setup_all(self):
+        self._setup_robot()
+        # self._setup_cameras()
+        if self.checkpoint_script is not None:
+            self._save_checkpoint()
+
+    def _setup_robot(self):
+        """look up every robot & target handle, and cache initial target poses"""
+        super()._setup_robot()
+
+        self.robot_handles = [
+            self.transport.get_object_handle(name) for name in self.robot_names
+        ]
+        self.target_handles = [
+            self.transport.get_object_handle(name) for name in self.target_names
+        ]
+
+        # read once, afterwards target poses are only written
+        self.init_target_poses = [
+            self._get_pose(handle, use_quat=False) for handle in self.target_handles
+        ]
+        self.target_poses = [
+            (pos.copy(), rot.copy()) for pos, rot in self.init_target_poses
+        ]
+
+    def run(self):
+        super().run()
+        """ Actions are pushed through input2action, no listener is needed. """
+
+    def reset(self):
+        """move every target dummy back to the pose cached at setup, restoring the scene checkpoint if any"""
+        self.target_poses = [
+            (pos.copy(), rot.copy()) for pos, rot in self.init_target_poses
+        ]
+        self.last_grasps = [0] * self.n_robots
+        if self.checkpoint is not None and self._restore_checkpoint():
+            return
+        self._set_poses(self.target_handles, self.target_poses)
+        time.sleep(0.01)  # wait
+
+    def input2action(
+        self,
+        actions: List[Optional[Tuple[np.ndarray, np.ndarray]]],
+        grasps: Optional[List[int]] = None,
+    ):
+        """
+        actions: per robot (dpos, drot_euler), or None to keep its target unchanged
+        grasps: per robot gripper command passed to GripperFunction, 0 keeps it unchanged
+        """
+        assert len(actions) == self.n_robots, "One action per robot is required."
+
+        for idx, action in enumerate(actions):
+            if action is None:
+                continue
+            dpos, drot = action
+            pos, rot = self.target_poses[idx]
+            self.target_poses[idx] = (pos + np.asarray(dpos), rot + np.asarray(drot))
+
+        # pose writes & gripper calls of every robot go out in one comm cycle
+        with self.transport.batch():
+            self._set_poses(self.target_handles, self.target_poses)
+            if grasps is not None and self.gripper_names is not None:
+                for idx, grasp in enumerate(grasps):
+                    if grasp == 0 or grasp == self.last_grasps[idx]:
+                        continue
+                    self.last_grasps[idx] = grasp
+                    self.transport.call_script_function(
+                        self.gripper_function,
+                        self.gripper_names[idx],
+                        ints=[int(grasp)],
+                    )
+
+
+if __name__ == "__main__":
+    robot = MultiManipulatorRobot(
+        Address="127.0.0.1",
+        Port=19999,
+        RobotNames=["LBR_iiwa_7_R800", "LBR_iiwa_7_R800#0"],
+        TargetNames=["targetSphere", "targetSphere#0"],
+        GripperNames=["ROBOTIQ_85", "ROBOTIQ_85#0"],
+        DataDir="data",
+    )
+
+    robot.setup_all()
+    robot.reset()
+    t = 0.0
+    while True:
+        dz = 0.001 * np.sin(t)
+        robot.input2action(
+            actions=[
+                (np.array([0, 0, dz]), np.zeros(3)),
+                (np.array([0, 0, -dz]), np.zeros(3)),
+            ]
+        )
+        t += 0.01
+        time.sleep(0.01)
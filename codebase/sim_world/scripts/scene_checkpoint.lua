@@ -0,0 +1,19 @@
+-- Scene checkpoint functions called by BaseRobot._save_checkpoint / _restore_checkpoint.
+-- Paste them into a child script of the scene (e.g. the one attached to the robot),
+-- then pass that object's name as CheckpointScript.
+
+function saveSceneCheckpoint(inInts, inFloats, inStrings, inBuffer)
+    -- configuration tree of every object: poses, joint positions, ...
+    local tree = sim.getConfigurationTree(sim.handle_all)
+    return {}, {}, {}, tree
+end
+
+function restoreSceneCheckpoint(inInts, inFloats, inStrings, inBuffer)
+    sim.setConfigurationTree(inBuffer)
+    -- clear velocities & contacts left from the last episode
+    local objects = sim.getObjectsInTree(sim.handle_scene)
+    for i = 1, #objects do
+        sim.resetDynamicObject(objects[i])
+    end
+    return {1}, {}, {}, ''
+end
@@ -0,0 +1,63 @@
+import time
+import collections
+
+
+class AcquisitionTimeEstimator:
+    """
+    Estimates when the robot sampled the state carried by a reply, from the
+    send and receive time of the request, so samples can be aligned with
+    camera frames independent of the network delay.
+
+    method "receive": receive time, the state as it arrived.
+    method "midpoint": send + rtt / 2, assumes symmetric request & reply delay.
+    method "fitted": receive - min_rtt / 2 with the smallest rtt of the last
+        `window` requests as the fitted return delay. Queueing delay above the
+        minimum is attributed to the request path, so rtt spikes don't shift
+        the stamps of the replies that did arrive on time.
+
+    Times are in the clock of the arguments, `to_wall_time` converts
+    time.monotonic() times to time.time() for the ring buffers.
+    """
+
+    METHODS = ("receive", "midpoint", "fitted")
+
+    def __init__(self, method: str = "midpoint", window: int = 200):
+        assert method in self.METHODS, f"Unsupported timestamp method {method}."
+        self.method = method
+        # (index, rtt) with increasing rtt, front is the window minimum
+        self._min_rtts = collections.deque()
+        self._idx = 0
+        self.window = window
+
+    @property
+    def return_delay(self) -> float:
+        """fitted one-way reply delay, 0 before the first sample"""
+        if len(self._min_rtts) == 0:
+            return 0.0
+        return self._min_rtts[0][1] / 2
+
+    def __call__(self, t_send: float, t_recv: float) -> float:
+        rtt = t_recv - t_send
+        self._update_min_rtt(rtt)
+        if self.method == "receive":
+            return t_recv
+        if self.method == "midpoint":
+            return t_send + rtt / 2
+        return t_recv - self.return_delay
+
+    def reset(self):
+        """forget the fitted delay, e.g. after a reconnect"""
+        self._min_rtts.clear()
+
+    @staticmethod
+    def to_wall_time(t_monotonic: float) -> float:
+        return time.time() - (time.monotonic() - t_monotonic)
+
+    def _update_min_rtt(self, rtt: float):
+        # monotonic deque, rolling minimum in O(1) amortized
+        while len(self._min_rtts) > 0 and self._min_rtts[-1][1] >= rtt:
+            self._min_rtts.pop()
+        self._min_rtts.append((self._idx, rtt))
+        if self._min_rtts[0][0] <= self._idx - self.window:
+            self._min_rtts.popleft()
+        self._idx += 1
@@ -0,0 +1,108 @@
+import time
+from typing import Dict, Optional
+import numpy as np
+from multiprocessing.managers import SharedMemoryManager
+from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+
+
+class LoopStats:
+    """
+    Timing telemetry of a control loop, published through a small shared memory
+    ring buffer, so any process can read it without slowing the loop down.
+
+    Record methods are called from the loop process, `get` from anywhere.
+    The latency histogram covers the last `window` latency samples,
+    the last bin also counts everything above `max_latency`.
+    """
+
+    def __init__(
+        self,
+        shm_manager: SharedMemoryManager,
+        frequency: float,
+        n_bins: int = 40,
+        max_latency: float = 0.02,
+        window: int = 1000,
+    ) -> None:
+        """
+        frequency: expected loop frequency, one publish per iteration
+        max_latency: upper edge of the histogram in seconds
+        """
+        self.n_bins = n_bins
+        self.bin_edges = np.linspace(0.0, max_latency, n_bins + 1)
+        self.window = window
+
+        example = {
+            "loop_period": 0.0,
+            "send_recv_time": 0.0,
+            "interp_time": 0.0,
+            "iteration": 0,
+            "overrun_count": 0,
+            "outage_count": 0,
+            "outage_time": 0.0,
+            "last_outage_duration": 0.0,
+            "latency_hist": np.zeros((n_bins,), dtype=np.int64),
+            "stats_timestamp": 0.0,
+        }
+        self.ring_buffer = SharedMemoryRingBuffer.create_from_examples(
+            shm_manager=shm_manager,
+            examples=example,
+            get_max_k=1,
+            get_time_budget=0.01,
+            put_desired_frequency=frequency,
+        )
+
+        # readers always find a valid entry
+        self.ring_buffer.put(example)
+
+        # loop process local state
+        self._stats = example
+        self._latency_bins = np.full((window,), -1, dtype=np.int64)
+        self._latency_idx = 0
+
+    # ========= loop side ===========
+    def record_latency(self, latency: float):
+        """add one latency sample to the rolling histogram"""
+        hist = self._stats["latency_hist"]
+        idx = min(int(np.searchsorted(self.bin_edges, latency, side="right")) - 1, self.n_bins - 1)
+        idx = max(idx, 0)
+        old_idx = self._latency_bins[self._latency_idx]
+        if old_idx >= 0:
+            hist[old_idx] -= 1
+        hist[idx] += 1
+        self._latency_bins[self._latency_idx] = idx
+        self._latency_idx = (self._latency_idx + 1) % self.window
+
+    def record(
+        self,
+        loop_period: float,
+        send_recv_time: float,
+        interp_time: float,
+        overrun: int = 0,
+    ):
+        """
+        record one loop iteration and publish
+        overrun: number of deadlines missed by this iteration
+        """
+        stats = self._stats
+        stats["loop_period"] = loop_period
+        stats["send_recv_time"] = send_recv_time
+        stats["interp_time"] = interp_time
+        stats["iteration"] += 1
+        stats["overrun_count"] += int(overrun)
+        stats["stats_timestamp"] = time.time()
+        try:
+            self.ring_buffer.put(stats, wait=False)
+        except TimeoutError:
+            # never block the loop for telemetry, skip this publish
+            pass
+
+    def record_outage(self, duration: float):
+        """record one connection outage of `duration` seconds, published with the next record"""
+        stats = self._stats
+        stats["outage_count"] += 1
+        stats["outage_time"] += duration
+        stats["last_outage_duration"] = duration
+
+    # ========= reader side ===========
+    def get(self, out: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+        return self.ring_buffer.get(out=out)
@@ -25,3 +25,69 @@ def precise_wait(t_end: float, slack_time: float = 0.001, time_func=time.monoton
         while time_func() < t_end:
             pass
     return
+
+
+class DeadlineScheduler:
+    """
+    Absolute deadlines t0 + k * dt for a fixed rate loop, an overrun never
+    shifts the schedule. Waiting uses the same sleep-then-spin as precise_wait.
+
+    policy "skip": missed deadlines are dropped, wait for the next one ahead.
+    policy "catch_up": missed iterations run back to back, at most max_catch_up
+        of them, then the schedule is resynced like "skip".
+    """
+
+    def __init__(
+        self,
+        dt: float,
+        t0: float = None,
+        policy: str = "skip",
+        max_catch_up: int = 10,
+        slack_time: float = 0.001,
+        time_func=time.monotonic,
+    ):
+        assert policy in ("skip", "catch_up"), f"Unsupported policy {policy}."
+
+        self.dt = dt
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.slack_time = slack_time
+        self.time_func = time_func
+        self.t0 = time_func() if t0 is None else t0
+        self.k = 0
+        self.n_missed = 0
+
+    def reset(self, t0: float = None):
+        """restart the schedule from t0 (now), e.g. after a deliberate blocking call"""
+        self.t0 = self.time_func() if t0 is None else t0
+        self.k = 0
+
+    @property
+    def next_deadline(self):
+        return self.t0 + (self.k + 1) * self.dt
+
+    def wait(self) -> int:
+        """
+        wait for the next deadline
+        Return: number of deadlines missed since the last call
+        """
+        self.k += 1
+        t_now = self.time_func()
+        t_deadline = self.t0 + self.k * self.dt
+        if t_now <= t_deadline:
+            precise_wait(t_deadline, slack_time=self.slack_time, time_func=self.time_func)
+            return 0
+
+        # late, every deadline up to now already passed
+        k_now = int((t_now - self.t0) // self.dt)
+        n_late = k_now - self.k + 1
+        if self.policy == "catch_up" and n_late <= self.max_catch_up:
+            # run this iteration late right away, the following ones
+            # stay late (and are counted) until back on schedule
+            self.n_missed += 1
+            return 1
+
+        self.n_missed += n_late
+        self.k = k_now + 1
+        precise_wait(self.t0 + self.k * self.dt, slack_time=self.slack_time, time_func=self.time_func)
+        return n_late
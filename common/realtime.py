@@ -0,0 +1,109 @@
+import os
+import ctypes
+import logging
+import numpy as np
+from typing import Dict, Iterable, Optional, Sequence
+
+from codebase.shared_memory.shared_ndarray import SharedNDArray
+
+logger = logging.getLogger(__name__)
+
+SCHED_POLICIES = {
+    "other": os.SCHED_OTHER,
+    "batch": os.SCHED_BATCH,
+    "idle": os.SCHED_IDLE,
+    "fifo": os.SCHED_FIFO,
+    "rr": os.SCHED_RR,
+}
+
+# what soft_real_time=True always meant
+SOFT_REAL_TIME = {"policy": "rr", "priority": 20}
+
+_MCL_CURRENT = 1
+_MCL_FUTURE = 2
+
+
+def set_realtime(
+    cpus: Optional[Sequence[int]] = None,
+    policy: Optional[str] = None,
+    priority: int = 0,
+    mlockall: bool = False,
+    prefault: bool = False,
+    buffers: Iterable = (),
+    name: str = "",
+) -> Dict[str, bool]:
+    """
+    Real-time setup of the calling process, call it first thing in `run`:
+    threads started afterwards inherit affinity and policy.
+
+    cpus: cores the process may run on, None keeps the inherited set
+    policy: one of SCHED_POLICIES, priority 1-99 for "fifo" and "rr"
+    mlockall: lock current and future pages in RAM, no page faults in the loop
+    prefault: touch every page of `buffers` (shared memory queues, ring buffers,
+        SharedNDArrays) so the first writes in the loop don't fault
+    Settings the process isn't allowed to apply (missing CAP_SYS_NICE or
+    memlock limit) are skipped with a warning.
+    Return: setting -> whether it was applied
+    """
+    applied = dict()
+    if cpus is not None:
+        applied["cpus"] = _apply(name, "affinity", os.sched_setaffinity, 0, set(cpus))
+    if policy is not None:
+        assert policy in SCHED_POLICIES, f"Unsupported scheduling policy {policy}."
+        applied["policy"] = _apply(
+            name,
+            "scheduler",
+            os.sched_setscheduler,
+            0,
+            SCHED_POLICIES[policy],
+            os.sched_param(priority),
+        )
+    if mlockall:
+        applied["mlockall"] = _apply(name, "mlockall", _mlockall)
+    if prefault:
+        for buffer in buffers:
+            prefault_buffer(buffer)
+        applied["prefault"] = True
+    return applied
+
+
+def apply_realtime_config(
+    rt_config: Optional[Dict], buffers: Iterable = (), name: str = ""
+) -> Dict[str, bool]:
+    """set_realtime from a config dict, None leaves the process untouched"""
+    if rt_config is None:
+        return dict()
+    return set_realtime(**rt_config, buffers=buffers, name=name)
+
+
+def prefault_buffer(buffer):
+    """read one byte of every page of a shared memory buffer"""
+    if isinstance(buffer, SharedNDArray):
+        arrays = [buffer]
+    else:
+        arrays = list(buffer.shared_arrays.values())
+        timestamp_array = getattr(buffer, "timestamp_array", None)
+        if timestamp_array is not None:
+            arrays.append(timestamp_array)
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for array in arrays:
+        data = np.frombuffer(array.shm.buf, dtype=np.uint8)
+        int(data[::page_size].sum())
+        del data
+
+
+def _mlockall():
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(_MCL_CURRENT | _MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def _apply(name, what, fn, *args) -> bool:
+    try:
+        fn(*args)
+        return True
+    except OSError as e:
+        logger.warning(f"[{name}] Real-time {what} not applied: {e}")
+        return False
@@ -8,7 +8,9 @@ from spnav import (
     SpnavButtonEvent,
 )
 import multiprocessing as mp
+from typing import Dict, Optional
 from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+from common.realtime import apply_realtime_config
 
 
 class Spacemouse(mp.Process):
@@ -21,7 +23,11 @@ class Spacemouse(mp.Process):
         deadzone=(0, 0, 0, 0, 0, 0),
         dtype=np.float32,
         n_buttons=2,
+        rt_config: Optional[Dict] = None,
     ):
+        """
+        rt_config: cpus, policy, priority, mlockall, prefault of common.realtime.set_realtime
+        """
         super().__init__()
         if np.issubdtype(type(deadzone), np.number):
             deadzone = np.full(6, fill_value=deadzone, dtype=dtype)
@@ -35,6 +41,7 @@ class Spacemouse(mp.Process):
         self.dtype = dtype
         self.deadzone = deadzone
         self.n_buttons = n_buttons
+        self.rt_config = rt_config
         # self.motion_event = SpnavMotionEvent([0,0,0], [0,0,0], 0)
         # self.button_state = defaultdict(lambda: False)
         self.tx_zup_spnav = np.array([[0, 0, -1], [1, 0, 0], [0, 1, 0]], dtype=dtype)
@@ -102,6 +109,7 @@ class Spacemouse(mp.Process):
         self.stop()
 
     def run(self):
+        apply_realtime_config(self.rt_config, buffers=[self.ring_buffer], name="spacemouse")
         spnav_open()
         try:
             motion_event = np.zeros((7,), dtype=np.int64)
@@ -81,7 +81,9 @@ def connection_test():
     print("Program ended")
 
 
-from codebase.sim_world.control_manipulator import ManipulatorRobot, DeviceConfig
+from multiprocessing.managers import SharedMemoryManager
+from codebase.sim_world.control_manipulator import ManipulatorRobot
+from common.spacemouse_shared_memory import Spacemouse
 import logging
 
 logger = logging.getLogger(__name__)
@@ -90,20 +92,20 @@ if __name__ == "__main__":
     connection_test()
     logger.info("Passed Connection Test.")
 
-    SpaceMouseConf = DeviceConfig(
-        # dof_callback = show_control_state
-    )
-    robot = ManipulatorRobot(
-        SpaceMouseConf,
-        Address="127.0.0.1",
-        Port=19999,
-        RobotName="LBR_iiwa_7_R800",
-        TargetName="targetSphere",
-        DataDir="data",
-        ObjName=["ROBOTIQ_85"],
-    )
-
-    robot.setup_all()
-    robot.start_control()
-    while True:
-        robot.input2action()
+    with SharedMemoryManager() as shm_manager, Spacemouse(
+        shm_manager=shm_manager, get_max_k=30, frequency=200
+    ) as sm:
+        robot = ManipulatorRobot(
+            sm,
+            Address="127.0.0.1",
+            Port=19999,
+            RobotName="LBR_iiwa_7_R800",
+            TargetName="targetSphere",
+            DataDir="data",
+            ObjName=["ROBOTIQ_85"],
+        )
+
+        robot.setup_all()
+        robot.start_control()
+        while True:
+            robot.input2action()
@@ -0,0 +1,64 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+from codebase.real_world.iiwa_kinematics import iiwa7_fk, iiwa7_fk_mat, pose_to_mat, mat_to_pose
+
+
+def test_iiwa7_fk():
+    # stretched upright: flange 1266 mm above the base, base orientation
+    assert np.allclose(iiwa7_fk(np.zeros(7)), [0, 0, 1266, 0, 0, 0])
+
+    # TCP 100 mm along the flange z axis
+    assert np.allclose(iiwa7_fk(np.zeros(7), trans=(0, 0, 100, 0, 0, 0)), [0, 0, 1366, 0, 0, 0])
+
+    # elbow bent 90 deg: the forearm points along base x
+    jpos = [0, 0, 0, -np.pi / 2, 0, 0, 0]
+    assert np.allclose(iiwa7_fk_mat(jpos)[:3, 3], [526, 0, 740])
+
+    # batched trajectories match per sample evaluation
+    jpos = np.random.default_rng(0).uniform(-1.0, 1.0, size=(4, 5, 7))
+    trans = (10, 0, 50, 0.1, 0, 0)
+    batch = iiwa7_fk_mat(jpos, trans)
+    assert batch.shape == (4, 5, 4, 4)
+    assert np.allclose(batch[2, 3], iiwa7_fk_mat(jpos[2, 3], trans))
+    assert np.allclose(pose_to_mat(iiwa7_fk(jpos, trans)), batch)
+
+
+def rot_z(a):
+    return np.array([[np.cos(a), -np.sin(a), 0], [np.sin(a), np.cos(a), 0], [0, 0, 1]])
+
+
+def rot_y(b):
+    return np.array([[np.cos(b), 0, np.sin(b)], [0, 1, 0], [-np.sin(b), 0, np.cos(b)]])
+
+
+def rot_x(c):
+    return np.array([[1, 0, 0], [0, np.cos(c), -np.sin(c)], [0, np.sin(c), np.cos(c)]])
+
+
+def test_kuka_abc():
+    # KUKA ABC: R = Rz(A) Ry(B) Rx(C), every angle nonzero
+    pose = np.array([100.0, -20.0, 300.0, 2.89, 0.57, 2.71])
+    mat = pose_to_mat(pose)
+    assert np.allclose(mat[:3, :3], rot_z(pose[3]) @ rot_y(pose[4]) @ rot_x(pose[5]))
+    assert np.allclose(mat[:3, 3], pose[:3])
+    assert np.allclose(mat_to_pose(mat), pose)
+
+    # fk orientation read back as ABC from the hand built matrix
+    jpos = [0.3, 0.5, -0.2, -1.2, 0.4, 0.8, 0.1]
+    a, b, c = iiwa7_fk(jpos)[3:]
+    assert np.allclose(rot_z(a) @ rot_y(b) @ rot_x(c), iiwa7_fk_mat(jpos)[:3, :3])
+
+    # the TCP rotation is applied in the flange frame
+    trans = (0, 0, 0, 0.3, -0.2, 0.5)
+    tcp = iiwa7_fk_mat(jpos)[:3, :3] @ rot_z(0.3) @ rot_y(-0.2) @ rot_x(0.5)
+    assert np.allclose(iiwa7_fk_mat(jpos, trans)[:3, :3], tcp)
+
+
+if __name__ == "__main__":
+    test_iiwa7_fk()
+    test_kuka_abc()
@@ -0,0 +1,474 @@
+import sys
+import time
+import socket
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+from codebase.real_world.base.base_client import FramedSocket
+from codebase.real_world.base.binary_protocol import ProtocolDesyncError
+from codebase.real_world.base.getters import Getters
+from codebase.real_world.base.senders import Senders, StateField
+from codebase.real_world.base.PTP import PTP
+from codebase.real_world.base.servo_pipeline import ServoPipeline
+from codebase.real_world.base.connection_manager import ConnectionManager
+from codebase.real_world.kuka_emulator import KukaSunriseEmulator, RobotStateModel
+from codebase.real_world.iiwaPy3 import IIWAPositionalController
+from codebase.real_world.multi_iiwa import MultiIIWAPositionalController
+from codebase.real_world.iiwa_kinematics import iiwa7_fk
+from multiprocessing.managers import SharedMemoryManager
+from utils.data_utils import pose_euler2quat
+
+
+def connect(emulator):
+    sock = FramedSocket.create_connection(emulator.host, emulator.port)
+    trans = (0, 0, 0, 0, 0, 0)
+    return (
+        Senders(emulator.host, emulator.port, trans, sock),
+        Getters(emulator.host, emulator.port, trans, sock),
+        PTP(emulator.host, emulator.port, trans, sock),
+    )
+
+
+def test_text_protocol():
+    with KukaSunriseEmulator(port=0, state=RobotStateModel(ptp_time_scale=0.01)) as emulator:
+        sender, getter, ptp = connect(emulator)
+
+        jpos = [0, 0.5, 0, -1.4, 0, 1.2, 0]
+        ptp.movePTPJointSpace(jpos=jpos, relVel=[0.2])
+        assert np.allclose(getter.get_JointPos(), jpos)
+
+        pose = [500.0, 10.0, 400.0, 3.1, 0.0, 3.1]
+        state = sender.sendEEfPositionGetState(pose)
+        assert np.allclose(state[StateField.EEF_POSE], pose)
+        assert np.allclose(state[StateField.JOINT_POS], jpos)
+
+        fields = StateField.EEF_POSE | StateField.JOINT_POS | StateField.EXT_TORQUE
+        state = sender.sendEEfPositionGetState(pose, fields)
+        assert len(state[StateField.EXT_TORQUE]) == 7
+        assert np.allclose(getter.get_EEF_pos(), pose)
+
+
+def test_ptp_timeouts():
+    state = RobotStateModel(ptp_time_scale=10.0)
+    with KukaSunriseEmulator(port=0, state=state) as emulator:
+        sock = FramedSocket.create_connection(emulator.host, emulator.port)
+        ptp = PTP(emulator.host, emulator.port, (0, 0, 0, 0, 0, 0), sock, motion_timeout=0.2)
+
+        # motion longer than the timeout
+        t_start = time.monotonic()
+        raised = False
+        try:
+            ptp.movePTPJointSpace(jpos=[0, 1.0, 0, -1.4, 0, 1.2, 0], relVel=[0.5])
+        except TimeoutError:
+            raised = True
+        assert raised
+        assert time.monotonic() - t_start < 1.0
+        sock.close()
+
+    with KukaSunriseEmulator(port=0, state=RobotStateModel(ptp_time_scale=0.01)) as emulator:
+        _, _, ptp = connect(emulator)
+        t_start = time.monotonic()
+        ptp.movePTPJointSpace(jpos=[0, 1.0, 0, -1.4, 0, 1.2, 0], relVel=[0.5])
+        # end is acknowledged, no fixed wait
+        ptp.close()
+        assert time.monotonic() - t_start < 0.5
+
+    # target frames sent through the inner sender are bounded too
+    with KukaSunriseEmulator(port=0) as emulator:
+        sock = FramedSocket.create_connection(emulator.host, emulator.port)
+        ptp = PTP(emulator.host, emulator.port, (0, 0, 0, 0, 0, 0), sock, ack_timeout=0.2)
+        assert len(ptp.getter.get_JointPos()) == 7
+        emulator.stall_connections()
+        t_start = time.monotonic()
+        raised = False
+        try:
+            ptp.sender.sendJointsPositions([0, 1.0, 0, -1.4, 0, 1.2, 0])
+        except TimeoutError:
+            raised = True
+        assert raised
+        assert time.monotonic() - t_start < 1.0
+        sock.close()
+
+
+def test_binary_protocol():
+    with KukaSunriseEmulator(port=0) as emulator:
+        sender, getter, _ = connect(emulator)
+        protocol = sender.negotiate_protocol()
+        assert protocol is not None
+        sender.set_protocol(protocol)
+        getter.set_protocol(protocol)
+
+        pose = [500.0, 10.0, 400.0, 3.1, 0.0, 3.1]
+        state = sender.sendEEfPositionGetState(pose)
+        assert np.allclose(state[StateField.EEF_POSE], pose)
+        assert np.allclose(getter.get_EEF_pos(), pose)
+        # getters without an opcode fall back to text on the same connection
+        assert len(getter.get_pinState(3)) == 1
+        assert np.allclose(getter.get_EEF_pos(), pose)
+
+        # every field in one reply
+        sender.set_combined_state(True)
+        fields = StateField(0)
+        for field in StateField:
+            fields |= field
+        state = sender.sendEEfPositionGetState(pose, fields)
+        assert len(state[StateField.MEASURED_TORQUE]) == 7
+        assert len(state[StateField.EEF_FORCE]) == 3
+        assert len(state[StateField.EEF_MOMENT]) == 3
+
+    # a server without binary support keeps the text protocol
+    with KukaSunriseEmulator(port=0, binary=False) as emulator:
+        sender, getter, _ = connect(emulator)
+        assert sender.negotiate_protocol() is None
+        assert len(getter.get_EEF_pos()) == 6
+
+
+def test_binary_protocol_desync():
+    with KukaSunriseEmulator(port=0) as emulator:
+        sender, getter, _ = connect(emulator)
+        protocol = sender.negotiate_protocol()
+        getter.set_protocol(protocol)
+        assert len(getter.get_EEF_pos()) == 6
+
+        # an unread reply must not be taken for the next request's
+        getter.sock.sendall(protocol.encode("Eef_pos"))
+        try:
+            getter.get_JointPos()
+            assert False, "Expected ProtocolDesyncError."
+        except ProtocolDesyncError:
+            pass
+
+    # no answer to the negotiation fails it instead of assuming text
+    with KukaSunriseEmulator(port=0) as emulator:
+        sender, getter, _ = connect(emulator)
+        assert len(getter.get_EEF_pos()) == 6
+        emulator.stall_connections()
+        try:
+            sender.negotiate_protocol(timeout=0.2)
+            assert False, "Expected ProtocolDesyncError."
+        except ProtocolDesyncError:
+            pass
+
+
+def test_servo_pipeline():
+    for binary, combined_state in [(False, False), (True, False), (False, True), (True, True)]:
+        with KukaSunriseEmulator(port=0, latency=0.005, combined_state=combined_state) as emulator:
+            sender, _, _ = connect(emulator)
+            if binary:
+                sender.set_protocol(sender.negotiate_protocol())
+            sender.set_combined_state(combined_state)
+            pipeline = ServoPipeline(sender, max_in_flight=4)
+
+            seqs = [pipeline.send([500.0 + i, 0.0, 400.0, 3.1, 0.0, 3.1]) for i in range(4)]
+            assert not pipeline.can_send
+            replies = pipeline.drain()
+            assert [reply[0] for reply in replies] == seqs
+            assert all(rtt >= 0.005 for _, _, rtt, _ in replies)
+            assert np.allclose(replies[-1][1][StateField.EEF_POSE][0], 503.0)
+            pipeline.close()
+
+
+def test_joint_servo():
+    for binary in [False, True]:
+        with KukaSunriseEmulator(port=0) as emulator:
+            sender, _, _ = connect(emulator)
+            if binary:
+                sender.set_protocol(sender.negotiate_protocol())
+
+            jpos = [0.1, 0.5, 0, -1.4, 0, 1.2, 0]
+            state = sender.sendJointsPositionsGetState(jpos)
+            assert np.allclose(state[StateField.JOINT_POS], jpos)
+            assert len(state[StateField.EEF_POSE]) == 6
+
+            pipeline = ServoPipeline(sender, fields=StateField.JOINT_POS)
+            pipeline.send_joints([0.2] + jpos[1:])
+            replies = pipeline.drain()
+            assert np.allclose(replies[-1][1][StateField.JOINT_POS][0], 0.2)
+            pipeline.close()
+
+
+def test_split_channels():
+    with KukaSunriseEmulator(port=0, command_port=0, latency=0.005) as emulator:
+        connection = ConnectionManager(emulator.host, emulator.port, emulator.command_port)
+        connection.connect()
+        assert connection.is_split
+        trans = (0, 0, 0, 0, 0, 0)
+        sender = Senders(emulator.host, emulator.port, trans, connection.servo_channel)
+        getter = Getters(emulator.host, emulator.command_port, trans, connection.command_channel)
+
+        # queries don't touch the servo replies in flight
+        pipeline = ServoPipeline(sender, max_in_flight=2)
+        pipeline.send([510.0, 0.0, 400.0, 3.1, 0.0, 3.1])
+        pipeline.send([520.0, 0.0, 400.0, 3.1, 0.0, 3.1])
+        assert len(getter.get_JointPos()) == 7
+        replies = pipeline.drain()
+        assert len(replies) == 2
+        assert np.allclose(getter.get_EEF_pos()[0], 520.0)
+        pipeline.close()
+        connection.close()
+
+
+def test_controller_setup_failure():
+    # nothing listens on a port that was just released
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    with SharedMemoryManager() as shm_manager:
+        robot = IIWAPositionalController(
+            shm_manager=shm_manager,
+            receive_keys=None,
+            host="127.0.0.1",
+            port=port,
+            launch_timeout=10,
+        )
+        t_start = time.monotonic()
+        try:
+            robot.start()
+            assert False, "Expected RuntimeError."
+        except RuntimeError:
+            pass
+        assert time.monotonic() - t_start < 5
+        assert not robot.is_ready
+        robot.join()
+
+
+def test_controller_legacy_server():
+    # the original Sunrise application has no combined state command
+    for pipelined, binary in [(False, False), (True, True)]:
+        state = RobotStateModel(ptp_time_scale=0.01)
+        with KukaSunriseEmulator(port=0, state=state, combined_state=False) as emulator:
+            with SharedMemoryManager() as shm_manager:
+                with IIWAPositionalController(
+                    shm_manager=shm_manager,
+                    receive_keys=["EEFpos", "EEFrot", "Jpos", "ExtTorque"],
+                    host=emulator.host,
+                    port=emulator.port,
+                    launch_timeout=10,
+                    pipelined=pipelined,
+                    binary_protocol=binary,
+                ) as robot:
+                    time.sleep(0.3)
+                    state = robot.get_state()
+                    assert time.time() - state["robot_receive_timestamp"] < 0.1
+                    assert np.allclose(state["EEFpos"], robot.init_eef_pose[:3])
+                    assert len(state["ExtTorque"]) == 7
+                    assert robot.get_loop_stats()["outage_count"] == 0
+
+
+def test_controller_reconnect():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    with KukaSunriseEmulator(port=0, state=state) as emulator:
+        with SharedMemoryManager() as shm_manager:
+            with IIWAPositionalController(
+                shm_manager=shm_manager,
+                receive_keys=None,
+                host=emulator.host,
+                port=emulator.port,
+                launch_timeout=10,
+            ) as robot:
+                time.sleep(0.2)
+                emulator.drop_connections()
+                time.sleep(1.0)
+
+                # servoing resumed after the outage
+                loop_stats = robot.get_loop_stats()
+                assert loop_stats["outage_count"] == 1
+                assert loop_stats["last_outage_duration"] > 0
+                state = robot.get_state()
+                assert time.time() - state["robot_receive_timestamp"] < 0.1
+                # stamped at the request midpoint, before the reply arrived
+                assert state["robot_timestamp"] <= state["robot_receive_timestamp"]
+
+
+def test_controller_stalled_link():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    with KukaSunriseEmulator(port=0, state=state) as emulator:
+        with SharedMemoryManager() as shm_manager:
+            with IIWAPositionalController(
+                shm_manager=shm_manager,
+                receive_keys=None,
+                host=emulator.host,
+                port=emulator.port,
+                launch_timeout=10,
+                pipelined=True,
+                servo_timeout=0.2,
+            ) as robot:
+                time.sleep(0.2)
+                # replies stop, the connection stays open
+                emulator.stall_connections()
+                time.sleep(1.5)
+
+                loop_stats = robot.get_loop_stats()
+                assert loop_stats["outage_count"] == 1
+                assert time.time() - robot.get_state()["robot_receive_timestamp"] < 0.1
+
+
+def test_pipeline_desync():
+    with KukaSunriseEmulator(port=0) as emulator:
+        sender, _, _ = connect(emulator)
+        sender.set_protocol(sender.negotiate_protocol())
+        pipeline = ServoPipeline(sender, max_in_flight=2)
+        pipeline.send([500.0, 0.0, 400.0, 3.1, 0.0, 3.1])
+        # a command the pipeline doesn't know about shifts every reply
+        pipeline.frames[0] = (pipeline.frames[0][0] + 1, pipeline.frames[0][1])
+        raised = False
+        try:
+            pipeline.drain()
+        except ConnectionError:
+            raised = True
+        assert raised
+        pipeline.close()
+
+    # a text line that is not a state reply
+    with KukaSunriseEmulator(port=0) as emulator:
+        sender, _, _ = connect(emulator)
+        pipeline = ServoPipeline(sender, max_in_flight=2)
+        # answered "done", which arrives where the servo reply is expected
+        sender.sock.sendall(b"setPin1On\n")
+        pipeline.send([500.0, 0.0, 400.0, 3.1, 0.0, 3.1])
+        try:
+            pipeline.drain()
+            assert False, "Expected ProtocolDesyncError."
+        except ProtocolDesyncError:
+            pass
+        pipeline.close()
+
+        # same for a blocking servo call, on a fresh connection
+        sender, _, _ = connect(emulator)
+        sender.sock.sendall(b"setPin1On\n")
+        try:
+            sender.sendEEfPositionGetState([500.0, 0.0, 400.0, 3.1, 0.0, 3.1])
+            assert False, "Expected ProtocolDesyncError."
+        except ProtocolDesyncError:
+            pass
+
+
+def test_controller_local_fk():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    with KukaSunriseEmulator(port=0, state=state) as emulator:
+        with SharedMemoryManager() as shm_manager:
+            with IIWAPositionalController(
+                shm_manager=shm_manager,
+                receive_keys=None,
+                host=emulator.host,
+                port=emulator.port,
+                trans=(0, 0, 100, 0, 0, 0),
+                launch_timeout=10,
+                local_fk=True,
+            ) as robot:
+                assert StateField.EEF_POSE not in robot.state_fields
+                time.sleep(0.2)
+                # pose published from the joints of the same reply
+                state = robot.get_state()
+                pose = iiwa7_fk(state["Jpos"], trans=(0, 0, 100, 0, 0, 0))
+                assert np.allclose(state["EEFpos"], pose[:3])
+                assert np.allclose(state["EEFrot"], pose[3:])
+
+
+class FailingPinController(IIWAPositionalController):
+    def getPin16State(self):
+        raise ValueError("Unsupported pin.")
+
+
+def test_controller_query():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    for pipelined, binary in [(False, False), (True, False), (False, True), (True, True)]:
+        with KukaSunriseEmulator(port=0, state=state) as emulator:
+            with SharedMemoryManager() as shm_manager:
+                with FailingPinController(
+                    shm_manager=shm_manager,
+                    receive_keys=None,
+                    host=emulator.host,
+                    port=emulator.port,
+                    launch_timeout=10,
+                    pipelined=pipelined,
+                    binary_protocol=binary,
+                ) as robot:
+                    # answered from the servo reply
+                    assert np.allclose(robot.query("Jpos"), robot.get_state()["Jpos"])
+                    # not part of the servo reply, fetched from the robot
+                    assert len(robot.query("EEFforce")) == 3
+                    assert len(robot.query("Pin10")) == 1
+                    assert len(robot.query("EEFpose")) == 6
+
+                    # a failing query is answered with an error, the loop keeps servoing
+                    try:
+                        robot.query("Pin16")
+                        assert False, "Expected RuntimeError."
+                    except RuntimeError:
+                        pass
+                    assert robot.is_alive()
+                    assert len(robot.query("Pin10")) == 1
+
+
+def test_controller_trajectory_log():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    with KukaSunriseEmulator(port=0, state=state) as emulator:
+        with SharedMemoryManager() as shm_manager:
+            with IIWAPositionalController(
+                shm_manager=shm_manager,
+                receive_keys=None,
+                host=emulator.host,
+                port=emulator.port,
+                launch_timeout=10,
+                log_trajectory=True,
+            ) as robot:
+                time.sleep(0.3)
+                trajectory = robot.get_trajectory()
+                # one sample per tick
+                assert len(trajectory["timestamp"]) >= 20
+                assert np.all(np.diff(trajectory["timestamp"]) > 0)
+                assert np.allclose(trajectory["commanded_pose"][-1], robot.init_eef_pose)
+                assert np.all(np.isnan(trajectory["commanded_jpos"]))
+                assert np.allclose(trajectory["actual_jpos"][-1], robot.get_state()["Jpos"])
+
+
+def test_multi_arm_controller():
+    state = RobotStateModel(ptp_time_scale=0.01)
+    with KukaSunriseEmulator(port=0, state=state) as left, KukaSunriseEmulator(
+        port=0, state=RobotStateModel(ptp_time_scale=0.01)
+    ) as right:
+        with SharedMemoryManager() as shm_manager:
+            with MultiIIWAPositionalController(
+                shm_manager=shm_manager,
+                hosts=[left.host, right.host],
+                ports=[left.port, right.port],
+                launch_timeout=10,
+            ) as robots:
+                init_pose = robots.init_eef_pose
+                assert init_pose.shape == (2, 6)
+                target = np.array([pose_euler2quat(pose) for pose in init_pose])
+                target[0, 0] += 10.0
+                target[1, 0] -= 10.0
+                robots.servoL(target, duration=0.2)
+                time.sleep(1.0)
+
+                state = robots.get_state()
+                assert state["EEFpos"].shape == (2, 3)
+                assert state["Jpos"].shape == (2, 7)
+                assert state["robot_rtt"].shape == (2,)
+                assert np.all(state["robot_timestamp"] <= state["robot_receive_timestamp"])
+                assert np.allclose(state["EEFpos"][:, 0], target[:, 0], atol=1e-3)
+
+
+if __name__ == "__main__":
+    test_text_protocol()
+    test_ptp_timeouts()
+    test_binary_protocol()
+    test_binary_protocol_desync()
+    test_servo_pipeline()
+    test_joint_servo()
+    test_split_channels()
+    test_controller_setup_failure()
+    test_controller_legacy_server()
+    test_controller_reconnect()
+    test_controller_stalled_link()
+    test_pipeline_desync()
+    test_controller_local_fk()
+    test_controller_query()
+    test_controller_trajectory_log()
+    test_multi_arm_controller()
@@ -0,0 +1,34 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+from common.latency_compensation import AcquisitionTimeEstimator
+
+
+def test_acquisition_time_estimator():
+    estimator = AcquisitionTimeEstimator(method="receive")
+    assert estimator(t_send=1.0, t_recv=1.004) == 1.004
+
+    estimator = AcquisitionTimeEstimator(method="midpoint")
+    assert np.isclose(estimator(t_send=1.0, t_recv=1.004), 1.002)
+
+    # a delayed reply keeps the fitted return delay of the fast ones
+    estimator = AcquisitionTimeEstimator(method="fitted", window=3)
+    assert np.isclose(estimator(t_send=1.0, t_recv=1.004), 1.002)
+    assert np.isclose(estimator(t_send=2.0, t_recv=2.020), 2.018)
+    assert np.isclose(estimator.return_delay, 0.002)
+
+    # the minimum leaves the window
+    estimator(t_send=3.0, t_recv=3.010)
+    estimator(t_send=4.0, t_recv=4.010)
+    assert np.isclose(estimator.return_delay, 0.005)
+
+    estimator.reset()
+    assert estimator.return_delay == 0.0
+
+
+if __name__ == "__main__":
+    test_acquisition_time_estimator()
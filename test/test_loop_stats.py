@@ -0,0 +1,49 @@
+import sys
+import time
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+from multiprocessing.managers import SharedMemoryManager
+from common.loop_stats import LoopStats
+
+
+def test_loop_stats():
+    with SharedMemoryManager() as shm_manager:
+        stats = LoopStats(shm_manager, frequency=100, n_bins=10, max_latency=0.01, window=4)
+        assert stats.get()["iteration"] == 0
+
+        for latency in [0.0005, 0.0015, 0.0015, 0.05]:
+            stats.record_latency(latency)
+        stats.record(loop_period=0.01, send_recv_time=0.003, interp_time=0.0001, overrun=True)
+        result = stats.get()
+        assert result["iteration"] == 1
+        assert result["overrun_count"] == 1
+        assert np.isclose(result["send_recv_time"], 0.003)
+        # everything above max_latency lands in the last bin
+        assert result["latency_hist"].tolist() == [1, 2, 0, 0, 0, 0, 0, 0, 0, 1]
+
+        # rolling window drops the oldest samples
+        stats.record_latency(0.0025)
+        stats.record_latency(0.0025)
+        stats.record(loop_period=0.01, send_recv_time=0.003, interp_time=0.0001)
+        result = stats.get()
+        assert result["overrun_count"] == 1
+        assert result["latency_hist"].tolist() == [0, 1, 2, 0, 0, 0, 0, 0, 0, 1]
+
+        # outages are published with the next record
+        stats.record_outage(0.5)
+        stats.record_outage(1.5)
+        # one slot buffer, let the previous publish age past the read budget
+        time.sleep(0.02)
+        stats.record(loop_period=0.01, send_recv_time=0.003, interp_time=0.0001)
+        result = stats.get()
+        assert result["outage_count"] == 2
+        assert np.isclose(result["outage_time"], 2.0)
+        assert np.isclose(result["last_outage_duration"], 1.5)
+
+
+if __name__ == "__main__":
+    test_loop_stats()
@@ -0,0 +1,54 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+from common.precise_sleep import DeadlineScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        # time advances a little on every read, so precise_wait's spin ends
+        self.t += 1e-5
+        return self.t
+
+
+def test_deadline_scheduler_skip():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(dt=0.01, t0=0.0, policy="skip", slack_time=0.0, time_func=clock)
+    assert scheduler.wait() == 0
+    assert abs(clock.t - 0.01) < 1e-3
+
+    # overrun of 2.5 periods, deadlines 0.02 and 0.03 are missed
+    # and the schedule is not shifted
+    clock.t += 0.025
+    assert scheduler.wait() == 2
+    assert scheduler.n_missed == 2
+    assert abs(clock.t - 0.04) < 1e-3
+    assert scheduler.wait() == 0
+    assert abs(clock.t - 0.05) < 1e-3
+
+
+def test_deadline_scheduler_catch_up():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(dt=0.01, t0=0.0, policy="catch_up", slack_time=0.0, time_func=clock)
+    clock.t = 0.035
+    # deadlines 0.01, 0.02, 0.03 are run back to back
+    assert [scheduler.wait() for _ in range(3)] == [1, 1, 1]
+    assert scheduler.wait() == 0
+    assert abs(clock.t - 0.04) < 1e-3
+    assert scheduler.n_missed == 3
+
+    # too far behind, resync instead
+    clock.t += 1.0
+    assert scheduler.wait() > scheduler.max_catch_up
+    assert scheduler.wait() == 0
+
+
+if __name__ == "__main__":
+    test_deadline_scheduler_skip()
+    test_deadline_scheduler_catch_up()
@@ -0,0 +1,49 @@
+import os
+import sys
+import pathlib
+import multiprocessing as mp
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+from multiprocessing.managers import SharedMemoryManager
+from codebase.shared_memory.shared_memory_queue import SharedMemoryQueue
+from codebase.shared_memory.shared_memory_ring_buffer import SharedMemoryRingBuffer
+from common.realtime import apply_realtime_config, set_realtime
+
+
+def _setup_child(buffers, result_queue):
+    cpus = sorted(os.sched_getaffinity(0))[:1]
+    applied = set_realtime(
+        cpus=cpus, policy="other", mlockall=True, prefault=True, buffers=buffers, name="test"
+    )
+    result_queue.put((applied, sorted(os.sched_getaffinity(0)) == cpus))
+
+
+def test_set_realtime():
+    with SharedMemoryManager() as shm_manager:
+        example = {"pose": np.zeros((7,)), "timestamp": 0.0}
+        ring_buffer = SharedMemoryRingBuffer.create_from_examples(
+            shm_manager=shm_manager, examples=example, get_max_k=8
+        )
+        queue = SharedMemoryQueue.create_from_examples(
+            shm_manager=shm_manager, examples=example, buffer_size=8
+        )
+
+        # in a child, mlockall and affinity stay out of the test process
+        result_queue = mp.Queue()
+        process = mp.Process(target=_setup_child, args=([ring_buffer, queue], result_queue))
+        process.start()
+        applied, pinned = result_queue.get(timeout=10)
+        process.join()
+        assert applied["cpus"] and pinned
+        assert applied["policy"] and applied["prefault"]
+        # allowed or skipped with a warning, never raises
+        assert "mlockall" in applied
+
+    assert apply_realtime_config(None) == dict()
+
+
+if __name__ == "__main__":
+    test_set_realtime()
@@ -57,5 +57,37 @@ def test():
     queue.clear()
 
 
+def test_put_k():
+    shm_manager = SharedMemoryManager()
+    shm_manager.start()
+    example = {"cmd": 0, "pose": np.zeros((6,)), "target_time": 0.0}
+    queue = SharedMemoryQueue.create_from_examples(
+        shm_manager=shm_manager, examples=example, buffer_size=4
+    )
+
+    # wrap around the end of the buffer
+    queue.put({"cmd": 0})
+    queue.put({"cmd": 0})
+    queue.put({"cmd": 0})
+    queue.get_all()
+    poses = np.arange(18, dtype=np.float64).reshape(3, 6)
+    queue.put_k({"cmd": 2, "pose": poses, "target_time": np.array([1.0, 2.0, 3.0])})
+    assert queue.qsize() == 3
+
+    raised = False
+    try:
+        queue.put_k({"cmd": 2, "pose": poses, "target_time": np.zeros(3)})
+    except Full:
+        raised = True
+    assert raised
+
+    result = queue.get_all()
+    assert np.allclose(result["cmd"], [2, 2, 2])
+    assert np.allclose(result["pose"], poses)
+    assert np.allclose(result["target_time"], [1.0, 2.0, 3.0])
+    shm_manager.shutdown()
+
+
 if __name__ == "__main__":
     test()
+    test_put_k()
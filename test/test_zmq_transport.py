@@ -0,0 +1,139 @@
+import sys
+import pathlib
+
+ROOT_DIR = str(pathlib.Path(__file__).parent.parent)
+sys.path.append(ROOT_DIR)
+
+import time
+import threading
+import numpy as np
+import pytest
+import zmq
+import cbor2
+from codebase.sim_world.base.zmq_transport import ZmqRemoteApiTransport
+
+
+class StandInServer(threading.Thread):
+    """Minimal REP server answering the ZeroMQ remote API calls used by the transport"""
+
+    def __init__(self, objects):
+        super().__init__(daemon=True)
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.REP)
+        # any free port
+        self.port = self.socket.bind_to_random_port("tcp://127.0.0.1")
+        self.stop_event = threading.Event()
+        self.names = {name: handle for handle, name in enumerate(objects)}
+        self.positions = {handle: [0.0, 0.0, 0.0] for handle in self.names.values()}
+        self.orientations = {handle: [0.0, 0.0, 0.0] for handle in self.names.values()}
+        self.script_calls = list()
+        self.n_requests = 0
+
+    def handle(self, request):
+        func, args = request["func"], request["args"]
+        if func == "sim.getObject":
+            return {"success": True, "ret": [self.names[args[0].lstrip("/")]]}
+        elif func == "sim.getObjectPosition":
+            return {"success": True, "ret": [self.positions[args[0]]]}
+        elif func == "sim.getObjectOrientation":
+            return {"success": True, "ret": [self.orientations[args[0]]]}
+        elif func == "sim.setObjectPosition":
+            self.positions[args[0]] = args[2]
+            return {"success": True, "ret": []}
+        elif func == "sim.setObjectOrientation":
+            self.orientations[args[0]] = args[2]
+            return {"success": True, "ret": []}
+        elif func == "sim.wait":
+            time.sleep(args[0])
+            return {"success": True, "ret": []}
+        elif func == "sim.callScriptFunction":
+            self.script_calls.append(args)
+            return {"success": True, "ret": [[1], [], [], b""]}
+        return {"success": False, "error": f"unknown function {func}"}
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.socket.poll(timeout=10) == 0:
+                    continue
+                request = cbor2.loads(self.socket.recv())
+                self.n_requests += 1
+                if isinstance(request, list):
+                    reply = [self.handle(r) for r in request]
+                else:
+                    reply = self.handle(request)
+                self.socket.send(cbor2.dumps(reply))
+        finally:
+            self.socket.close(linger=0)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(["targetSphere", "targetSphere#0"])
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_zmq_transport(server):
+    transport = ZmqRemoteApiTransport(address="127.0.0.1", port=server.port)
+    h0 = transport.get_object_handle("targetSphere")
+    h1 = transport.get_object_handle("targetSphere#0")
+    assert (h0, h1) == (0, 1)
+
+    transport.set_object_position(h0, np.array([0.1, 0.2, 0.3]))
+    assert np.allclose(transport.get_object_position(h0), [0.1, 0.2, 0.3])
+
+    # setters of one batch go out in a single request
+    n_requests = server.n_requests
+    with transport.batch():
+        transport.set_object_position(h0, [1.0, 0.0, 0.0])
+        transport.set_object_orientation(h0, [0.0, 0.0, 3.14])
+        transport.set_object_position(h1, [0.0, 1.0, 0.0])
+        transport.call_script_function("ROBOTIQ_CloseOpen", "ROBOTIQ_85", ints=[-1])
+    assert server.n_requests == n_requests + 1
+    assert np.allclose(server.positions[h1], [0.0, 1.0, 0.0])
+    assert np.allclose(server.orientations[h0], [0.0, 0.0, 3.14])
+    assert server.script_calls[-1][0] == "ROBOTIQ_CloseOpen@ROBOTIQ_85"
+
+    ret = transport.call_script_function("ROBOTIQ_CloseOpen", "ROBOTIQ_85", ints=[1])
+    assert ret[0] == [1]
+
+    raised = False
+    try:
+        transport._call("sim.unknown")
+    except RuntimeError:
+        raised = True
+    assert raised
+
+    transport.close()
+
+
+def test_zmq_transport_timeout(server):
+    transport = ZmqRemoteApiTransport(address="127.0.0.1", port=server.port, timeout_ms=100)
+    raised = False
+    try:
+        transport._call("sim.wait", 0.3)
+    except TimeoutError:
+        raised = True
+    assert raised
+
+    # the transport recovers, the late reply doesn't leak into the next call
+    time.sleep(0.3)
+    assert transport.get_object_handle("targetSphere#0") == 1
+    transport.set_object_position(1, [0.0, 0.0, 1.0])
+    transport.close()
+
+
+if __name__ == "__main__":
+    server = StandInServer(["targetSphere", "targetSphere#0"])
+    server.start()
+    try:
+        test_zmq_transport(server)
+        test_zmq_transport_timeout(server)
+    finally:
+        server.stop()
@@ -174,4 +174,4 @@ def String2Double(message: str, size: int):
         doubleVals = [float(strVals[idx]) for idx in range(size)]
         return doubleVals
     except ValueError as e:
-        raise e("Unsupported value to convert.")
+        raise ValueError("Unsupported value to convert.") from e